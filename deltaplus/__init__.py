@@ -0,0 +1,12 @@
+"""Local tooling for running and profiling the Spark SQL lesson notebooks."""
+
+from deltaplus.notebook import Cell, Notebook
+from deltaplus.runner import CellResult, NotebookRunner, RunReport
+
+__all__ = [
+    "Cell",
+    "CellResult",
+    "Notebook",
+    "NotebookRunner",
+    "RunReport",
+]
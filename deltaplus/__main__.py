@@ -0,0 +1,5 @@
+import sys
+
+from deltaplus.cli import main
+
+sys.exit(main())
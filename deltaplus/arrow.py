@@ -0,0 +1,160 @@
+"""Columnar query results transferred as Arrow record batches.
+
+``df.collect()`` pickles every row on the JVM side, unpickles it into a
+``Row`` object in the driver and keeps all of them alive; previews only
+need a row count and TEST cells read one or two columns.  :func:`fetch`
+pulls the result as Arrow record batches instead (``pyarrow`` required for
+the fast path) and wraps them in a :class:`ColumnarResult`: columns are
+converted to Python values only when read, one column at a time, and rows
+are light views over the columns, so the notebook idioms still work::
+
+    result = fetch(spark.sql("SELECT * FROM HomicidesByMonth"))
+    len(result)                  # no conversion at all
+    result[0].homicides          # converts the ``homicides`` column once
+    result.scalar()              # .first()[0]
+    result.rows()                # real pyspark Rows, only when asked
+
+Without ``pyarrow`` the same object is built from ``collect()``.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+
+def _have_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class RowView:
+    """One row of a :class:`ColumnarResult`; indexable like ``pyspark.sql.Row``."""
+
+    __slots__ = ("_result", "_index")
+
+    def __init__(self, result: "ColumnarResult", index: int):
+        self._result = result
+        self._index = index
+
+    def __getitem__(self, key: Union[int, str]) -> Any:
+        return self._result.column(key)[self._index]
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __len__(self) -> int:
+        return len(self._result.columns)
+
+    def __iter__(self) -> Iterator[Any]:
+        return (self[i] for i in range(len(self)))
+
+    def __eq__(self, other: Any) -> bool:
+        return tuple(self) == tuple(other)
+
+    def asDict(self) -> Dict[str, Any]:  # noqa: N802 - mirrors pyspark.sql.Row
+        return dict(zip(self._result.columns, self))
+
+    def __repr__(self) -> str:
+        return "RowView(" + ", ".join(f"{k}={v!r}" for k, v in self.asDict().items()) + ")"
+
+
+class ColumnarResult:
+    def __init__(self, columns: Sequence[str], table=None, lists: Optional[Dict[int, list]] = None):
+        self.columns = list(columns)
+        self.arrow = table
+        # Keyed by position: results may repeat a column name.
+        self._lists: Dict[int, list] = dict(lists or {})
+        # Set by ResultCache when the result was read back from disk.
+        self.from_cache = False
+        if table is not None:
+            self.num_rows = table.num_rows
+        else:
+            self.num_rows = len(next(iter(self._lists.values()), []))
+
+    @classmethod
+    def from_rows(cls, columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> "ColumnarResult":
+        values = list(zip(*rows)) if rows else [() for _ in columns]
+        return cls(columns, lists={i: list(v) for i, v in enumerate(values)})
+
+    def _position(self, key: Union[int, str]) -> int:
+        if isinstance(key, int):
+            return range(len(self.columns))[key]
+        if key in self.columns:
+            return self.columns.index(key)
+        # Spark resolves column names case-insensitively.
+        for i, name in enumerate(self.columns):
+            if name.lower() == key.lower():
+                return i
+        raise KeyError(key)
+
+    def column(self, key: Union[int, str]) -> list:
+        """Python values of one column, converted on first access."""
+        index = self._position(key)
+        if index not in self._lists:
+            self._lists[index] = self.arrow.column(index).to_pylist()
+        return self._lists[index]
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [RowView(self, i) for i in range(*index.indices(self.num_rows))]
+        if index < 0:
+            index += self.num_rows
+        if not 0 <= index < self.num_rows:
+            raise IndexError(index)
+        return RowView(self, index)
+
+    def __iter__(self) -> Iterator[RowView]:
+        return (RowView(self, i) for i in range(self.num_rows))
+
+    def first(self) -> Optional[RowView]:
+        return self[0] if self.num_rows else None
+
+    def scalar(self) -> Any:
+        """The first column of the first row (``df.first()[0]``)."""
+        return self.column(0)[0] if self.num_rows else None
+
+    def rows(self) -> List[Any]:
+        """The result as ``pyspark.sql.Row`` objects."""
+        from pyspark.sql import Row
+
+        make = Row(*self.columns)
+        columns = [self.column(i) for i in range(len(self.columns))]
+        return [make(*values) for values in zip(*columns)]
+
+    def to_pandas(self):
+        if self.arrow is not None:
+            return self.arrow.to_pandas()
+        import pandas as pd
+
+        return pd.DataFrame(
+            {i: self.column(i) for i in range(len(self.columns))}
+        ).set_axis(self.columns, axis=1)
+
+
+def fetch(df, limit: Optional[int] = None) -> ColumnarResult:
+    """Run ``df`` (at most ``limit`` rows) and return its result columnar."""
+    if limit is not None:
+        df = df.limit(limit)
+    if _have_pyarrow():
+        import pyarrow as pa
+
+        batches = df._collect_as_arrow()
+        if batches:
+            table = pa.Table.from_batches(batches)
+        else:
+            from pyspark.sql.pandas.types import to_arrow_schema
+
+            table = to_arrow_schema(df.schema).empty_table()
+        return ColumnarResult(df.columns, table=table)
+    return ColumnarResult.from_rows(df.columns, df.collect())
@@ -0,0 +1,116 @@
+"""The lesson's queries over synthetic data at increasing scale.
+
+For every scale the synthetic lake is generated (once), the lesson's views
+are registered over it and each query of ``SSQL 06 - Data Lakes`` is timed.
+The batched TEST expectations, scaled, are checked first so a timing is never
+reported for wrong results.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from deltaplus import cities, synth
+from deltaplus.arrow import fetch
+from deltaplus.checks import data_lakes_checks
+from deltaplus.jobs import JobGroup
+
+DISPLAY_LIMIT = 1000
+
+# (name, SQL, collect everything?) -- preview cells only fetch a screenful,
+# like the notebook's display().
+LESSON_QUERIES: Tuple[Tuple[str, str, bool], ...] = (
+    ("preview-new-york", "SELECT * FROM CrimeDataNewYork", False),
+    ("preview-boston", "SELECT * FROM CrimeDataBoston", False),
+    ("count-chicago", "SELECT count(*) FROM CrimeDataChicago", True),
+    ("union-sorted", "SELECT * FROM HomicidesBostonAndNewYork ORDER BY month", True),
+    (
+        "union-by-month",
+        "SELECT month, count(*) AS homicides FROM HomicidesBostonAndNewYork "
+        "GROUP BY month ORDER BY month",
+        True,
+    ),
+    ("all-homicides-count", "SELECT count(*) AS total FROM AllHomicides", True),
+    ("homicides-by-month", "SELECT * FROM HomicidesByMonth", True),
+)
+
+
+@dataclass
+class QueryTiming:
+    scale: int
+    query: str
+    rows: int
+    best_s: float
+    mean_s: float
+    jobs: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def register_lesson_views(spark, specs) -> None:
+    """Create the views the Data Lakes notebook builds, over ``specs``."""
+    cities.register_views(spark, specs)
+    spark.sql(
+        "CREATE OR REPLACE TEMPORARY VIEW HomicidesBostonAndNewYork AS "
+        "SELECT * FROM HomicidesNewYork UNION ALL SELECT * FROM HomicidesBoston"
+    )
+    spark.sql(
+        "CREATE OR REPLACE TEMPORARY VIEW HomicidesByMonth AS "
+        "SELECT month, count(*) AS homicides FROM AllHomicides GROUP BY month ORDER BY month"
+    )
+
+
+def _time_query(spark, sql: str, collect: bool, repeat: int) -> Tuple[int, List[float], int]:
+    times, rows, jobs = [], 0, 0
+    for _ in range(max(1, repeat)):
+        with JobGroup(spark.sparkContext, sql) as group:
+            start = time.perf_counter()
+            df = spark.sql(sql)
+            rows = len(fetch(df, None if collect else DISPLAY_LIMIT))
+            times.append(time.perf_counter() - start)
+        jobs = group.jobs
+    return rows, times, jobs
+
+
+def run(
+    spark,
+    scales: Sequence[int] = synth.SCALES,
+    repeat: int = 3,
+    root: Optional[str] = None,
+    queries: Sequence[Tuple[str, str, bool]] = LESSON_QUERIES,
+) -> List[QueryTiming]:
+    results = []
+    for scale in scales:
+        specs = synth.generate(spark, scale=scale, root=root)
+        register_lesson_views(spark, specs)
+        data_lakes_checks(spark, scale=scale).run().raise_for_failures()
+        for name, sql, collect in queries:
+            rows, times, jobs = _time_query(spark, sql, collect, repeat)
+            results.append(
+                QueryTiming(scale, name, rows, min(times), sum(times) / len(times), jobs)
+            )
+    return results
+
+
+def format_results(results: List[QueryTiming]) -> str:
+    scales = sorted({r.scale for r in results})
+    names = list(dict.fromkeys(r.query for r in results))
+    best = {(r.scale, r.query): r.best_s for r in results}
+    header = f"{'query':<22}" + "".join(f"{'x' + str(s):>10}" for s in scales)
+    lines = [header]
+    for name in names:
+        cells = "".join(
+            f"{best[(s, name)]:>10.3f}" if (s, name) in best else f"{'-':>10}" for s in scales
+        )
+        lines.append(f"{name:<22}{cells}")
+    if len(scales) > 1:
+        lo, hi = scales[0], scales[-1]
+        lines.append("")
+        lines.append(f"growth x{lo} -> x{hi} (data grows {hi // lo}x):")
+        for name in names:
+            if (lo, name) in best and (hi, name) in best and best[(lo, name)] > 0:
+                lines.append(f"  {name:<20} {best[(hi, name)] / best[(lo, name)]:>8.1f}x")
+    return "\n".join(lines)
@@ -0,0 +1,82 @@
+"""Bytes scanned by the homicide filter, raw files versus golden tables.
+
+"Before" is the lesson's filter on the raw city file: ``lower(col) LIKE ...``
+cannot be pushed into the Parquet reader, so every row group of the offense
+and date columns is decoded.  "After" is ``offense_category = 'homicide'`` on
+the golden table, whose sorted layout lets the reader skip every row group
+whose min/max range excludes ``homicide``.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+from deltaplus.cities import HOMICIDE
+from deltaplus.golden import GoldenStore
+from deltaplus.parquet import ScanEstimate, estimate_scan
+
+
+@dataclass
+class SkippingResult:
+    city: str
+    before: ScanEstimate
+    after: ScanEstimate
+    raw_query_s: float
+    golden_query_s: float
+    homicides: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "city": self.city,
+            "before": self.before.to_dict(),
+            "after": self.after.to_dict(),
+            "raw_query_s": self.raw_query_s,
+            "golden_query_s": self.golden_query_s,
+            "homicides": self.homicides,
+        }
+
+
+def _best_of(repeat: int, fn: Callable[[], Any]):
+    best, value = float("inf"), None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def run(spark, store: GoldenStore, repeat: int = 3) -> List[SkippingResult]:
+    store.refresh()
+    results = []
+    for spec in store.cities:
+        before = estimate_scan(spec.local_path, spec.source_columns)
+        after = estimate_scan(
+            store.table_path(spec),
+            ["offense_category", "month"],
+            equals={"offense_category": HOMICIDE},
+        )
+        raw_s, raw_count = _best_of(repeat, lambda: spec.homicides(spark).count())
+        golden_s, golden_count = _best_of(repeat, lambda: store.homicides(spec).count())
+        if raw_count != golden_count:
+            raise AssertionError(
+                f"{spec.name}: golden table has {golden_count} homicides, raw data {raw_count}"
+            )
+        results.append(SkippingResult(spec.name, before, after, raw_s, golden_s, raw_count))
+    return results
+
+
+def format_results(results: List[SkippingResult]) -> str:
+    lines = [
+        f"{'city':<10} {'homicides':>9} {'rg read':>11} {'bytes before':>13} "
+        f"{'bytes after':>12} {'raw_s':>7} {'golden_s':>8}"
+    ]
+    for r in results:
+        lines.append(
+            f"{r.city:<10} {r.homicides:>9} "
+            f"{r.after.row_groups_read:>5}/{r.after.row_groups:<5} "
+            f"{r.before.bytes_read:>13} {r.after.bytes_read:>12} "
+            f"{r.raw_query_s:>7.3f} {r.golden_query_s:>8.3f}"
+        )
+    return "\n".join(lines)
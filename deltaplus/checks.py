@@ -0,0 +1,229 @@
+"""Batched expectations for the lessons' TEST cells.
+
+The TEST cells run one query per cell and then call ``dbTest`` once per
+value, stopping at the first mismatch.  :class:`BatchChecker` takes a set of
+named expectations, compiles all expectations on the same view into a single
+aggregation query (one Spark job per view instead of one per cell) and
+reports every mismatch at once.
+
+Each expectation is an aggregate expression over a view::
+
+    checker = BatchChecker(spark)
+    checker.count("SQL-L6-allHomicides-count", "AllHomicides", 1203)
+    checker.keyed("SQL-L6-allHomicides", "HomicidesByMonth", "month", "homicides",
+                  {1: 83, 2: 68})
+    report = checker.run()
+    report.raise_for_failures()
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional
+
+from deltaplus.arrow import fetch
+from deltaplus.jobs import JobGroup
+
+
+def _literal(value: Any) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+    if value is None:
+        return "NULL"
+    return repr(value)
+
+
+def _name(prefix: str, key: Any, names: Optional[Mapping[Any, str]]) -> str:
+    if names is not None and key in names:
+        return names[key]
+    return f"{prefix}-{key}"
+
+
+@dataclass(frozen=True)
+class Expectation:
+    name: str
+    view: str
+    aggregate: str
+    expected: Any
+
+
+@dataclass
+class CheckResult:
+    name: str
+    view: str
+    expected: Any
+    actual: Any = None
+    error: Optional[str] = None
+
+    @property
+    def passed(self) -> bool:
+        return self.error is None and self.actual == self.expected
+
+
+@dataclass
+class CheckReport:
+    results: List[CheckResult] = field(default_factory=list)
+    view_times_s: Dict[str, float] = field(default_factory=dict)
+    jobs: int = 0
+    wall_time_s: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(r.passed for r in self.results)
+
+    @property
+    def failures(self) -> List[CheckResult]:
+        return [r for r in self.results if not r.passed]
+
+    def summary(self) -> str:
+        lines = [
+            f"{len(self.results) - len(self.failures)}/{len(self.results)} expectations passed "
+            f"in {self.wall_time_s:.3f}s ({len(self.view_times_s)} views, {self.jobs} jobs)"
+        ]
+        for view, seconds in self.view_times_s.items():
+            lines.append(f"  {view:<28} {seconds:.3f}s")
+        for r in self.failures:
+            if r.error:
+                lines.append(f"  FAIL {r.name}: {r.error}")
+            else:
+                lines.append(f"  FAIL {r.name}: expected {r.expected!r}, got {r.actual!r}")
+        return "\n".join(lines)
+
+    def raise_for_failures(self) -> None:
+        if not self.ok:
+            raise AssertionError(self.summary())
+
+
+class BatchChecker:
+    def __init__(self, spark, cache=None):
+        self.spark = spark
+        # Optional ResultCache: unchanged views over unchanged files are
+        # checked without running a job.
+        self._fetch = cache.fetch if cache is not None else fetch
+        self.expectations: List[Expectation] = []
+
+    def expect(self, name: str, view: str, aggregate: str, expected: Any) -> "BatchChecker":
+        """Expect the SQL aggregate ``aggregate`` over ``view`` to equal ``expected``."""
+        self.expectations.append(Expectation(name, view, aggregate, expected))
+        return self
+
+    def count(self, name: str, view: str, expected: int, where: Optional[str] = None) -> "BatchChecker":
+        aggregate = f"count(CASE WHEN {where} THEN 1 END)" if where else "count(*)"
+        return self.expect(name, view, aggregate, expected)
+
+    def keyed(
+        self,
+        prefix: str,
+        view: str,
+        key: str,
+        value: str,
+        expected: Mapping[Any, Any],
+        names: Optional[Mapping[Any, str]] = None,
+    ) -> "BatchChecker":
+        """Expect ``value`` in the row where ``key`` equals each mapping key.
+
+        Adds one expectation per entry, named ``<prefix>-<key>`` unless
+        ``names`` maps the key to a name of its own.
+        """
+        for k, v in expected.items():
+            aggregate = f"max(CASE WHEN {key} = {_literal(k)} THEN {value} END)"
+            self.expect(_name(prefix, k, names), view, aggregate, v)
+        return self
+
+    def grouped_counts(
+        self,
+        prefix: str,
+        view: str,
+        key: str,
+        expected: Mapping[Any, int],
+        names: Optional[Mapping[Any, str]] = None,
+    ) -> "BatchChecker":
+        """Expect the number of rows per ``key`` value, named as in :meth:`keyed`."""
+        for k, v in expected.items():
+            self.count(_name(prefix, k, names), view, v, where=f"{key} = {_literal(k)}")
+        return self
+
+    def run(self) -> CheckReport:
+        by_view: "OrderedDict[str, List[Expectation]]" = OrderedDict()
+        for exp in self.expectations:
+            by_view.setdefault(exp.view, []).append(exp)
+
+        report = CheckReport()
+        start = time.perf_counter()
+        for view, expectations in by_view.items():
+            # Identical aggregates (e.g. two names for count(*)) share a column.
+            columns: "OrderedDict[str, str]" = OrderedDict()
+            for exp in expectations:
+                columns.setdefault(exp.aggregate, f"c{len(columns)}")
+            select = ", ".join(f"{agg} AS {alias}" for agg, alias in columns.items())
+            query = f"SELECT {select} FROM {view}"
+
+            group = JobGroup(self.spark.sparkContext, f"checks {view}")
+            view_start = time.perf_counter()
+            row, error = None, None
+            with group:
+                try:
+                    row = self._fetch(self.spark.sql(query)).first()
+                except Exception as exc:  # noqa: BLE001 - reported per expectation
+                    error = str(exc).splitlines()[0]
+            report.view_times_s[view] = time.perf_counter() - view_start
+            report.jobs += group.jobs
+
+            for exp in expectations:
+                if error is not None:
+                    report.results.append(CheckResult(exp.name, view, exp.expected, error=error))
+                    continue
+                actual = row[columns[exp.aggregate]] if row is not None else None
+                report.results.append(CheckResult(exp.name, view, exp.expected, actual))
+        report.wall_time_s = time.perf_counter() - start
+        return report
+
+
+DATA_LAKES_HOMICIDES_BY_MONTH = {
+    1: 83, 2: 68, 3: 72, 4: 76, 5: 105, 6: 120,
+    7: 116, 8: 144, 9: 109, 10: 109, 11: 111, 12: 90,
+}
+
+
+def _positional(prefix: str, months) -> Dict[int, str]:
+    """Test IDs of the rows of a view sorted by month (month 1 is row 0)."""
+    return {m: f"{prefix}-{m - 1}" for m in months}
+
+
+def data_lakes_checks(spark, scale: int = 1, cache=None) -> BatchChecker:
+    """Every TEST-cell assertion of ``SSQL 06 - Data Lakes`` as one batch.
+
+    Positional checks from the notebook (``allHomicides[6]`` ...) are keyed by
+    month here, since the views are sorted by month, but keep the notebook's
+    ``dbTest`` IDs (month 7 is ``SQL-L6-allHomicides-6``).  ``scale``
+    multiplies the expected counts, for synthetic data generated at that
+    scale.
+    """
+    checker = BatchChecker(spark, cache=cache)
+    checker.count("SQL-L6-crimeDataChicago-count", "CrimeDataChicago", 267872 * scale)
+
+    checker.expect("SQL-L6-homicideChicago-len", "HomicidesChicago", "count(DISTINCT month)", 12)
+    checker.grouped_counts(
+        "SQL-L6-homicideChicago", "HomicidesChicago", "month",
+        {1: 54 * scale, 7: 71 * scale, 12: 58 * scale},
+        names=_positional("SQL-L6-homicideChicago", (1, 7, 12)),
+    )
+
+    checker.count("SQL-L6-allHomicides-count", "AllHomicides", 1203 * scale)
+
+    checker.count("SQL-L6-homicidesByMonth-len", "HomicidesByMonth", 12)
+    checker.expect("SQL-L6-homicidesByMonth-0", "HomicidesByMonth", "min(month)", 1)
+    checker.expect("SQL-L6-homicidesByMonth-11", "HomicidesByMonth", "max(month)", 12)
+    checker.keyed(
+        "SQL-L6-allHomicides", "HomicidesByMonth", "month", "homicides",
+        {m: n * scale for m, n in DATA_LAKES_HOMICIDES_BY_MONTH.items()},
+        names=_positional("SQL-L6-allHomicides", DATA_LAKES_HOMICIDES_BY_MONTH),
+    )
+    return checker
+
+
+LESSON_CHECKS = {
+    "data-lakes": data_lakes_checks,
+}
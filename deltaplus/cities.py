@@ -0,0 +1,364 @@
+"""Config-driven per-city normalization of the crime-data lake.
+
+Each city publishes its crime data with its own column names and offense
+vocabulary.  A :class:`CitySpec` captures what the lesson's ``Homicides*``
+views do by hand: which file to read, how to recognise a homicide and how to
+derive the month.  Specs are declared in a JSON mapping (``cities.json`` next
+to this module by default, or ``$DELTAPLUS_CITIES``)::
+
+    {"cities": [
+      {"name": "Boston", "key": "Boston",
+       "path": "dbfs:/mnt/training/crime-data-2016/Crime-Data-Boston-2016.parquet",
+       "offense_column": "OFFENSE_CODE_GROUP",
+       "homicide": {"equals": ["homicide"]},
+       "date_column": "MONTH", "month": "integer"}
+    ]}
+
+``homicide`` rules match the lower-cased offense value by ``equals``,
+``prefix`` or ``contains``; ``month`` is ``"timestamp"`` (``month(col)``),
+``"integer"`` (the column already is the month) or ``"string"`` (parsed with
+``date_format``).  Cities whose month is an integer column may name a
+``year_column``; otherwise the year comes from the date column.
+
+The normalized rows carry a canonical ``offense_category``: ``"homicide"`` for
+everything the city's homicide rules match and the lower-cased raw offense
+otherwise.  Filtering on ``offense_category = 'homicide'`` is a plain column
+comparison that Parquet can push down, unlike the lesson's
+``lower(col) LIKE ...`` predicates.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import reduce
+from typing import Any, Dict, List, Optional, Tuple
+
+from deltaplus import footers, paths
+
+NORMALIZED_COLUMNS = ("city", "month", "offense", "offense_category")
+HOMICIDE = "homicide"
+
+CITIES_ENV = "DELTAPLUS_CITIES"
+DEFAULT_CONFIG = os.path.join(os.path.dirname(__file__), "cities.json")
+
+MATCH_KINDS = ("equals", "prefix", "contains")
+MONTH_KINDS = ("timestamp", "integer", "string")
+
+
+def _sql_string(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# Spark datetime pattern letters -> strptime directives (the subset city
+# date formats use).
+_PATTERN_TOKENS = (
+    ("yyyy", "%Y"), ("yy", "%y"), ("MMM", "%b"), ("MM", "%m"), ("dd", "%d"),
+    ("HH", "%H"), ("hh", "%I"), ("mm", "%M"), ("ss", "%S"), ("SSS", "%f"),
+    ("XXX", "%z"), ("Z", "%z"), ("a", "%p"),
+)
+_PATTERN_RE = re.compile("'[^']*'|" + "|".join(re.escape(t) for t, _ in _PATTERN_TOKENS))
+_TIMESTAMP_FORMATS = ("%m/%d/%Y %I:%M:%S %p", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y")
+
+
+def strptime_format(pattern: str) -> str:
+    """The ``strptime`` format for a Spark datetime pattern."""
+    directives = dict(_PATTERN_TOKENS)
+    return _PATTERN_RE.sub(
+        lambda m: m.group(0)[1:-1] if m.group(0).startswith("'") else directives[m.group(0)],
+        pattern,
+    )
+
+
+def _parse_timestamp(value: Any, pattern: Optional[str] = None) -> Optional[datetime]:
+    """Parse a raw date value the way the city's Spark expression would."""
+    if value is None or isinstance(value, datetime):
+        return value
+    text = str(value).strip()
+    if not text:
+        return None
+    if pattern:
+        candidates = [lambda t: datetime.strptime(t, strptime_format(pattern))]
+    else:
+        candidates = [lambda t: datetime.fromisoformat(t.replace("Z", "+00:00"))]
+        candidates += [lambda t, f=f: datetime.strptime(t, f) for f in _TIMESTAMP_FORMATS]
+    for parse in candidates:
+        try:
+            parsed = parse(text)
+        except ValueError:
+            continue
+        # Spark's month() works in the session time zone, UTC here.
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    return None
+
+
+@dataclass(frozen=True)
+class CitySpec:
+    name: str
+    key: str
+    path: str
+    offense_column: str
+    # ((kind, value), ...) matched against lower(offense_column).
+    homicide_rules: Tuple[Tuple[str, str], ...]
+    date_column: str
+    month: str = "timestamp"
+    date_format: Optional[str] = None
+    year_column: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, Any]) -> "CitySpec":
+        name = entry.get("name", "<unnamed>")
+        required = ("name", "path", "offense_column", "homicide", "date_column")
+        missing = [k for k in required if k not in entry]
+        if missing:
+            raise ValueError(f"city {name!r}: missing {', '.join(missing)}")
+        rules = []
+        for kind, values in entry["homicide"].items():
+            if kind not in MATCH_KINDS:
+                raise ValueError(f"city {name!r}: unknown homicide rule {kind!r}")
+            if isinstance(values, str):
+                values = [values]
+            rules.extend((kind, str(v).lower()) for v in values)
+        if not rules:
+            raise ValueError(f"city {name!r}: no homicide rules")
+        month = entry.get("month", "timestamp")
+        if month not in MONTH_KINDS:
+            raise ValueError(f"city {name!r}: month must be one of {', '.join(MONTH_KINDS)}")
+        if month == "string" and not entry.get("date_format"):
+            raise ValueError(f"city {name!r}: month 'string' needs a date_format")
+        return cls(
+            name=name,
+            key=entry.get("key") or "".join(w.capitalize() for w in name.split()),
+            path=entry["path"],
+            offense_column=entry["offense_column"],
+            homicide_rules=tuple(rules),
+            date_column=entry["date_column"],
+            month=month,
+            date_format=entry.get("date_format"),
+            year_column=entry.get("year_column"),
+        )
+
+    @property
+    def source_view(self) -> str:
+        return f"CrimeData{self.key}"
+
+    @property
+    def homicides_view(self) -> str:
+        return f"Homicides{self.key}"
+
+    @property
+    def local_path(self) -> str:
+        return paths.resolve(self.path)
+
+    @property
+    def offense_filter(self) -> str:
+        """SQL predicate selecting this city's homicide rows."""
+        column = f"lower({self.offense_column})"
+        terms = []
+        for kind, value in self.homicide_rules:
+            if kind == "equals":
+                terms.append(f"{column} = {_sql_string(value)}")
+            elif kind == "prefix":
+                terms.append(f"{column} LIKE {_sql_string(_like_escape(value) + '%')}")
+            else:
+                terms.append(f"{column} LIKE {_sql_string('%' + _like_escape(value) + '%')}")
+        return " OR ".join(terms)
+
+    @property
+    def month_expr(self) -> str:
+        if self.month == "integer":
+            return self.date_column
+        if self.month == "string":
+            return f"month(to_timestamp({self.date_column}, {_sql_string(self.date_format)}))"
+        return f"month({self.date_column})"
+
+    @property
+    def year_expr(self) -> str:
+        if self.month == "integer":
+            return self.year_column or "CAST(NULL AS INT)"
+        if self.month == "string":
+            return f"year(to_timestamp({self.date_column}, {_sql_string(self.date_format)}))"
+        return f"year({self.date_column})"
+
+    @property
+    def category_expr(self) -> str:
+        return (
+            f"CASE WHEN {self.offense_filter} THEN '{HOMICIDE}' "
+            f"ELSE lower(trim({self.offense_column})) END"
+        )
+
+    @property
+    def source_columns(self) -> List[str]:
+        """Raw columns the normalization reads."""
+        return [self.offense_column, self.date_column]
+
+    def is_homicide(self, offense: Optional[str]) -> bool:
+        """Python twin of :attr:`offense_filter`, for rows outside Spark."""
+        if offense is None:
+            return False
+        value = str(offense).lower()
+        for kind, rule in self.homicide_rules:
+            if kind == "equals" and value == rule:
+                return True
+            if kind == "prefix" and value.startswith(rule):
+                return True
+            if kind == "contains" and rule in value:
+                return True
+        return False
+
+    def category_of(self, offense: Optional[str]) -> Optional[str]:
+        """Python twin of :attr:`category_expr`."""
+        if self.is_homicide(offense):
+            return HOMICIDE
+        return None if offense is None else str(offense).strip().lower()
+
+    def month_of(self, value: Any) -> Optional[int]:
+        """Python twin of :attr:`month_expr` for a raw (text) value."""
+        if self.month == "integer":
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+        parsed = _parse_timestamp(value, self.date_format if self.month == "string" else None)
+        return None if parsed is None else parsed.month
+
+    def homicides_sql(self, source: str = "") -> str:
+        """The ``SELECT`` behind the lesson's ``Homicides<City>`` view."""
+        return (
+            f"SELECT {self.month_expr} AS month, {self.offense_column} AS offense\n"
+            f"FROM {source or self.source_view}\n"
+            f"WHERE {self.offense_filter}"
+        )
+
+    def read(self, spark):
+        # The schema comes from the footer cache, so re-registering a view
+        # over unchanged files skips schema inference.
+        return footers.read_parquet(spark, self.local_path)
+
+    def normalize(self, spark, source=None):
+        """Return normalized rows (see ``NORMALIZED_COLUMNS``) for all offenses."""
+        from pyspark.sql import functions as F
+
+        source = self.read(spark) if source is None else source
+        return source.select(
+            F.lit(self.name).alias("city"),
+            F.expr(self.month_expr).cast("int").alias("month"),
+            F.col(self.offense_column).alias("offense"),
+            F.expr(self.category_expr).alias("offense_category"),
+        )
+
+    def homicides(self, spark, source=None):
+        """Return ``(city, month, offense)`` homicide rows for this city."""
+        from pyspark.sql import functions as F
+
+        source = self.read(spark) if source is None else source
+        return source.where(F.expr(self.offense_filter)).select(
+            F.lit(self.name).alias("city"),
+            F.expr(self.month_expr).cast("int").alias("month"),
+            F.col(self.offense_column).alias("offense"),
+        )
+
+
+def load_cities(path: Optional[str] = None) -> Dict[str, CitySpec]:
+    """Load city specs from a JSON mapping, keyed by ``CitySpec.key``."""
+    path = path or os.environ.get(CITIES_ENV) or DEFAULT_CONFIG
+    with open(path, encoding="utf-8") as fh:
+        config = json.load(fh)
+    specs: Dict[str, CitySpec] = {}
+    for entry in config.get("cities", []):
+        spec = CitySpec.from_dict(entry)
+        if spec.key in specs:
+            raise ValueError(f"{path}: duplicate city key {spec.key!r}")
+        specs[spec.key] = spec
+    return specs
+
+
+CITIES: Dict[str, CitySpec] = load_cities(DEFAULT_CONFIG)
+
+
+def get_cities(keys: Optional[List[str]] = None, config: Optional[str] = None) -> List[CitySpec]:
+    """Look up city specs by key (all configured cities when ``keys`` is empty)."""
+    if config is None and CITIES_ENV not in os.environ:
+        cities = CITIES
+    else:
+        cities = load_cities(config)
+    if not keys:
+        return list(cities.values())
+    unknown = [k for k in keys if k not in cities]
+    if unknown:
+        raise KeyError(f"unknown cities: {', '.join(unknown)}")
+    return [cities[k] for k in keys]
+
+
+def read_sources(spark, cities: List[CitySpec], max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """Create the raw DataFrame of every city concurrently.
+
+    ``spark.read.parquet`` lists files and reads footers to infer the schema
+    on the driver before any job runs; with many cities doing that one city
+    at a time dominates planning, so the readers are created from a thread
+    pool.
+    """
+    if not cities:
+        return {}
+    workers = max_workers or min(32, len(cities))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="deltaplus-read") as pool:
+        frames = list(pool.map(lambda spec: spec.read(spark), cities))
+    return {spec.key: df for spec, df in zip(cities, frames)}
+
+
+def build_union(spark, cities: List[CitySpec], homicides_only: bool = True, sources=None):
+    """Union the normalized rows of all ``cities`` into one DataFrame.
+
+    The result is a single plan, so one Spark job scans every city's files in
+    parallel instead of one query per hand-written view.
+    """
+    if not cities:
+        raise ValueError("no cities to union")
+    sources = sources or read_sources(spark, cities)
+    parts = [
+        spec.homicides(spark, sources[spec.key])
+        if homicides_only
+        else spec.normalize(spark, sources[spec.key])
+        for spec in cities
+    ]
+    return reduce(lambda left, right: left.unionByName(right), parts)
+
+
+def register_views(spark, cities: List[CitySpec], union_view: str = "AllHomicides") -> List[str]:
+    """Register the lesson's per-city views and the unified homicide view.
+
+    Creates ``CrimeData<City>`` and ``Homicides<City>`` for every city and
+    ``union_view`` with ``(city, month, offense)`` over all of them.
+    """
+    sources = read_sources(spark, cities)
+    names = []
+    for spec in cities:
+        sources[spec.key].createOrReplaceTempView(spec.source_view)
+        homicides = spec.homicides(spark, sources[spec.key]).select("month", "offense")
+        homicides.createOrReplaceTempView(spec.homicides_view)
+        names += [spec.source_view, spec.homicides_view]
+    build_union(spark, cities, sources=sources).createOrReplaceTempView(union_view)
+    names.append(union_view)
+    return names
+
+
+def union_view_sql(cities: List[CitySpec], view: str = "AllHomicides") -> str:
+    """SQL text equivalent to :func:`build_union`, for pasting into notebooks."""
+    selects = [
+        f"  SELECT {_sql_string(spec.name)} AS city, {spec.month_expr} AS month, "
+        f"{spec.offense_column} AS offense\n"
+        f"  FROM parquet.`{spec.path}`\n"
+        f"  WHERE {spec.offense_filter}"
+        for spec in cities
+    ]
+    return f"CREATE OR REPLACE TEMPORARY VIEW {view} AS\n" + "\n    UNION ALL\n".join(selects)
@@ -0,0 +1,339 @@
+"""Local stand-in for the courseware's Classroom-Setup / Classroom-Cleanup.
+
+``setup`` prepares a notebook namespace the way the Databricks includes do
+(``spark``, ``sc``, ``dbTest``) but reuses the process-wide warm session and
+does no eager work: the crime-data lake is exposed as cached global temp
+views (``global_temp.CrimeData<City>``) that are only created, and their
+footers only read, when a statement first references them.  The lessons
+declare their own ``CrimeData*`` views ``USING parquet OPTIONS (path ...)``;
+:meth:`Classroom.redirect` points those at the global view over the same
+file, so the file is read (and cached) once however often a lesson
+declares and queries it.
+
+Every artifact the lesson creates -- temp views, tables, cached tables and
+output directories -- is recorded in a per-lesson manifest, and ``cleanup``
+drops exactly those, concurrently, instead of sweeping the whole catalog.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from deltaplus import paths
+
+log = logging.getLogger(__name__)
+
+CONTEXT_KEY = "__deltaplus_classroom__"
+NOTEBOOK_KEY = "__notebook_path__"
+MANIFEST_DIR = "dbfs:/deltaplus/manifests"
+GLOBAL_DB = "global_temp"
+
+_NAME = r"`?([\w.]+)`?"
+_CREATE_VIEW_RE = re.compile(
+    r"\bCREATE\s+(?:OR\s+REPLACE\s+)?(GLOBAL\s+)?(?:TEMP|TEMPORARY)\s+VIEW\s+"
+    r"(?:IF\s+NOT\s+EXISTS\s+)?" + _NAME,
+    re.I,
+)
+_CREATE_TABLE_RE = re.compile(
+    r"\bCREATE\s+(?:OR\s+REPLACE\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?" + _NAME, re.I
+)
+_CACHE_TABLE_RE = re.compile(r"\bCACHE\s+(?:LAZY\s+)?TABLE\s+" + _NAME, re.I)
+_GLOBAL_REF_RE = re.compile(r"\b" + GLOBAL_DB + r"\.`?(\w+)`?", re.I)
+_USING_PARQUET_RE = re.compile(
+    r"^\s*CREATE\s+(?:OR\s+REPLACE\s+)?(?:TEMP|TEMPORARY)\s+VIEW\s+`?(\w+)`?\s+"
+    r"USING\s+parquet\s+OPTIONS\s*\((.*)\)\s*$",
+    re.I | re.S,
+)
+_PATH_RE = re.compile(r"\bpath\s*=?\s*(['\"])(.*?)\1", re.I)
+
+
+def parquet_view(statement: str) -> Optional[Tuple[str, str]]:
+    """``(view, path)`` of ``CREATE TEMPORARY VIEW ... USING parquet OPTIONS (path ...)``."""
+    match = _USING_PARQUET_RE.match(statement)
+    option = match and _PATH_RE.search(match.group(2))
+    return (match.group(1), option.group(2)) if option else None
+
+
+def _path_key(path: str) -> str:
+    # Compared without resolving: resolving a mounted path fetches it.
+    if path.startswith("dbfs:"):
+        path = path[len("dbfs:"):]
+    return os.path.normpath(path)
+
+
+def created_names(statement: str) -> List[Tuple[str, str]]:
+    """``(manifest kind, name)`` of every artifact ``statement`` creates."""
+    created = []
+    for match in _CREATE_VIEW_RE.finditer(statement):
+        created.append(("global_views" if match.group(1) else "views", match.group(2)))
+    created += [("tables", m.group(1)) for m in _CREATE_TABLE_RE.finditer(statement)]
+    created += [("cached", m.group(1)) for m in _CACHE_TABLE_RE.finditer(statement)]
+    return created
+
+
+def db_test(test_id: str, expected: Any, result: Any) -> None:
+    """Stand-in for the courseware's ``dbTest`` assertion helper."""
+    if str(expected) != str(result):
+        raise AssertionError(f"{test_id}: expected {expected!r}, got {result!r}")
+
+
+@dataclass
+class Manifest:
+    lesson: str
+    views: List[str] = field(default_factory=list)
+    global_views: List[str] = field(default_factory=list)
+    tables: List[str] = field(default_factory=list)
+    cached: List[str] = field(default_factory=list)
+    paths: List[str] = field(default_factory=list)
+
+    @staticmethod
+    def location(lesson: str) -> str:
+        safe = re.sub(r"[^\w.-]+", "_", lesson)
+        return os.path.join(paths.resolve(MANIFEST_DIR), safe + ".json")
+
+    @classmethod
+    def load(cls, lesson: str) -> "Manifest":
+        try:
+            with open(cls.location(lesson), encoding="utf-8") as fh:
+                return cls(**json.load(fh))
+        except FileNotFoundError:
+            return cls(lesson=lesson)
+
+    def save(self) -> None:
+        target = self.location(self.lesson)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = target + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(asdict(self), fh, indent=2)
+        os.replace(tmp, target)
+
+    def delete(self) -> None:
+        try:
+            os.remove(self.location(self.lesson))
+        except FileNotFoundError:
+            pass
+
+    def add(self, kind: str, name: str) -> bool:
+        entries = getattr(self, kind)
+        if name in entries:
+            return False
+        entries.append(name)
+        return True
+
+    def __len__(self) -> int:
+        return sum(len(getattr(self, k)) for k in ("views", "global_views", "tables", "cached", "paths"))
+
+
+class LazyViews:
+    """Global temp views created on first reference.
+
+    ``register`` only stores a factory (and the file the view reads, if
+    any); ``ensure`` scans statement text for ``global_temp.<name>``
+    references and materializes the views it needs.  With ``cache=True``
+    each view is also cached lazily, on its first scan.
+    """
+
+    def __init__(self, spark, cache: bool = False):
+        self.spark = spark
+        self.cache = cache
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._paths: Dict[str, str] = {}
+        self._created: set = set()
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any], path: Optional[str] = None) -> None:
+        self._factories[name.lower()] = factory
+        if path is not None:
+            self._paths[_path_key(path)] = name.lower()
+
+    def view_for(self, path: str) -> Optional[str]:
+        """The registered view over ``path`` (a ``dbfs:`` or local path)."""
+        return self._paths.get(_path_key(path))
+
+    @property
+    def names(self) -> List[str]:
+        return sorted(self._factories)
+
+    def ensure(self, text: str) -> List[str]:
+        wanted = {m.group(1).lower() for m in _GLOBAL_REF_RE.finditer(text)}
+        created = []
+        for name in sorted(wanted & set(self._factories)):
+            with self._lock:
+                if name in self._created:
+                    continue
+                self._factories[name]().createOrReplaceGlobalTempView(name)
+                if self.cache:
+                    self.spark.sql(f"CACHE LAZY TABLE {GLOBAL_DB}.{name}")
+                self._created.add(name)
+            created.append(name)
+        return created
+
+
+class Classroom:
+    """Per-lesson state shared between the setup and cleanup includes.
+
+    A ``hosted`` classroom was prepared by an embedding process (see
+    :mod:`deltaplus.grading`); the setup include keeps it as it is and the
+    cleanup include leaves its artifacts to the host.
+    """
+
+    def __init__(self, spark, manifest: Manifest, lazy_views: LazyViews, hosted: bool = False):
+        self.spark = spark
+        self.manifest = manifest
+        self.lazy_views = lazy_views
+        self.hosted = hosted
+        self._lock = threading.Lock()
+
+    def redirect(self, statement: str) -> str:
+        """Point a lesson's ``USING parquet`` view over a lake file at its global view.
+
+        Takes the statement before its ``dbfs:`` paths are rewritten.
+        """
+        found = parquet_view(statement)
+        name = found and self.lazy_views.view_for(found[1])
+        if not name:
+            return statement
+        return f"CREATE OR REPLACE TEMPORARY VIEW {found[0]} AS SELECT * FROM {GLOBAL_DB}.{name}"
+
+    def before_sql(self, text: str) -> None:
+        for name in self.lazy_views.ensure(text):
+            self._record("global_views", name)
+            if self.lazy_views.cache:
+                self._record("cached", f"{GLOBAL_DB}.{name}")
+
+    def record_sql(self, statement: str) -> None:
+        """Note the artifacts a statement created."""
+        for kind, name in created_names(statement):
+            self._record(kind, name)
+
+    def track_path(self, path: str) -> None:
+        """Note an output directory or file the lesson wrote."""
+        self._record("paths", paths.resolve(path))
+
+    def _record(self, kind: str, name: str) -> None:
+        # Cells may run concurrently (see deltaplus.dag).
+        with self._lock:
+            if self.manifest.add(kind, name):
+                self.manifest.save()
+
+
+def _lesson_name(namespace: Optional[Dict[str, Any]]) -> str:
+    notebook = (namespace or {}).get(NOTEBOOK_KEY)
+    if notebook:
+        return os.path.splitext(os.path.basename(notebook))[0]
+    return "default"
+
+
+def setup(
+    namespace: Optional[Dict[str, Any]] = None,
+    lesson: Optional[str] = None,
+    spark=None,
+) -> Classroom:
+    """Prepare ``namespace`` (usually a notebook's ``globals()``) for a lesson."""
+    from deltaplus.arrow import fetch
+    from deltaplus.cities import get_cities
+    from deltaplus.session import get_spark, warm_up
+
+    existing = (namespace or {}).get(CONTEXT_KEY)
+    if existing is not None and existing.hosted:
+        return existing
+
+    spark = spark or (namespace or {}).get("spark") or get_spark()
+    warm_up(spark)
+
+    lazy = LazyViews(spark, cache=True)
+    for spec in get_cities():
+        lazy.register(spec.source_view, lambda spec=spec: spec.read(spark), path=spec.path)
+
+    classroom = Classroom(spark, Manifest.load(lesson or _lesson_name(namespace)), lazy)
+    if namespace is not None:
+        namespace.update({
+            "spark": spark,
+            "sc": spark.sparkContext,
+            "dbTest": db_test,
+            "fetch": fetch,
+            CONTEXT_KEY: classroom,
+        })
+    return classroom
+
+
+@dataclass
+class CleanupResult:
+    dropped: int = 0
+    failed: List[str] = field(default_factory=list)
+    wall_time_s: float = 0.0
+
+
+def cleanup(
+    namespace: Optional[Dict[str, Any]] = None,
+    classroom: Optional[Classroom] = None,
+    max_workers: int = 8,
+    force: bool = False,
+) -> CleanupResult:
+    """Drop every artifact recorded in the lesson's manifest, concurrently.
+
+    A hosted classroom is only cleaned up with ``force=True``, by its host.
+    """
+    classroom = classroom or (namespace or {}).get(CONTEXT_KEY)
+    if classroom is None:
+        classroom = setup(namespace)
+    if classroom.hosted and not force:
+        return CleanupResult()
+    spark, manifest = classroom.spark, classroom.manifest
+    catalog = spark.catalog
+
+    # Cached tables are released before the views and tables they cache are
+    # dropped; everything within a phase is independent.
+    uncache = [
+        (f"uncache {n}", lambda n=n: spark.sql(f"UNCACHE TABLE IF EXISTS {n}"))
+        for n in manifest.cached
+    ]
+    drop: List[tuple] = []
+    drop += [(f"view {n}", lambda n=n: catalog.dropTempView(n)) for n in manifest.views]
+    drop += [
+        (f"global view {n}", lambda n=n: catalog.dropGlobalTempView(n))
+        for n in manifest.global_views
+    ]
+    drop += [(f"table {n}", lambda n=n: spark.sql(f"DROP TABLE IF EXISTS {n}")) for n in manifest.tables]
+    drop += [(f"path {p}", lambda p=p: _remove_path(p)) for p in manifest.paths]
+
+    result = CleanupResult()
+    start = time.perf_counter()
+
+    def _run(action):
+        label, fn = action
+        try:
+            fn()
+            return None
+        except Exception as exc:  # noqa: BLE001 - collected and reported
+            log.warning("cleanup of %s failed: %s", label, exc)
+            return label
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="deltaplus-cleanup") as pool:
+        for phase in (uncache, drop):
+            for failed in pool.map(_run, phase):
+                if failed is None:
+                    result.dropped += 1
+                else:
+                    result.failed.append(failed)
+    if not result.failed:
+        manifest.delete()
+        classroom.manifest = Manifest(lesson=manifest.lesson)
+    result.wall_time_s = time.perf_counter() - start
+    return result
+
+
+def _remove_path(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,732 @@
+"""Command-line entry point: ``python -m deltaplus <command> ...``."""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import time
+from typing import List, Optional
+
+
+def _add_spark_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--master", default="local[*]", help="Spark master URL")
+    parser.add_argument(
+        "--conf", action="append", default=[], metavar="KEY=VALUE",
+        help="extra Spark configuration (repeatable)",
+    )
+    parser.add_argument("--dbfs-root", help="local directory standing in for dbfs:/")
+    _add_mount_args(parser)
+
+
+def _add_mount_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--mount-source", metavar="DIR",
+        help="directory standing in for the dbfs:/mnt/training mount, read through the block cache",
+    )
+    parser.add_argument("--mount-cache", help="block cache directory (default dbfs:/deltaplus/cache/mounts)")
+    parser.add_argument("--mount-cache-mb", type=int, default=4096, help="block cache size limit")
+    parser.add_argument(
+        "--mount-latency-ms", type=float, default=0.0, help="simulated latency per remote read",
+    )
+
+
+def _mount_from_args(args: argparse.Namespace):
+    from deltaplus.mounts import install
+
+    # Installed once per command, however often Spark is (re)built.
+    if getattr(args, "_mount_handle", None) is None:
+        args._mount_handle = install(
+            args.mount_source, cache_dir=args.mount_cache, max_bytes=args.mount_cache_mb << 20,
+            latency_s=args.mount_latency_ms / 1000,
+        )
+    return args._mount_handle
+
+
+def _add_city_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--city", action="append", help="limit to this city key (repeatable)")
+    parser.add_argument("--cities-config", help="JSON city mapping (default: bundled cities.json)")
+
+
+def _cities_from_args(args: argparse.Namespace):
+    from deltaplus.cities import get_cities
+
+    return get_cities(args.city, config=args.cities_config)
+
+
+def _spark_from_args(args: argparse.Namespace):
+    from deltaplus import paths
+    from deltaplus.session import get_spark
+
+    if args.dbfs_root:
+        paths.set_dbfs_root(args.dbfs_root)
+    if args.mount_source:
+        _mount_from_args(args)
+    conf = dict(item.split("=", 1) for item in args.conf)
+    return get_spark(master=args.master, conf=conf)
+
+
+def _cmd_run(args: argparse.Namespace) -> int:
+    from deltaplus.runner import NotebookRunner
+    from deltaplus.session import warm_up
+
+    if args.parallel and not any(c.startswith("spark.scheduler.mode=") for c in args.conf):
+        args.conf.append("spark.scheduler.mode=FAIR")
+    if args.engine == "fast":
+        from deltaplus import paths
+        from deltaplus.fastpath import FastSession
+
+        if args.parallel:
+            print("--engine fast runs cells in order; drop --parallel", file=sys.stderr)
+            return 2
+        if args.dbfs_root:
+            paths.set_dbfs_root(args.dbfs_root)
+        if args.mount_source:
+            _mount_from_args(args)
+        # Spark starts only when a statement needs it.
+        spark = FastSession(
+            spark_factory=lambda: _spark_from_args(args), max_input_bytes=args.fast_max_mb << 20
+        )
+    else:
+        spark = _spark_from_args(args)
+        warm_up(spark)
+    options = dict(
+        display_limit=args.display_limit,
+        continue_on_error=args.keep_going,
+        instrument=args.plans,
+        stage_metrics=args.history,
+    )
+    if args.preview or args.sample_by:
+        from deltaplus.preview import Preview
+
+        options["preview"] = Preview(limit=args.display_limit, stratify=args.sample_by)
+    if args.result_cache:
+        from deltaplus.resultcache import ResultCache
+
+        options["result_cache"] = ResultCache(args.result_cache_dir, max_bytes=args.cache_mb << 20)
+    if args.engine == "fast":
+        from deltaplus.fastpath import FastRunner
+
+        runner = FastRunner(spark, **options)
+    elif args.parallel:
+        from deltaplus.dag import DagRunner
+
+        runner = DagRunner(spark, max_workers=args.parallel, **options)
+    else:
+        runner = NotebookRunner(spark, **options)
+    history = None
+    if args.history:
+        from deltaplus.history import RunHistory
+
+        history = RunHistory(args.history_db)
+    ok = True
+    reports = []
+    for path in args.notebooks:
+        report = runner.run(path)
+        entry = report.to_dict()
+        if args.parallel:
+            print(runner.last_plan.describe())
+        print(report.summary())
+        ok = ok and report.ok
+        if args.check:
+            from deltaplus.checks import LESSON_CHECKS
+
+            checks = LESSON_CHECKS[args.check](runner.spark, cache=runner.result_cache).run()
+            print(checks.summary())
+            entry["checks"] = [vars(r) for r in checks.results]
+            ok = ok and checks.ok
+        if history is not None:
+            run_id = history.record(
+                report, label=args.label, conf={"master": args.master, "conf": args.conf, "engine": args.engine}
+            )
+            comparison = history.compare(run_id, window=args.baseline_runs, threshold=args.regression_threshold)
+            print(comparison.summary())
+            entry["history"] = {"run_id": run_id, "regressions": [d.describe() for d in comparison.regressions]}
+            ok = ok and not (args.fail_on_regression and comparison.regressions)
+        reports.append(entry)
+    if args.engine == "fast":
+        print(f"fast path: {spark.stats['fast']} statements in process, {spark.stats['spark']} sent to Spark"
+              f"{'' if spark.started else ' (Spark never started)'}")
+    if runner.result_cache is not None:
+        stats = runner.result_cache.stats()
+        print(f"result cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries']} entries, {stats['bytes'] / (1 << 20):.1f} MB")
+    if args.json:
+        import json
+
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(reports, fh, indent=2)
+    return 0 if ok else 1
+
+
+def _cmd_fastpath(args: argparse.Namespace) -> int:
+    from deltaplus.fastpath import parity, test_queries
+
+    spark = _spark_from_args(args)
+    queries = test_queries(args.notebook)
+    if not queries:
+        print(f"no TEST-cell queries in {args.notebook}", file=sys.stderr)
+        return 2
+    report = parity(spark, _cities_from_args(args), queries, max_input_bytes=args.max_input_mb << 20)
+    print(report.summary())
+    if args.json:
+        import json
+
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump([vars(r) for r in report.results], fh, indent=2)
+    return 0 if report.ok else 1
+
+
+def _cmd_grade(args: argparse.Namespace) -> int:
+    from deltaplus.grading import GradingServer, find_submissions
+
+    if not any(c.startswith("spark.scheduler.mode=") for c in args.conf):
+        args.conf.append("spark.scheduler.mode=FAIR")
+    spark = _spark_from_args(args)
+    submissions = find_submissions(args.submissions)
+    with GradingServer(
+        spark, check=None if args.check == "none" else args.check,
+        cities=_cities_from_args(args), max_workers=args.workers,
+    ) as server:
+        try:
+            report = server.grade(submissions)
+        finally:
+            server.release()
+    print(report.summary())
+    if args.json:
+        import json
+
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(
+                {"wall_time_s": report.wall_time_s, "results": [r.to_dict() for r in report.results]},
+                fh, indent=2,
+            )
+    return 0 if all(r.status != "error" for r in report.results) else 1
+
+
+def _cmd_lint(args: argparse.Namespace) -> int:
+    from deltaplus import paths
+    from deltaplus.lint import lint_notebook
+
+    if args.dbfs_root:
+        paths.set_dbfs_root(args.dbfs_root)
+    findings = []
+    warnings = 0
+    for path in args.notebooks:
+        report = lint_notebook(
+            path, reuse_threshold=args.reuse, stats=args.stats,
+            max_scan_bytes=args.max_scan_mb << 20,
+        )
+        print(report.summary())
+        findings += report.to_dict()
+        warnings += len(report.warnings)
+    if args.json:
+        import json
+
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(findings, fh, indent=2)
+    return 1 if warnings else 0
+
+
+def _cmd_history(args: argparse.Namespace) -> int:
+    from deltaplus import paths
+    from deltaplus.history import RunHistory
+
+    if args.dbfs_root:
+        paths.set_dbfs_root(args.dbfs_root)
+    history = RunHistory(args.db)
+    if args.action == "runs":
+        for run in history.runs(args.notebook, args.limit):
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["started_at"]))
+            print(f"{run['run_id']:>6} {stamp} {run['notebook']:<40} {run['wall_time_s']:>9.3f}s "
+                  f"{'ok' if run['ok'] else 'error':<5} {run['label'] or ''}")
+        return 0
+    if not args.notebook:
+        print(f"history {args.action}: name a notebook", file=sys.stderr)
+        return 2
+    if args.action == "trend":
+        print(history.trend_report(args.notebook, args.limit))
+        return 0
+    runs = history.runs(args.notebook, 1)
+    if not runs:
+        print(f"no runs of {args.notebook}", file=sys.stderr)
+        return 2
+    comparison = history.compare(runs[0]["run_id"], window=args.baseline_runs, threshold=args.threshold)
+    print(comparison.summary())
+    return 1 if comparison.regressions else 0
+
+
+def _cmd_mount(args: argparse.Namespace) -> int:
+    from deltaplus import paths
+
+    if args.dbfs_root:
+        paths.set_dbfs_root(args.dbfs_root)
+    if not args.mount_source:
+        print("mount: --mount-source is required", file=sys.stderr)
+        return 2
+    mount = _mount_from_args(args)
+    if args.action == "clear":
+        mount.cache.clear()
+    elif args.action == "warm":
+        for spec in _cities_from_args(args):
+            start = time.perf_counter()
+            local = spec.local_path
+            print(f"{spec.key:<16} {time.perf_counter() - start:>8.3f}s {local}")
+    elif args.action == "scan":
+        for spec in _cities_from_args(args):
+            timings = []
+            for _ in range(2):
+                start = time.perf_counter()
+                rows = mount.read_table(spec.path, spec.source_columns).num_rows
+                timings.append(time.perf_counter() - start)
+            print(f"{spec.key:<16} {rows:>9} rows  first {timings[0]:.3f}s  again {timings[1]:.3f}s")
+    stats = mount.stats()
+    print(f"cache: {stats['blocks']} blocks, {stats['files']} files, {stats['bytes'] / (1 << 20):.1f} MB; "
+          f"{stats['hits']} hits, {stats['misses']} misses, "
+          f"{stats.get('remote_bytes', 0) / (1 << 20):.1f} MB fetched")
+    return 0
+
+
+def _cmd_golden(args: argparse.Namespace) -> int:
+    from deltaplus.golden import GoldenStore
+
+    store = GoldenStore(_spark_from_args(args), root=args.root, cities=_cities_from_args(args))
+    result = store.refresh(force=args.force)
+    print(f"rebuilt: {', '.join(result.rebuilt) or '-'}")
+    print(f"unchanged: {', '.join(result.unchanged) or '-'}")
+    print(f"{result.wall_time_s:.3f}s")
+    return 0
+
+
+def _cmd_rollup(args: argparse.Namespace) -> int:
+    from deltaplus.rollup import RollupStore
+
+    spark = _spark_from_args(args)
+    store = RollupStore(spark, root=args.root, cities=_cities_from_args(args))
+    result = store.refresh()
+    for key, files in result.updated.items():
+        print(f"{key}: re-aggregated {files} files, dropped {result.removed.get(key, 0)}")
+    print(f"unchanged: {', '.join(result.unchanged) or '-'}")
+    print(f"{result.wall_time_s:.3f}s")
+    if args.show:
+        for row in store.homicides_by_month().collect():
+            print(f"{row.month:>5} {row.homicides:>8}")
+    return 0
+
+
+def _cmd_dimensions(args: argparse.Namespace) -> int:
+    from deltaplus.dimensions import DimensionStore
+    from deltaplus.plans import join_strategies
+
+    store = DimensionStore(_spark_from_args(args), root=args.root, cities=_cities_from_args(args))
+    result = store.refresh(force=args.force)
+    print(f"recoded: {', '.join(result.recoded) or '-'}")
+    print(f"unchanged: {', '.join(result.unchanged) or '-'}")
+    print(f"new offense codes: {result.new_offenses}")
+    print(f"{result.wall_time_s:.3f}s")
+    if args.show:
+        df = store.homicides_by_month(by_city=True)
+        for row in df.collect():
+            print(f"{row.city:<16} {row.month:>5} {row.homicides:>8}")
+        print(f"joins: {', '.join(join_strategies(df)) or '-'}")
+    return 0
+
+
+def _cmd_layout(args: argparse.Namespace) -> int:
+    from deltaplus.layout import LakeLayout
+
+    layout = LakeLayout(
+        _spark_from_args(args), root=args.root, cities=_cities_from_args(args),
+        target_file_bytes=args.target_mb << 20,
+    )
+    if args.action == "compact":
+        result = layout.compact()
+        for key, (partitions, before, after) in result.compacted.items():
+            print(f"{key}: compacted {partitions} partitions, {before} -> {after} files")
+    else:
+        result = layout.rewrite(force=args.force)
+        print(f"rewritten: {', '.join(result.rewritten) or '-'}")
+    print(f"unchanged: {', '.join(result.unchanged) or '-'}")
+    print(f"{result.wall_time_s:.3f}s")
+    return 0
+
+
+def _cmd_table(args: argparse.Namespace) -> int:
+    from deltaplus import paths
+    from deltaplus.txlog import LogTable
+
+    if args.dbfs_root:
+        paths.set_dbfs_root(args.dbfs_root)
+    table = LogTable(args.root) if args.root else LogTable.named(args.name)
+    if args.action == "history":
+        for entry in table.history(args.limit):
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["timestamp"]))
+            print(f"{entry['version']:>6} {stamp} {entry['operation']:<10} "
+                  f"+{entry['added']} -{entry['removed']} files")
+        return 0
+    if args.action == "checkpoint":
+        print(f"checkpoint at version {table.checkpoint()}")
+        return 0
+    if args.action == "vacuum":
+        deleted = table.vacuum(args.retain_hours)
+        print(f"deleted {len(deleted)} unreferenced files")
+        return 0
+    if args.action == "show":
+        as_of = args.as_of and time.mktime(time.strptime(args.as_of, "%Y-%m-%d %H:%M:%S"))
+        snapshot = table.snapshot(args.version, as_of or None)
+        print(f"version {snapshot.version}: {len(snapshot.files)} files, "
+              f"{snapshot.rows} rows, {snapshot.bytes / (1 << 20):.1f} MB")
+        return 0
+
+    spark = _spark_from_args(args)
+    if args.action == "optimize":
+        result = table.optimize(spark, target_file_bytes=args.target_mb << 20)
+    else:
+        from deltaplus.cities import build_union
+
+        rows = build_union(spark, _cities_from_args(args), homicides_only=False)
+        result = table.write(rows, mode=args.mode)
+    print(f"version {result.version}: +{result.added} -{result.removed} files "
+          f"({result.attempts} attempts, {result.wall_time_s:.3f}s)")
+    return 0
+
+
+def _cmd_stream(args: argparse.Namespace) -> int:
+    from deltaplus.streaming import CrimeStream
+
+    spark = _spark_from_args(args)
+    stream = CrimeStream(
+        spark, landing=args.landing, root=args.root, cities=_cities_from_args(args),
+        max_files_per_trigger=args.max_files,
+    )
+    if args.once:
+        stream.run_once()
+        for row in stream.homicides_by_month().collect():
+            print(f"{row.month:>5} {row.homicides:>8}")
+        return 0
+    query = stream.start(trigger=args.interval)
+    print(f"streaming from {stream.landing} (Ctrl-C to stop)")
+    try:
+        query.awaitTermination()
+    except KeyboardInterrupt:
+        query.stop()
+    return 0
+
+
+def _cmd_ingest(args: argparse.Namespace) -> int:
+    from deltaplus import paths
+    from deltaplus.ingest import Ingestor
+
+    if args.dbfs_root:
+        paths.set_dbfs_root(args.dbfs_root)
+    ingestor = Ingestor(
+        drops=args.drops, root=args.root, cities=_cities_from_args(args),
+        max_workers=args.workers,
+    )
+    result = ingestor.run()
+    for label, rows in sorted(result.converted.items()):
+        print(f"{label:<40} {rows:>10} rows")
+    for label, error in sorted(result.failed.items()):
+        print(f"{label:<40} FAILED: {error}")
+    print(
+        f"{len(result.converted)} converted, {len(result.unchanged)} unchanged, "
+        f"{len(result.failed)} failed in {result.wall_time_s:.1f}s -> {ingestor.root}"
+    )
+    return 1 if result.failed else 0
+
+
+def _cmd_footers(args: argparse.Namespace) -> int:
+    from deltaplus.footers import FooterCache
+    from deltaplus.parquet import data_files
+
+    spark = _spark_from_args(args)
+    cache = FooterCache(args.cache)
+    for spec in _cities_from_args(args):
+        schema = cache.spark_schema(spark, spec.local_path)
+        files = data_files(spec.local_path)
+        if args.stats:
+            for file in files:
+                cache.row_groups(file)
+        print(f"{spec.key:<12} {len(schema.fields):>3} columns, {len(files)} files")
+    stats = cache.stats()
+    print(f"{cache.path}: {stats['schemas']} schemas, {stats['footers']} footers")
+    return 0
+
+
+def _cmd_bench(args: argparse.Namespace) -> int:
+    import json
+
+    spark = _spark_from_args(args)
+    if args.suite == "skipping":
+        from deltaplus.bench import skipping
+        from deltaplus.golden import GoldenStore
+
+        store = GoldenStore(spark, root=args.root, cities=_cities_from_args(args))
+        results = skipping.run(spark, store, repeat=args.repeat)
+        print(skipping.format_results(results))
+    else:
+        from deltaplus.bench import scale
+
+        results = scale.run(spark, scales=args.scale or (1, 10), repeat=args.repeat)
+        print(scale.format_results(results))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump([r.to_dict() for r in results], fh, indent=2)
+    return 0
+
+
+def _cmd_generate(args: argparse.Namespace) -> int:
+    from deltaplus import paths, synth
+
+    spark = _spark_from_args(args)
+    directory = paths.CRIME_DATA_DIR if args.mount else None
+    for scale in args.scale or [1]:
+        specs = synth.generate(
+            spark, scale=scale, seed=args.seed, keys=args.city,
+            overwrite=args.overwrite, directory=directory,
+        )
+        for spec in specs:
+            print(f"x{scale:<5} {spec.local_path}")
+    return 0
+
+
+def _cmd_cities(args: argparse.Namespace) -> int:
+    from deltaplus.cities import union_view_sql
+
+    cities = _cities_from_args(args)
+    if args.sql:
+        print(union_view_sql(cities, view=args.view))
+    else:
+        for spec in cities:
+            print(f"{spec.key:<12} {spec.path}")
+            print(f"{'':<12} homicide: {spec.offense_filter}")
+            print(f"{'':<12} month:    {spec.month_expr}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="deltaplus")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run notebooks headlessly with per-cell timing")
+    run.add_argument("notebooks", nargs="+")
+    run.add_argument("--json", help="write the per-cell report to this file")
+    run.add_argument("--keep-going", action="store_true", help="continue after failing cells")
+    run.add_argument("--display-limit", type=int, default=1000)
+    run.add_argument(
+        "--parallel", type=int, default=0, metavar="N",
+        help="run independent cells concurrently on N threads (fair scheduler pools)",
+    )
+    run.add_argument(
+        "--preview", action="store_true",
+        help="exploration mode: run capped queries incrementally, sorts as top-N",
+    )
+    run.add_argument(
+        "--sample-by", metavar="COLUMN",
+        help="preview a stratified sample over COLUMN instead of the first rows",
+    )
+    run.add_argument(
+        "--result-cache", action="store_true",
+        help="serve results of queries over unchanged files from a disk cache",
+    )
+    run.add_argument("--result-cache-dir", help="default dbfs:/deltaplus/cache/results")
+    run.add_argument("--cache-mb", type=int, default=512, help="result cache size limit")
+    run.add_argument(
+        "--plans", action="store_true",
+        help="record the physical plan and scan metrics of every %%sql query",
+    )
+    run.add_argument(
+        "--check", choices=["data-lakes"],
+        help="afterwards, verify the lesson's TEST expectations in one batch",
+    )
+    run.add_argument(
+        "--engine", choices=("spark", "fast"), default="spark",
+        help="fast: run small statements in process and start Spark only when needed",
+    )
+    run.add_argument(
+        "--fast-max-mb", type=int, default=128,
+        help="largest input (file MB) the fast engine runs in process",
+    )
+    run.add_argument(
+        "--history", action="store_true",
+        help="record per-cell metrics in the run history and compare with the baseline",
+    )
+    run.add_argument("--history-db", help="default dbfs:/deltaplus/history/runs.sqlite")
+    run.add_argument("--label", help="history: tag the run (e.g. a commit or config name)")
+    run.add_argument("--baseline-runs", type=int, default=10, help="history: runs in the rolling baseline")
+    run.add_argument(
+        "--regression-threshold", type=float, default=0.25,
+        help="history: flag cells slower (or reading/using more) than baseline * (1 + this)",
+    )
+    run.add_argument(
+        "--fail-on-regression", action="store_true", help="history: exit non-zero on regressions",
+    )
+    _add_spark_args(run)
+    run.set_defaults(func=_cmd_run)
+
+    fastpath = sub.add_parser(
+        "fastpath", help="compare the in-process engine with Spark on a lesson's TEST queries"
+    )
+    fastpath.add_argument("notebook", help="lesson notebook whose TEST cells to replay")
+    fastpath.add_argument("--max-input-mb", type=int, default=128, help="in-process input limit")
+    fastpath.add_argument("--json", help="write per-query results to this file")
+    _add_city_args(fastpath)
+    _add_spark_args(fastpath)
+    fastpath.set_defaults(func=_cmd_fastpath)
+
+    grade = sub.add_parser("grade", help="grade submitted notebooks concurrently")
+    grade.add_argument("submissions", nargs="+", help="notebook files or directories of them")
+    grade.add_argument("--workers", type=int, default=8, help="submissions graded at once")
+    grade.add_argument(
+        "--check", choices=["data-lakes", "none"], default="data-lakes",
+        help="batched TEST expectations to apply after each notebook",
+    )
+    grade.add_argument("--json", help="write per-submission results to this file")
+    _add_city_args(grade)
+    _add_spark_args(grade)
+    grade.set_defaults(func=_cmd_grade)
+
+    lint = sub.add_parser("lint", help="flag slow SQL patterns in notebook %%sql cells")
+    lint.add_argument("notebooks", nargs="+")
+    lint.add_argument(
+        "--stats", action="store_true",
+        help="estimate scan sizes from the lake's files (footer statistics with pyarrow)",
+    )
+    lint.add_argument("--max-scan-mb", type=int, default=1024, help="large-scan threshold")
+    lint.add_argument("--reuse", type=int, default=2, help="readers before suggesting CACHE TABLE")
+    lint.add_argument("--json", help="write the findings to this file")
+    lint.add_argument("--dbfs-root", help="local directory standing in for dbfs:/")
+    lint.set_defaults(func=_cmd_lint)
+
+    history = sub.add_parser("history", help="per-cell run history: runs, trends and regressions")
+    history.add_argument("action", choices=("runs", "trend", "compare"))
+    history.add_argument("notebook", nargs="?", help="notebook path or file name")
+    history.add_argument("--db", help="history database (default dbfs:/deltaplus/history/runs.sqlite)")
+    history.add_argument("--limit", type=int, default=20, help="runs to list or to trend over")
+    history.add_argument("--baseline-runs", type=int, default=10, help="compare: runs in the baseline")
+    history.add_argument("--threshold", type=float, default=0.25, help="compare: regression threshold")
+    history.add_argument("--dbfs-root", help="local directory standing in for dbfs:/")
+    history.set_defaults(func=_cmd_history)
+
+    mount = sub.add_parser("mount", help="read the lake mount through the local block cache")
+    mount.add_argument("action", choices=("warm", "scan", "stats", "clear"))
+    mount.add_argument("--dbfs-root", help="local directory standing in for dbfs:/")
+    _add_mount_args(mount)
+    _add_city_args(mount)
+    mount.set_defaults(func=_cmd_mount)
+
+    golden = sub.add_parser("golden", help="refresh the materialized homicide tables")
+    golden.add_argument("--root", help="golden store directory (default dbfs:/deltaplus/golden)")
+    _add_city_args(golden)
+    golden.add_argument("--force", action="store_true", help="rebuild even if sources are unchanged")
+    _add_spark_args(golden)
+    golden.set_defaults(func=_cmd_golden)
+
+    rollup = sub.add_parser("rollup", help="update the incremental monthly rollup")
+    rollup.add_argument("--root", help="rollup store directory (default dbfs:/deltaplus/rollup)")
+    rollup.add_argument("--show", action="store_true", help="print homicides by month afterwards")
+    _add_city_args(rollup)
+    _add_spark_args(rollup)
+    rollup.set_defaults(func=_cmd_rollup)
+
+    dimensions = sub.add_parser("dimensions", help="refresh the integer-coded facts and dimension tables")
+    dimensions.add_argument("--root", help="dimension store directory (default dbfs:/deltaplus/dimensions)")
+    dimensions.add_argument("--force", action="store_true", help="recode even if sources are unchanged")
+    dimensions.add_argument("--show", action="store_true", help="print homicides by city and month afterwards")
+    _add_city_args(dimensions)
+    _add_spark_args(dimensions)
+    dimensions.set_defaults(func=_cmd_dimensions)
+
+    layout = sub.add_parser("layout", help="rewrite the lake partitioned by year/month")
+    layout.add_argument("action", nargs="?", choices=("rewrite", "compact"), default="rewrite")
+    layout.add_argument("--root", help="lake root (default dbfs:/deltaplus/lake)")
+    layout.add_argument("--target-mb", type=int, default=128, help="target data file size")
+    layout.add_argument("--force", action="store_true", help="rewrite even if sources are unchanged")
+    _add_city_args(layout)
+    _add_spark_args(layout)
+    layout.set_defaults(func=_cmd_layout)
+
+    table = sub.add_parser("table", help="transactional crime table (load, optimize, time travel)")
+    table.add_argument(
+        "action", choices=("load", "show", "history", "optimize", "checkpoint", "vacuum"),
+    )
+    table.add_argument("--name", default="crimes", help="table under dbfs:/deltaplus/tables")
+    table.add_argument("--root", help="table directory (overrides --name)")
+    table.add_argument("--mode", choices=("append", "overwrite"), default="append")
+    table.add_argument("--version", type=int, help="show: read this version")
+    table.add_argument("--as-of", help="show: read the version current at 'YYYY-MM-DD HH:MM:SS'")
+    table.add_argument("--limit", type=int, default=20, help="history: commits to list")
+    table.add_argument("--target-mb", type=int, default=128, help="optimize: target file size")
+    table.add_argument("--retain-hours", type=float, default=168.0, help="vacuum: retention")
+    _add_city_args(table)
+    _add_spark_args(table)
+    table.set_defaults(func=_cmd_table)
+
+    stream = sub.add_parser("stream", help="keep crime counts updated from a landing directory")
+    stream.add_argument("--landing", help="landing directory (default dbfs:/deltaplus/landing)")
+    stream.add_argument("--root", help="counts and checkpoint directory (default dbfs:/deltaplus/stream)")
+    stream.add_argument("--once", action="store_true", help="process landed files once, then exit")
+    stream.add_argument("--interval", default="2 seconds", help="trigger interval")
+    stream.add_argument("--max-files", type=int, help="max new files per micro-batch")
+    _add_city_args(stream)
+    _add_spark_args(stream)
+    stream.set_defaults(func=_cmd_stream)
+
+    ingest = sub.add_parser("ingest", help="convert raw CSV/JSON/XML drops to Parquet")
+    ingest.add_argument("--drops", help="drop directory (default dbfs:/deltaplus/drops)")
+    ingest.add_argument("--root", help="output directory (default dbfs:/deltaplus/ingested)")
+    ingest.add_argument("--workers", type=int, help="conversion processes (default: CPU count)")
+    ingest.add_argument("--dbfs-root", help="local directory standing in for dbfs:/")
+    _add_city_args(ingest)
+    ingest.set_defaults(func=_cmd_ingest)
+
+    footer = sub.add_parser("footers", help="warm the persistent schema/footer cache")
+    footer.add_argument("--cache", help="cache file (default dbfs:/deltaplus/cache/footers.sqlite)")
+    footer.add_argument("--stats", action="store_true", help="also cache row-group statistics (pyarrow)")
+    _add_city_args(footer)
+    _add_spark_args(footer)
+    footer.set_defaults(func=_cmd_footers)
+
+    cities = sub.add_parser("cities", help="show the configured city normalization")
+    cities.add_argument("--sql", action="store_true", help="print the unified view as SQL")
+    cities.add_argument("--view", default="AllHomicides")
+    _add_city_args(cities)
+    cities.set_defaults(func=_cmd_cities)
+
+    generate = sub.add_parser("generate", help="write deterministic synthetic crime data")
+    generate.add_argument("--scale", type=int, action="append", help="scale factor (repeatable)")
+    generate.add_argument("--seed", type=int, default=2016)
+    generate.add_argument("--city", action="append", help="limit to this city key (repeatable)")
+    generate.add_argument("--overwrite", action="store_true")
+    generate.add_argument(
+        "--mount", action="store_true",
+        help="write into the lesson mount (dbfs:/mnt/training/crime-data-2016) instead",
+    )
+    _add_spark_args(generate)
+    generate.set_defaults(func=_cmd_generate)
+
+    bench = sub.add_parser("bench", help="run a benchmark suite")
+    bench.add_argument("suite", choices=["skipping", "scale"])
+    bench.add_argument("--root", help="golden store directory")
+    bench.add_argument(
+        "--scale", type=int, action="append",
+        help="synthetic data scale for the 'scale' suite (repeatable, default 1 and 10)",
+    )
+    _add_city_args(bench)
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.add_argument("--json", help="write results to this file")
+    _add_spark_args(bench)
+    bench.set_defaults(func=_cmd_bench)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""Run a notebook's independent SQL cells concurrently.
+
+Lesson notebooks prepare each city in its own chain of cells
+(``CrimeData<City>`` -> ``Homicides<City>`` -> previews) that only meet at
+the ``UNION ALL``, yet :class:`~deltaplus.runner.NotebookRunner` runs them
+strictly top to bottom.  :func:`compile_notebook` turns the cells into a
+dependency graph from the views each ``%sql`` statement creates and
+references:
+
+* a cell depends on the cells that last defined every view it reads
+* a cell that (re)defines a view also waits for the earlier readers of the
+  old definition
+* Python, ``%run`` and unrecognised SQL (``SET``, ``DROP`` ...) cells are
+  barriers: they wait for everything before them and everything after waits
+  for them
+
+:class:`DagRunner` executes the graph on a thread pool.  Each worker thread
+submits its jobs to its own scheduler pool (``spark.scheduler.pool``), so
+with ``spark.scheduler.mode=FAIR`` concurrent branches share the executors
+instead of queueing behind each other.  Derived views read by two or more
+later cells are cached right after they are defined and uncached at the end
+of the run, so shared intermediates are computed once.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from deltaplus.classroom import GLOBAL_DB, NOTEBOOK_KEY, created_names
+from deltaplus.jobs import JobGroup
+from deltaplus.notebook import Cell, Notebook
+from deltaplus.runner import CellResult, NotebookRunner, RunReport, is_query, split_statements
+
+log = logging.getLogger(__name__)
+
+POOL_PREFIX = "deltaplus"
+DEFAULT_WORKERS = 4
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_IDENT_RE = re.compile(r"`([^`]+)`|([A-Za-z_][\w.]*)")
+
+
+def identifiers(statement: str) -> Set[str]:
+    """Lower-cased names in ``statement``, outside strings and comments."""
+    text = _STRING_RE.sub("''", _COMMENT_RE.sub(" ", statement))
+    return {(m.group(1) or m.group(2)).lower() for m in _IDENT_RE.finditer(text)}
+
+
+def _view_key(kind: str, name: str) -> str:
+    name = name.lower()
+    return f"{GLOBAL_DB}.{name}" if kind == "global_views" and "." not in name else name
+
+
+@dataclass
+class Node:
+    index: int
+    cell: Cell
+    defines: Set[str] = field(default_factory=set)
+    reads: Set[str] = field(default_factory=set)
+    barrier: bool = False
+    deps: Set[int] = field(default_factory=set)
+    # Views this node caches after running, for later readers.
+    materialize: List[str] = field(default_factory=list)
+
+
+@dataclass
+class DagPlan:
+    notebook: Notebook
+    nodes: List[Node] = field(default_factory=list)
+
+    @property
+    def materialized(self) -> List[str]:
+        return [name for node in self.nodes for name in node.materialize]
+
+    def waves(self) -> List[List[int]]:
+        """Node indexes grouped by depth: each wave only needs earlier waves."""
+        depth: Dict[int, int] = {}
+        for node in self.nodes:
+            depth[node.index] = 1 + max((depth[d] for d in node.deps), default=-1)
+        waves: List[List[int]] = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+        for index, level in depth.items():
+            waves[level].append(index)
+        return waves
+
+    def describe(self) -> str:
+        lines = [f"{self.notebook.name}: {len(self.nodes)} cells in {len(self.waves())} waves"]
+        for number, wave in enumerate(self.waves()):
+            cells = []
+            for index in wave:
+                node = self.nodes[index]
+                label = f"{node.cell.index}"
+                if node.defines:
+                    label += "(" + ",".join(sorted(node.defines)) + ")"
+                cells.append(label)
+            lines.append(f"  wave {number}: " + " ".join(cells))
+        if self.materialized:
+            lines.append("  materialized: " + ", ".join(self.materialized))
+        return "\n".join(lines)
+
+
+def _analyze(cell: Cell, node: Node) -> None:
+    if cell.kind in ("python", "run"):
+        node.barrier = True
+        return
+    if cell.kind != "sql":
+        return
+    for statement in split_statements(cell.source):
+        created = created_names(statement)
+        if created:
+            for kind, name in created:
+                node.defines.add(_view_key(kind, name))
+            node.reads |= identifiers(statement)
+        elif is_query(statement):
+            node.reads |= identifiers(statement)
+        else:
+            node.barrier = True
+
+
+def compile_notebook(notebook: Notebook, materialize_shared: bool = True) -> DagPlan:
+    """Build the dependency graph of ``notebook``'s executable cells."""
+    plan = DagPlan(notebook)
+    last_writer: Dict[str, int] = {}
+    readers: Dict[str, List[int]] = {}
+    derived: Dict[str, int] = {}  # view -> defining node, for views over views
+    consumers: Dict[int, Dict[str, int]] = {}
+    last_barrier: Optional[int] = None
+    for cell in notebook:
+        if cell.is_markdown:
+            continue
+        node = Node(len(plan.nodes), cell)
+        _analyze(cell, node)
+        # Only names defined earlier in this notebook are dependencies; the
+        # rest of the identifiers are columns, functions and keywords.
+        node.reads = {name for name in node.reads if name in last_writer} - node.defines
+        if node.barrier:
+            node.deps = {n.index for n in plan.nodes}
+        else:
+            for name in node.reads:
+                node.deps.add(last_writer[name])
+            for name in node.defines:
+                if name in last_writer:
+                    node.deps.add(last_writer[name])
+                node.deps.update(readers.get(name, []))
+            if last_barrier is not None:
+                node.deps.add(last_barrier)
+        node.deps.discard(node.index)
+
+        for name in node.reads:
+            readers.setdefault(name, []).append(node.index)
+            if name in derived:
+                counts = consumers.setdefault(derived[name], {})
+                counts[name] = counts.get(name, 0) + 1
+        for name in node.defines:
+            last_writer[name] = node.index
+            readers[name] = []
+            if node.reads:
+                derived[name] = node.index
+            else:
+                derived.pop(name, None)
+        if node.barrier:
+            last_barrier = node.index
+        plan.nodes.append(node)
+
+    if materialize_shared:
+        for index, counts in consumers.items():
+            plan.nodes[index].materialize = sorted(n for n, count in counts.items() if count >= 2)
+    return plan
+
+
+class DagRunner(NotebookRunner):
+    """:class:`NotebookRunner` that executes independent cells concurrently.
+
+    Results are reported in notebook order, like the sequential runner.
+    Without ``continue_on_error`` no new cell starts after a failure.
+    """
+
+    def __init__(self, spark=None, *, max_workers: int = DEFAULT_WORKERS,
+                 materialize_shared: bool = True, **kwargs):
+        super().__init__(spark, **kwargs)
+        self.max_workers = max_workers
+        self.materialize_shared = materialize_shared
+        self.last_plan: Optional[DagPlan] = None
+
+    def run(self, path: str) -> RunReport:
+        notebook = Notebook.load(path)
+        report = RunReport(notebook=path, started_at=time.time())
+        self.namespace[NOTEBOOK_KEY] = os.path.abspath(path)
+        plan = compile_notebook(notebook, self.materialize_shared)
+        self.last_plan = plan
+        start = time.perf_counter()
+        try:
+            for cells in self._execute(plan):
+                report.cells += cells
+        finally:
+            self._release(plan)
+        report.wall_time_s = time.perf_counter() - start
+        return report
+
+    def _execute(self, plan: DagPlan) -> List[List[CellResult]]:
+        results: Dict[int, List[CellResult]] = {}
+        pending = {node.index: set(node.deps) for node in plan.nodes}
+        done: Set[int] = set()
+        running = {}
+        stopped = False
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix=POOL_PREFIX) as pool:
+            while running or (pending and not stopped):
+                if not stopped:
+                    for index in sorted(i for i, deps in pending.items() if deps <= done):
+                        del pending[index]
+                        running[pool.submit(self._run_node, plan, plan.nodes[index])] = index
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index = running.pop(future)
+                    results[index], ok = future.result()
+                    done.add(index)
+                    if not ok and not self.continue_on_error:
+                        stopped = True
+        return [results[i] for i in sorted(results)]
+
+    def _run_node(self, plan: DagPlan, node: Node):
+        sc = self.spark.sparkContext
+        slot = threading.current_thread().name.rsplit("_", 1)[-1]
+        sc.setLocalProperty("spark.scheduler.pool", f"{POOL_PREFIX}-{slot}")
+        try:
+            if node.cell.kind == "run":
+                include = RunReport(notebook=plan.notebook.path)
+                ok = self._run_include(plan.notebook, node.cell, include)
+                return include.cells, ok
+            result = self._run_cell(plan.notebook, node.cell)
+            if result.status == "ok" and node.materialize:
+                self._materialize(node, result)
+            return [result], result.status != "error"
+        finally:
+            sc.setLocalProperty("spark.scheduler.pool", None)
+
+    def _materialize(self, node: Node, result: CellResult) -> None:
+        group = JobGroup(self.spark.sparkContext, f"materialize {', '.join(node.materialize)}")
+        start = time.perf_counter()
+        with group:
+            try:
+                for name in node.materialize:
+                    self.spark.sql(f"CACHE TABLE {name}")
+            except Exception as exc:  # noqa: BLE001 - reported per cell
+                # The view is only evaluated here, so its errors surface here.
+                result.status = "error"
+                result.error = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+                log.debug("materializing %s failed", name, exc_info=True)
+        result.wall_time_s += time.perf_counter() - start
+        result.jobs += group.jobs
+
+    def _release(self, plan: DagPlan) -> None:
+        for name in plan.materialized:
+            try:
+                self.spark.sql(f"UNCACHE TABLE IF EXISTS {name}")
+            except Exception:  # noqa: BLE001 - the view may have been dropped
+                log.debug("uncache %s failed", name, exc_info=True)
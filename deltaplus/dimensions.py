@@ -0,0 +1,303 @@
+"""Integer-keyed crime facts joined against small city and offense dimensions.
+
+Every lesson query classifies offenses by lower-casing and pattern matching
+the raw offense string of every row (``lower(offense) LIKE 'murder%' OR
+...``), with each city's vocabulary spelled out in its ``WHERE`` clause.  A
+city only has a few hundred distinct offense values, though.
+:class:`DimensionStore` classifies each distinct value once, with the city's
+:class:`~deltaplus.cities.CitySpec` rules, and stores the crime rows as
+integer codes:
+
+* ``DimCity``: ``(city_id, city, city_key, source)``, one row per city
+* ``DimOffense``: ``(offense_id, city_id, offense, offense_category,
+  is_homicide)``, one row per distinct raw offense of a city
+* ``CrimeFacts``: ``(city_id, year, month, offense_id)``, one row per crime
+
+Both dimension tables are a few kilobytes, so queries join them with
+broadcast hints: every executor builds a hash table of the dimension and
+classifies a fact row with an integer lookup, and the facts are never
+shuffled.  ``is_homicide`` is decided in the dimension, so counting
+homicides across cities is a semi join against the homicide offense ids.
+
+Ids are stable: the state file remembers every code handed out, so a city is
+only recoded when its source changes (same fingerprints as
+:mod:`deltaplus.golden`), and editing a city's homicide rules only rewrites
+``DimOffense``.
+
+Layout under the store root::
+
+    <root>/cities/part-*.parquet
+    <root>/offenses/part-*.parquet
+    <root>/facts/<CityKey>/part-*.parquet
+    <root>/_dimensions.json
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from deltaplus import paths
+from deltaplus.cities import CitySpec, get_cities
+from deltaplus.fingerprints import path_digest
+from deltaplus.fsutil import swap_directory, write_json_atomic
+
+log = logging.getLogger(__name__)
+
+DIMENSIONS_DIR = "dbfs:/deltaplus/dimensions"
+STATE_FILE = "_dimensions.json"
+CITY_VIEW = "DimCity"
+OFFENSE_VIEW = "DimOffense"
+FACT_VIEW = "CrimeFacts"
+CLASSIFIED_VIEW = "CrimesClassified"
+
+CITY_SCHEMA = "city_id int, city string, city_key string, source string"
+OFFENSE_SCHEMA = (
+    "offense_id int, city_id int, offense string, offense_category string, is_homicide boolean"
+)
+
+# Bumped whenever the fact layout changes so existing facts are recoded.
+FACTS_FORMAT = 1
+
+# The registered views joined the way the store's own queries join them.
+HOMICIDES_BY_MONTH_SQL = f"""
+SELECT /*+ BROADCAST(o), BROADCAST(c) */ c.city, f.month, count(*) AS homicides
+FROM {FACT_VIEW} f
+JOIN {OFFENSE_VIEW} o ON f.offense_id = o.offense_id
+JOIN {CITY_VIEW} c ON f.city_id = c.city_id
+WHERE o.is_homicide
+GROUP BY c.city, f.month
+ORDER BY c.city, f.month
+"""
+
+
+@dataclass
+class DimensionRefresh:
+    recoded: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    new_offenses: int = 0
+    dimensions_written: bool = False
+    wall_time_s: float = 0.0
+
+
+def _rules_digest(cities: List[CitySpec]) -> str:
+    """Digest of everything the dimension rows are derived from."""
+    payload = [[s.key, s.name, s.path, [list(r) for r in s.homicide_rules]] for s in cities]
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class DimensionStore:
+    def __init__(self, spark, root: Optional[str] = None, cities: Optional[List[CitySpec]] = None):
+        self.spark = spark
+        self.root = paths.resolve(root or DIMENSIONS_DIR)
+        self.cities = cities if cities is not None else get_cities()
+
+    @property
+    def city_path(self) -> str:
+        return os.path.join(self.root, "cities")
+
+    @property
+    def offense_path(self) -> str:
+        return os.path.join(self.root, "offenses")
+
+    def fact_path(self, spec: CitySpec) -> str:
+        return os.path.join(self.root, "facts", spec.key)
+
+    def _state_path(self) -> str:
+        return os.path.join(self.root, STATE_FILE)
+
+    def load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self._state_path(), encoding="utf-8") as fh:
+                state = json.load(fh)
+        except FileNotFoundError:
+            state = {}
+        state.setdefault("facts", {})
+        state.setdefault("city_ids", {})
+        state.setdefault("offense_ids", {})
+        state.setdefault("next_offense_id", 1)
+        return state
+
+    def _save_state(self, state: Dict[str, Any]) -> None:
+        write_json_atomic(self._state_path(), state)
+
+    def is_stale(self, spec: CitySpec, state: Optional[Dict[str, Any]] = None) -> bool:
+        state = self.load_state() if state is None else state
+        entry = state["facts"].get(spec.key)
+        if entry is None or not os.path.isdir(self.fact_path(spec)):
+            return True
+        if entry.get("format") != FACTS_FORMAT:
+            return True
+        return entry.get("source_digest") != path_digest(spec.local_path)
+
+    def refresh(self, force: bool = False) -> DimensionRefresh:
+        """Recode the facts of every city whose source changed.
+
+        The dimension tables are rewritten whenever a city was recoded or the
+        city config (names, paths, homicide rules) changed since they were
+        last written.
+        """
+        start = time.perf_counter()
+        result = DimensionRefresh()
+        state = self.load_state()
+        for spec in self.cities:
+            self._city_id(state, spec)
+            if not force and not self.is_stale(spec, state):
+                result.unchanged.append(spec.key)
+                continue
+            result.new_offenses += self._recode(spec, state)
+            # Facts may now hold codes the dimension has not seen: write it
+            # before the state, so an interrupted refresh recodes the city.
+            self._write_dimensions(state)
+            self._save_state(state)
+            result.recoded.append(spec.key)
+            result.dimensions_written = True
+        rules = _rules_digest(self.cities)
+        missing = not (os.path.isdir(self.city_path) and os.path.isdir(self.offense_path))
+        if force or missing or state.get("rules_digest") != rules:
+            if not result.dimensions_written:
+                self._write_dimensions(state)
+                result.dimensions_written = True
+            state["rules_digest"] = rules
+            self._save_state(state)
+        result.wall_time_s = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def _city_id(state: Dict[str, Any], spec: CitySpec) -> int:
+        ids = state["city_ids"]
+        if spec.key not in ids:
+            ids[spec.key] = max(ids.values(), default=0) + 1
+        return ids[spec.key]
+
+    def _recode(self, spec: CitySpec, state: Dict[str, Any]) -> int:
+        """Write ``spec``'s facts; return the number of offense codes added."""
+        from pyspark.sql import functions as F
+
+        # Fingerprint before reading: if the source changes mid-build the
+        # next refresh sees a mismatch and recodes again.
+        digest = path_digest(spec.local_path)
+        log.info("recoding crime facts for %s", spec.name)
+        source = spec.read(self.spark)
+        raw = F.col(spec.offense_column).cast("string")
+        distinct = {r[0] for r in source.select(raw).distinct().collect() if r[0] is not None}
+        codes = state["offense_ids"].setdefault(spec.key, {})
+        added = sorted(distinct - set(codes))
+        for offense in added:
+            codes[offense] = state["next_offense_id"]
+            state["next_offense_id"] += 1
+
+        # The string match happens once, here; afterwards offenses are ints.
+        mapping = self.spark.createDataFrame(sorted(codes.items()), "offense string, offense_id int")
+        facts = (
+            source.select(
+                F.expr(spec.year_expr).cast("int").alias("year"),
+                F.expr(spec.month_expr).cast("int").alias("month"),
+                raw.alias("offense"),
+            )
+            .join(F.broadcast(mapping), "offense", "left")
+            .select(
+                F.lit(self._city_id(state, spec)).cast("int").alias("city_id"),
+                "year", "month", "offense_id",
+            )
+        )
+        target = self.fact_path(spec)
+        staging = target + ".staging"
+        shutil.rmtree(staging, ignore_errors=True)
+        # Sorted by offense so each row group covers few codes and a pushed
+        # offense_id filter skips most of them.
+        facts.orderBy("offense_id", "month").write.mode("overwrite").parquet(staging)
+        swap_directory(staging, target)
+        state["facts"][spec.key] = {
+            "source": spec.path,
+            "source_digest": digest,
+            "format": FACTS_FORMAT,
+            "built_at": time.time(),
+            "offenses": len(codes),
+        }
+        return len(added)
+
+    def dimension_rows(self, state: Optional[Dict[str, Any]] = None):
+        """``(city rows, offense rows)`` of this store's cities, classified in Python."""
+        state = self.load_state() if state is None else state
+        city_rows, offense_rows = [], []
+        for spec in self.cities:
+            city_id = state["city_ids"].get(spec.key)
+            if city_id is None:
+                continue
+            city_rows.append((city_id, spec.name, spec.key, spec.path))
+            for offense, offense_id in sorted(state["offense_ids"].get(spec.key, {}).items()):
+                offense_rows.append(
+                    (offense_id, city_id, offense, spec.category_of(offense), spec.is_homicide(offense))
+                )
+        return city_rows, offense_rows
+
+    def _write_dimensions(self, state: Dict[str, Any]) -> None:
+        city_rows, offense_rows = self.dimension_rows(state)
+        for target, rows, schema in (
+            (self.city_path, city_rows, CITY_SCHEMA),
+            (self.offense_path, offense_rows, OFFENSE_SCHEMA),
+        ):
+            staging = target + ".staging"
+            shutil.rmtree(staging, ignore_errors=True)
+            self.spark.createDataFrame(rows, schema).coalesce(1).write.mode("overwrite").parquet(staging)
+            swap_directory(staging, target)
+
+    def facts(self, spec: Optional[CitySpec] = None):
+        """Coded crime rows for one city, or for all cities of this store."""
+        if spec is not None:
+            return self.spark.read.parquet(self.fact_path(spec))
+        return self.spark.read.parquet(*[self.fact_path(s) for s in self.cities])
+
+    def city_dimension(self):
+        return self.spark.read.parquet(self.city_path)
+
+    def offense_dimension(self):
+        return self.spark.read.parquet(self.offense_path)
+
+    def classified(self):
+        """``(city, year, month, offense, offense_category, is_homicide)`` per crime.
+
+        Both dimensions are broadcast; facts without an offense keep null
+        offense columns.
+        """
+        from pyspark.sql import functions as F
+
+        offenses = self.offense_dimension().drop("city_id")
+        cities = self.city_dimension().select("city_id", "city")
+        return (
+            self.facts()
+            .join(F.broadcast(offenses), "offense_id", "left")
+            .join(F.broadcast(cities), "city_id")
+            .select("city", "year", "month", "offense", "offense_category", "is_homicide")
+        )
+
+    def homicides_by_month(self, by_city: bool = False):
+        """Homicide counts per month (and city), classified by offense id."""
+        from pyspark.sql import functions as F
+
+        homicide_ids = self.offense_dimension().where("is_homicide").select("offense_id")
+        facts = self.facts().join(F.broadcast(homicide_ids), "offense_id", "left_semi")
+        keys = ["month"]
+        if by_city:
+            cities = self.city_dimension().select("city_id", "city")
+            facts = facts.join(F.broadcast(cities), "city_id")
+            keys = ["city", "month"]
+        return facts.groupBy(*keys).agg(F.count("*").alias("homicides")).orderBy(*keys)
+
+    def register_views(self) -> List[str]:
+        """Register ``DimCity``, ``DimOffense``, ``CrimeFacts`` and ``CrimesClassified``.
+
+        :data:`HOMICIDES_BY_MONTH_SQL` shows how to join them from SQL.
+        """
+        self.city_dimension().createOrReplaceTempView(CITY_VIEW)
+        self.offense_dimension().createOrReplaceTempView(OFFENSE_VIEW)
+        self.facts().createOrReplaceTempView(FACT_VIEW)
+        self.classified().createOrReplaceTempView(CLASSIFIED_VIEW)
+        return [CITY_VIEW, OFFENSE_VIEW, FACT_VIEW, CLASSIFIED_VIEW]
@@ -0,0 +1,477 @@
+"""Run small lesson queries in process and start Spark only when needed.
+
+Most statements in a lesson read a few MB: a view over one city file, a
+filter, a count by month.  For those, starting the JVM and scheduling a job
+dominates the run.  :class:`FastSession` stands in for ``spark`` in a
+notebook and decides per statement:
+
+* statements :mod:`deltaplus.minisql` can run, over at most
+  ``max_input_bytes`` of files, run in process with ``pyarrow``
+* everything else -- a larger input, a join, a window, the DataFrame API --
+  runs in a real ``SparkSession``, started on first use; the temp views
+  defined in process so far are replayed into it first, and later ones are
+  defined in both
+
+Queries return a :class:`FastFrame`: a lazy result with the read side of a
+DataFrame (``collect``, ``first``, ``count``, ``limit``, ``toPandas`` ...)
+that hands every other attribute to the equivalent Spark DataFrame.  If an
+in-process query fails at run time (a cast Arrow rejects, say), it is
+re-run in Spark, so results and errors stay Spark's.  Views created through
+the Spark DataFrame API are not visible to the in-process engine; a query
+naming one runs in Spark, but one shadowing an in-process view is not seen.
+
+:class:`FastRunner` runs notebooks with a :class:`FastSession`.  The
+classroom's lazily created ``global_temp`` views also go through Spark, so
+a lesson that never needs one never starts the JVM.  :func:`parity` checks
+a notebook's TEST-cell queries against Spark on the same views.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from deltaplus import footers, paths
+from deltaplus.arrow import ColumnarResult, fetch
+from deltaplus.classroom import CONTEXT_KEY, Classroom, LazyViews, Manifest, cleanup
+from deltaplus.cities import CitySpec
+from deltaplus.minisql import CreateView, Engine, UnsupportedSQL, parse
+from deltaplus.notebook import Notebook
+from deltaplus.runner import NotebookRunner, RunReport
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_INPUT_MB = 128
+
+_DROP_VIEW_RE = re.compile(r"^\s*DROP\s+VIEW\s+(IF\s+EXISTS\s+)?`?(\w+)`?\s*;?\s*$", re.I)
+_CACHE_RE = re.compile(
+    r"^\s*(?:UNCACHE|CACHE(?:\s+LAZY)?)\s+TABLE\s+(?:IF\s+EXISTS\s+)?`?(\w+)`?\s*;?\s*$", re.I
+)
+_SPARK_SQL_RE = re.compile(r"spark\.sql\(\s*(?P<quote>[\"'])(?P<sql>.*?)(?P=quote)\s*\)", re.S)
+
+
+class _NoJobs:
+    def getJobIdsForGroup(self, group_id=None) -> List[int]:  # noqa: N802 - mirrors pyspark
+        return []
+
+
+class _LazyContext:
+    """``sc`` that ignores job-group bookkeeping until Spark is running."""
+
+    def __init__(self, session: "FastSession"):
+        self._session = session
+
+    def _sc(self):
+        return self._session._spark.sparkContext if self._session.started else None
+
+    def setJobGroup(self, group_id: str, description: str, *args) -> None:  # noqa: N802
+        sc = self._sc()
+        if sc is not None:
+            sc.setJobGroup(group_id, description, *args)
+
+    def setLocalProperty(self, key: str, value: Optional[str]) -> None:  # noqa: N802
+        sc = self._sc()
+        if sc is not None:
+            sc.setLocalProperty(key, value)
+
+    def getLocalProperty(self, key: str) -> Optional[str]:  # noqa: N802
+        sc = self._sc()
+        return None if sc is None else sc.getLocalProperty(key)
+
+    def statusTracker(self):  # noqa: N802
+        sc = self._sc()
+        return _NoJobs() if sc is None else sc.statusTracker()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._session.spark.sparkContext, name)
+
+
+class _Catalog:
+    def __init__(self, session: "FastSession"):
+        self._session = session
+
+    def dropTempView(self, viewName: str) -> bool:  # noqa: N802, N803 - mirrors pyspark
+        existed = self._session._forget(viewName)
+        if self._session.started:
+            return self._session.spark.catalog.dropTempView(viewName)
+        return existed
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._session.spark.catalog, name)
+
+
+class FastFrame:
+    """Lazy result of a query the in-process engine accepted."""
+
+    def __init__(self, session: "FastSession", text: str, query=None, limit: Optional[int] = None):
+        self._session = session
+        self._text = text
+        self._query = query
+        self._limit = limit
+        self._result: Optional[ColumnarResult] = None
+        self._engine: Optional[str] = None
+
+    @property
+    def engine(self) -> Optional[str]:
+        """``"fast"`` or ``"spark"`` once the result has been computed."""
+        return self._engine
+
+    def result(self) -> ColumnarResult:
+        if self._result is None:
+            self._result, self._engine = self._session._execute(self)
+        return self._result
+
+    @property
+    def columns(self) -> List[str]:
+        return self.result().columns
+
+    def limit(self, num: int) -> "FastFrame":
+        if self._limit is not None:
+            num = min(num, self._limit)
+        return FastFrame(self._session, self._text, self._query, num)
+
+    def collect(self) -> list:
+        return list(self.result())
+
+    def first(self):
+        return self.limit(1).result().first()
+
+    def head(self, n: Optional[int] = None):
+        return self.first() if n is None else self.take(n)
+
+    def take(self, num: int) -> list:
+        return self.limit(num).collect()
+
+    def count(self) -> int:
+        return len(self.result())
+
+    def toPandas(self):  # noqa: N802 - mirrors pyspark
+        return self.result().to_pandas()
+
+    def show(self, n: int = 20, truncate: bool = True) -> None:
+        print(self.limit(n).toPandas().to_string(index=False))
+
+    def createOrReplaceTempView(self, name: str) -> None:  # noqa: N802
+        self._session.sql(f"CREATE OR REPLACE TEMPORARY VIEW {name} AS {self._sql()}")
+
+    def _sql(self) -> str:
+        if self._limit is None:
+            return self._text
+        return f"SELECT * FROM ({self._text}) LIMIT {self._limit}"
+
+    def _collect_as_arrow(self) -> list:
+        import pyarrow as pa
+
+        table = self.result().arrow
+        if table is None:
+            return []
+        batches = table.to_batches()
+        if not batches:
+            schema = table.schema
+            batches = [pa.RecordBatch.from_arrays([pa.array([], f.type) for f in schema], schema=schema)]
+        return batches
+
+    def to_spark(self):
+        """The same query as a Spark DataFrame."""
+        return self._session._spark_sql(self._sql())
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.to_spark(), name)
+
+
+class FastSession:
+    """``spark`` for notebooks: small statements in process, the rest in Spark."""
+
+    def __init__(
+        self,
+        spark=None,
+        *,
+        max_input_bytes: int = DEFAULT_MAX_INPUT_MB << 20,
+        spark_factory=None,
+    ):
+        self._spark = spark
+        self._factory = spark_factory
+        self.engine = Engine()
+        self.max_input_bytes = max_input_bytes
+        self.sparkContext = _LazyContext(self)
+        self.catalog = _Catalog(self)
+        # View statements run in process, replayed into Spark when it starts.
+        self._definitions: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self.stats = {"fast": 0, "spark": 0}
+
+    @property
+    def started(self) -> bool:
+        return self._spark is not None
+
+    @property
+    def spark(self):
+        """The real SparkSession, started (and caught up) on first use."""
+        with self._lock:
+            if self._spark is None:
+                if self._factory is not None:
+                    spark = self._factory()
+                else:
+                    from deltaplus.session import get_spark
+
+                    spark = get_spark()
+                log.info("starting Spark; replaying %d view(s)", len(self._definitions))
+                for statement in self._definitions.values():
+                    spark.sql(footers.with_cached_schema(spark, statement))
+                self._spark = spark
+        return self._spark
+
+    def sql(self, sqlQuery: str):  # noqa: N803 - mirrors pyspark
+        text = paths.rewrite_sql_paths(sqlQuery)
+        try:
+            statement = parse(text)
+        except UnsupportedSQL as exc:
+            handled = self._housekeeping(text)
+            return handled if handled is not None else self._fallback(text, exc)
+        if isinstance(statement, CreateView):
+            return self._define(text, statement)
+        try:
+            size = self.engine.input_bytes(statement)
+        except UnsupportedSQL as exc:
+            return self._fallback(text, exc)
+        if size > self.max_input_bytes:
+            return self._fallback(text, f"{size / (1 << 20):.1f} MB of input")
+        return FastFrame(self, text, statement)
+
+    def table(self, tableName: str):  # noqa: N803 - mirrors pyspark
+        return self.sql(f"SELECT * FROM {tableName}")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.spark, name)
+
+    def _define(self, text: str, statement: CreateView):
+        with self._lock:
+            try:
+                self.engine.define(statement)
+            except UnsupportedSQL as exc:
+                # Spark owns this view now; in-process queries on it fall back.
+                self._forget(statement.name)
+                return self._fallback(text, exc)
+            self._definitions.pop(statement.name.lower(), None)
+            self._definitions[statement.name.lower()] = text
+            self.stats["fast"] += 1
+            if self.started:
+                self._spark_sql(text)
+        return FastFrame(self, text)
+
+    def _forget(self, name: str) -> bool:
+        with self._lock:
+            self._definitions.pop(name.lower(), None)
+            return self.engine.drop(name)
+
+    def _housekeeping(self, text: str):
+        """Run view drops and (un)caching in process while Spark is not running."""
+        if self.started:
+            match = _DROP_VIEW_RE.match(text)
+            if match:
+                self._forget(match.group(2))
+            return None
+        match = _DROP_VIEW_RE.match(text)
+        if match and (match.group(1) or match.group(2) in self.engine):
+            self._forget(match.group(2))
+            return FastFrame(self, text)
+        match = _CACHE_RE.match(text)
+        # Caching would only keep the small files in memory; in process
+        # they are read again.
+        if match and (match.group(1) in self.engine or text.lstrip().upper().startswith("UNCACHE")):
+            return FastFrame(self, text)
+        return None
+
+    def _fallback(self, text: str, reason: Any):
+        log.debug("running in Spark (%s): %s", reason, text.strip().splitlines()[0] if text.strip() else "")
+        self.stats["spark"] += 1
+        return self._spark_sql(text)
+
+    def _spark_sql(self, text: str):
+        spark = self.spark
+        return spark.sql(footers.with_cached_schema(spark, text))
+
+    def _execute(self, frame: FastFrame):
+        if frame._query is None:
+            return ColumnarResult([], lists={}), "fast"
+        try:
+            table = self.engine.execute(frame._query, frame._limit)
+        except Exception as exc:  # noqa: BLE001 - Spark has the final word
+            log.debug("in-process query failed, running in Spark: %s", exc, exc_info=True)
+            self.stats["spark"] += 1
+            return fetch(frame.to_spark()), "spark"
+        self.stats["fast"] += 1
+        return ColumnarResult(table.column_names, table=table), "fast"
+
+
+class FastRunner(NotebookRunner):
+    """:class:`NotebookRunner` whose ``spark`` is a :class:`FastSession`."""
+
+    def __init__(self, spark=None, *, max_input_bytes: int = DEFAULT_MAX_INPUT_MB << 20, **kwargs):
+        if not isinstance(spark, FastSession):
+            spark = FastSession(spark, max_input_bytes=max_input_bytes)
+        super().__init__(spark, **kwargs)
+        self._hosted = CONTEXT_KEY in self.namespace
+
+    def run(self, path: str) -> RunReport:
+        if not self._hosted:
+            # The cleanup include leaves a hosted classroom alone: drop the
+            # previous run's artifacts here, and keep this run's for checks.
+            previous = self.namespace.get(CONTEXT_KEY)
+            if previous is not None:
+                cleanup(classroom=previous, force=True)
+            self.namespace[CONTEXT_KEY] = self._classroom(path)
+        return super().run(path)
+
+    def _classroom(self, path: str) -> Classroom:
+        """A hosted classroom whose lazy ``global_temp`` views start Spark only when used."""
+        from deltaplus.cities import get_cities
+
+        session = self.spark
+        lazy = LazyViews(session)
+        for spec in get_cities():
+            lazy.register(spec.source_view, lambda spec=spec: spec.read(session.spark))
+        lesson = os.path.splitext(os.path.basename(path))[0]
+        return Classroom(session, Manifest.load(lesson), lazy, hosted=True)
+
+    def _prepare_sql(self, statement: str) -> str:
+        # The session adds cached schemas to the statements it sends to Spark.
+        return statement
+
+    def _show(self, df: Any, statement: str) -> int:
+        if not self._in_process(df):
+            return super()._show(df, statement)
+        limit = self.preview.limit if self.preview is not None else self.display_limit
+        return len(df.limit(limit).result())
+
+    def _display(self, df: Any) -> None:
+        if not self._in_process(df):
+            return super()._display(df)
+        limit = self.preview.limit if self.preview is not None else self.display_limit
+        df.limit(limit).result()
+
+    def _in_process(self, df: Any) -> bool:
+        # Stratified previews sample in Spark.
+        return isinstance(df, FastFrame) and (self.preview is None or not self.preview.stratify)
+
+
+# -- parity with Spark ---------------------------------------------------------
+
+
+def test_queries(path: str) -> List[str]:
+    """The ``spark.sql(...)`` queries of a notebook's TEST cells."""
+    queries = []
+    for cell in Notebook.load(path):
+        if cell.is_test:
+            queries += [m.group("sql") for m in _SPARK_SQL_RE.finditer(cell.source)]
+    return queries
+
+
+def lesson_views(cities: List[CitySpec]) -> List[str]:
+    """The Data Lakes exercise's views, as the solution defines them."""
+    statements = []
+    for spec in cities:
+        statements.append(
+            f"CREATE OR REPLACE TEMPORARY VIEW {spec.source_view} "
+            f'USING parquet OPTIONS (path "{spec.local_path}")'
+        )
+        statements.append(f"CREATE OR REPLACE TEMPORARY VIEW {spec.homicides_view} AS {spec.homicides_sql()}")
+    union = "\nUNION ALL\n".join(f"SELECT month, offense FROM {spec.homicides_view}" for spec in cities)
+    statements.append(f"CREATE OR REPLACE TEMPORARY VIEW AllHomicides AS {union}")
+    statements.append(
+        "CREATE OR REPLACE TEMPORARY VIEW HomicidesByMonth AS "
+        "SELECT month, count(*) AS homicides FROM AllHomicides GROUP BY month ORDER BY month"
+    )
+    return statements
+
+
+def _same(a: Any, b: Any) -> bool:
+    if isinstance(a, float) and isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9) or (math.isnan(a) and math.isnan(b))
+    return a == b
+
+
+def _same_rows(fast: List[tuple], spark: List[tuple], ordered: bool) -> bool:
+    if not ordered:
+        fast, spark = sorted(fast, key=repr), sorted(spark, key=repr)
+    return len(fast) == len(spark) and all(
+        len(f) == len(s) and all(_same(x, y) for x, y in zip(f, s)) for f, s in zip(fast, spark)
+    )
+
+
+@dataclass
+class ParityResult:
+    query: str
+    ok: bool
+    engine: str  # where the fast path actually ran it
+    rows: int = 0
+    fast_s: float = 0.0
+    spark_s: float = 0.0
+    detail: Optional[str] = None
+
+
+@dataclass
+class ParityReport:
+    results: List[ParityResult] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return all(r.ok for r in self.results)
+
+    def summary(self) -> str:
+        lines = [f"{'result':<8} {'engine':<6} {'rows':>6} {'fast_s':>8} {'spark_s':>8}  query"]
+        for r in self.results:
+            lines.append(
+                f"{'OK' if r.ok else 'MISMATCH':<8} {r.engine:<6} {r.rows:>6} "
+                f"{r.fast_s:>8.3f} {r.spark_s:>8.3f}  {' '.join(r.query.split())}"
+            )
+            if r.detail:
+                lines.append(f"{'':>42}{r.detail}")
+        fast = sum(r.fast_s for r in self.results)
+        spark = sum(r.spark_s for r in self.results)
+        lines.append(f"total: in process {fast:.3f}s, Spark {spark:.3f}s")
+        return "\n".join(lines)
+
+
+def parity(
+    spark,
+    cities: List[CitySpec],
+    queries: List[str],
+    max_input_bytes: int = DEFAULT_MAX_INPUT_MB << 20,
+) -> ParityReport:
+    """Run ``queries`` in process and in Spark over the lesson's views; compare."""
+    # Spark is already running, so every view is defined in both.
+    session = FastSession(spark, max_input_bytes=max_input_bytes)
+    for statement in lesson_views(cities):
+        session.sql(statement)
+    report = ParityReport()
+    for query in queries:
+        start = time.perf_counter()
+        frame = session.sql(query)
+        fast = frame.result() if isinstance(frame, FastFrame) else fetch(frame)
+        fast_s = time.perf_counter() - start
+        start = time.perf_counter()
+        expected = fetch(spark.sql(footers.with_cached_schema(spark, paths.rewrite_sql_paths(query))))
+        spark_s = time.perf_counter() - start
+
+        ordered = bool(parse(query).order_by) if isinstance(frame, FastFrame) else True
+        fast_rows, spark_rows = [tuple(r) for r in fast], [tuple(r) for r in expected]
+        result = ParityResult(
+            query, ok=True, engine=frame.engine if isinstance(frame, FastFrame) else "spark",
+            rows=len(spark_rows), fast_s=fast_s, spark_s=spark_s,
+        )
+        if fast.columns != expected.columns:
+            result.ok, result.detail = False, f"columns {fast.columns} != {expected.columns}"
+        elif not _same_rows(fast_rows, spark_rows, ordered):
+            result.ok = False
+            result.detail = f"rows differ: {fast_rows[:3]}... != {spark_rows[:3]}..."
+        report.results.append(result)
+    return report
@@ -0,0 +1,48 @@
+"""Cheap change detection for lake files.
+
+A fingerprint is the sorted list of ``(relative path, size, mtime_ns)`` for
+every data file under a path.  It changes whenever a file is rewritten,
+added or removed, without reading any file contents.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import List, Tuple
+
+Fingerprint = List[Tuple[str, int, int]]
+
+
+def _is_data_file(name: str) -> bool:
+    # Spark writes _SUCCESS/_committed markers and .crc side files next to
+    # the data; they change on every write without the data changing.
+    return not name.startswith(("_", ".")) and not name.endswith(".crc")
+
+
+def fingerprint(path: str) -> Fingerprint:
+    """Fingerprint a file or a directory of files (recursively)."""
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return [(os.path.basename(path), st.st_size, st.st_mtime_ns)]
+    entries: Fingerprint = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(d for d in dirnames if _is_data_file(d))
+        for name in filenames:
+            if not _is_data_file(name):
+                continue
+            full = os.path.join(dirpath, name)
+            st = os.stat(full)
+            entries.append((os.path.relpath(full, path), st.st_size, st.st_mtime_ns))
+    return sorted(entries)
+
+
+def digest(fp: Fingerprint) -> str:
+    """Stable short hash of a fingerprint, suitable for cache keys."""
+    payload = json.dumps([list(entry) for entry in fp], separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def path_digest(path: str) -> str:
+    return digest(fingerprint(path))
@@ -0,0 +1,161 @@
+"""Persistent cache of Parquet schemas and footer statistics.
+
+Registering ``CrimeData<City>`` (``spark.read.parquet`` or ``CREATE TEMPORARY
+VIEW ... USING parquet``) infers the schema from file footers on every
+notebook run, and every scan estimate re-reads the footers of every file.
+:class:`FooterCache` keeps both in a small SQLite database:
+
+* the Spark schema of a source path, keyed by the path's fingerprint (file
+  sizes and modification times), so it is inferred once per version of the
+  data
+* the row-group statistics of each data file (see
+  :func:`deltaplus.parquet.read_row_groups`), keyed by path, size and mtime
+
+Entries of changed files simply stop matching and are replaced on the next
+lookup.  The default cache lives at ``dbfs:/deltaplus/cache/footers.sqlite``;
+``$DELTAPLUS_FOOTER_CACHE`` moves it, or disables it when set to ``off``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Optional
+
+from deltaplus import paths
+from deltaplus.fingerprints import path_digest
+from deltaplus.parquet import RowGroupStats, read_row_groups
+
+log = logging.getLogger(__name__)
+
+FOOTER_CACHE_ENV = "DELTAPLUS_FOOTER_CACHE"
+FOOTER_CACHE_PATH = "dbfs:/deltaplus/cache/footers.sqlite"
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS schemas (
+    path TEXT PRIMARY KEY, digest TEXT NOT NULL, schema TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS footers (
+    path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,
+    row_groups TEXT NOT NULL
+);
+"""
+
+_CREATE_USING_PARQUET_RE = re.compile(
+    r"^(\s*CREATE\s+(?:OR\s+REPLACE\s+)?(?:GLOBAL\s+)?(?:TEMP|TEMPORARY)\s+VIEW\s+"
+    r"(?:IF\s+NOT\s+EXISTS\s+)?`?[\w.]+`?)(\s+USING\s+parquet\s+OPTIONS\s*\((.*)\)\s*)$",
+    re.I | re.S,
+)
+_PATH_OPTION_RE = re.compile(r"\bpath\s*=?\s*(['\"])(.*?)\1", re.I)
+
+
+class FooterCache:
+    def __init__(self, path: Optional[str] = None):
+        self.path = paths.resolve(path or FOOTER_CACHE_PATH)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA_SQL)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def spark_schema(self, spark, path: str):
+        """Spark schema of the Parquet file or dataset at ``path``."""
+        from pyspark.sql.types import StructType
+
+        path = paths.resolve(path)
+        digest = path_digest(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT schema FROM schemas WHERE path = ? AND digest = ?", (path, digest)
+            ).fetchone()
+        if row is not None:
+            return StructType.fromJson(json.loads(row[0]))
+        schema = spark.read.parquet(path).schema
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO schemas VALUES (?, ?, ?)", (path, digest, schema.json())
+            )
+        return schema
+
+    def row_groups(self, file: str) -> RowGroupStats:
+        """Row-group statistics of one data file, read from its footer once."""
+        st = os.stat(file)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT row_groups FROM footers WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (file, st.st_size, st.st_mtime_ns),
+            ).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+        groups = read_row_groups(file)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO footers VALUES (?, ?, ?, ?)",
+                (file, st.st_size, st.st_mtime_ns, json.dumps(groups)),
+            )
+        return groups
+
+    def stats(self) -> dict:
+        with self._lock:
+            schemas = self._conn.execute("SELECT count(*) FROM schemas").fetchone()[0]
+            footers = self._conn.execute("SELECT count(*) FROM footers").fetchone()[0]
+        return {"schemas": schemas, "footers": footers}
+
+
+_default: Optional[FooterCache] = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> Optional[FooterCache]:
+    """The process-wide cache, or None when disabled via the environment."""
+    global _default
+    setting = os.environ.get(FOOTER_CACHE_ENV, "")
+    if setting.lower() == "off":
+        return None
+    with _default_lock:
+        wanted = paths.resolve(setting or FOOTER_CACHE_PATH)
+        if _default is None or _default.path != wanted:
+            _default = FooterCache(wanted)
+        return _default
+
+
+def read_parquet(spark, path: str):
+    """``spark.read.parquet(path)`` with the schema taken from the cache."""
+    cache = default_cache()
+    if cache is None:
+        return spark.read.parquet(path)
+    return spark.read.schema(cache.spark_schema(spark, path)).parquet(path)
+
+
+def _ddl(schema) -> str:
+    return ", ".join(f"`{f.name}` {f.dataType.simpleString()}" for f in schema.fields)
+
+
+def with_cached_schema(spark, statement: str) -> str:
+    """Add the cached column list to ``CREATE TEMPORARY VIEW ... USING parquet``.
+
+    A view declared with its columns skips schema inference; statements
+    that already declare columns, or whose path cannot be read, are returned
+    unchanged so Spark reports its own error.
+    """
+    match = _CREATE_USING_PARQUET_RE.match(statement)
+    cache = default_cache()
+    if match is None or cache is None:
+        return statement
+    option = _PATH_OPTION_RE.search(match.group(3))
+    if option is None:
+        return statement
+    try:
+        schema = cache.spark_schema(spark, option.group(2))
+    except Exception:  # noqa: BLE001 - let the statement itself fail
+        log.debug("no cached schema for %s", option.group(2), exc_info=True)
+        return statement
+    return f"{match.group(1)} ({_ddl(schema)}){match.group(2)}"
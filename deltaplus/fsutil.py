@@ -0,0 +1,30 @@
+"""Small file-system helpers shared by the table writers."""
+
+from __future__ import annotations
+
+import os
+import shutil
+import uuid
+
+
+def swap_directory(staging: str, target: str) -> None:
+    """Replace ``target`` with ``staging`` keeping the window without data short."""
+    retired = target + ".old"
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.exists(target):
+        os.rename(target, retired)
+    os.rename(staging, target)
+    shutil.rmtree(retired, ignore_errors=True)
+
+
+def write_json_atomic(path: str, payload) -> None:
+    """Write ``payload`` as JSON so readers never see a partial file."""
+    import json
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Unique per writer: concurrent writers of the same file each replace
+    # it whole instead of renaming one another's temporary file.
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, indent=2, sort_keys=True)
+    os.replace(tmp, path)
@@ -0,0 +1,273 @@
+"""Grade many submitted notebooks concurrently on one Spark application.
+
+The exercises name their views ``CrimeDataChicago``, ``HomicidesChicago``,
+``AllHomicides`` ..., so two submissions in one session overwrite each
+other, and grading one submission per application pays the JVM start and
+the lake scan every time.  :class:`GradingServer` keeps a single
+``SparkSession`` and gives every submission
+
+* its own ``spark.newSession()``: temp views are per session, so each
+  submission has a private view namespace, while the SparkContext, the
+  cache manager and ``global_temp`` are shared
+* its own hosted :class:`~deltaplus.classroom.Classroom`, with a manifest
+  named after the submission; the lesson's cleanup include leaves a hosted
+  classroom alone, and the grader drops what the submission created once
+  its views have been checked
+* its own scheduler pool, so with ``spark.scheduler.mode=FAIR`` concurrent
+  submissions share the executors
+
+The lake is registered once as ``global_temp.CrimeData<City>`` and cached;
+a submission's ``CREATE TEMPORARY VIEW ... USING parquet`` over one of the
+city files is redirected to that view, so every submission reads the cached
+base tables instead of the files.  After its notebook has run, each
+submission's views are checked with the lesson's batched TEST expectations
+(:mod:`deltaplus.checks`).  Submissions are graded on a thread pool;
+:meth:`GradingServer.submit` returns a future, :meth:`GradingServer.grade`
+grades a batch and reports throughput and latency.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from deltaplus import paths
+from deltaplus.checks import LESSON_CHECKS, CheckReport
+from deltaplus.cities import CitySpec, get_cities
+from deltaplus.classroom import CONTEXT_KEY, GLOBAL_DB, Classroom, LazyViews, Manifest, cleanup, parquet_view
+from deltaplus.notebook import Notebook
+from deltaplus.runner import NotebookRunner, RunReport
+
+log = logging.getLogger(__name__)
+
+POOL_PREFIX = "grading"
+DEFAULT_WORKERS = 8
+DEFAULT_DISPLAY_LIMIT = 20
+
+
+class SubmissionRunner(NotebookRunner):
+    """:class:`NotebookRunner` that reads city files from the shared cached views."""
+
+    def __init__(self, spark, *, shared: Dict[str, str], **kwargs):
+        super().__init__(spark, **kwargs)
+        # Normalized local path -> global view over that path.
+        self.shared = shared
+
+    def _prepare_sql(self, statement: str) -> str:
+        found = parquet_view(statement)
+        if found:
+            view = self.shared.get(os.path.normpath(found[1]))
+            if view is not None:
+                return f"CREATE OR REPLACE TEMPORARY VIEW {found[0]} AS SELECT * FROM {view}"
+        return super()._prepare_sql(statement)
+
+
+@dataclass
+class GradeResult:
+    submission: str
+    path: str
+    status: str = "ok"  # "ok", "failed" (checks or TEST cells) or "error"
+    tests_passed: int = 0
+    tests_failed: int = 0
+    checks: Optional[CheckReport] = None
+    queued_s: float = 0.0
+    latency_s: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def score(self) -> Optional[float]:
+        if self.checks is not None and self.checks.results:
+            return 1 - len(self.checks.failures) / len(self.checks.results)
+        total = self.tests_passed + self.tests_failed
+        return self.tests_passed / total if total else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        entry = {
+            "submission": self.submission,
+            "path": self.path,
+            "status": self.status,
+            "score": self.score,
+            "tests_passed": self.tests_passed,
+            "tests_failed": self.tests_failed,
+            "queued_s": round(self.queued_s, 4),
+            "latency_s": round(self.latency_s, 4),
+            "error": self.error,
+        }
+        if self.checks is not None:
+            entry["failed_checks"] = [r.name for r in self.checks.failures]
+        return entry
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+@dataclass
+class GradingReport:
+    results: List[GradeResult] = field(default_factory=list)
+    wall_time_s: float = 0.0
+
+    @property
+    def throughput_per_min(self) -> float:
+        return 60 * len(self.results) / self.wall_time_s if self.wall_time_s else 0.0
+
+    def summary(self) -> str:
+        latencies = [r.latency_s for r in self.results]
+        lines = [
+            f"{len(self.results)} submissions in {self.wall_time_s:.1f}s "
+            f"({self.throughput_per_min:.1f}/min); latency p50 {_percentile(latencies, 0.5):.2f}s, "
+            f"p95 {_percentile(latencies, 0.95):.2f}s, max {max(latencies, default=0):.2f}s"
+        ]
+        for r in self.results:
+            score = "-" if r.score is None else f"{r.score:.0%}"
+            lines.append(
+                f"  {r.submission:<32} {r.status:<7} {score:>5} "
+                f"{r.latency_s:>7.2f}s (queued {r.queued_s:.2f}s)"
+            )
+            if r.error:
+                lines.append(f"  {'':<32} {r.error}")
+            elif r.checks is not None:
+                lines += [f"  {'':<32} FAIL {c.name}" for c in r.checks.failures]
+        return "\n".join(lines)
+
+
+class GradingServer:
+    def __init__(
+        self,
+        spark=None,
+        *,
+        check: Optional[str] = "data-lakes",
+        cities: Optional[List[CitySpec]] = None,
+        max_workers: int = DEFAULT_WORKERS,
+        display_limit: int = DEFAULT_DISPLAY_LIMIT,
+        cache_base: bool = True,
+    ):
+        if spark is None:
+            from deltaplus.session import get_spark
+
+            spark = get_spark()
+        self.spark = spark
+        self.check = check
+        self.cities = cities if cities is not None else get_cities()
+        self.max_workers = max_workers
+        self.display_limit = display_limit
+        self.cache_base = cache_base
+        self._shared: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=POOL_PREFIX)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self) -> "GradingServer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def prepare(self) -> Dict[str, str]:
+        """Register (and cache) the base views once; map city paths to them."""
+        with self._lock:
+            if self._shared is None:
+                shared = {}
+                for spec in self.cities:
+                    if not os.path.exists(spec.local_path):
+                        continue
+                    spec.read(self.spark).createOrReplaceGlobalTempView(spec.source_view)
+                    view = f"{GLOBAL_DB}.{spec.source_view}"
+                    if self.cache_base:
+                        self.spark.sql(f"CACHE TABLE {view}")
+                    shared[os.path.normpath(spec.local_path)] = view
+                self._shared = shared
+        return self._shared
+
+    def release(self) -> None:
+        """Uncache and drop the shared base views."""
+        with self._lock:
+            for view in (self._shared or {}).values():
+                self.spark.sql(f"UNCACHE TABLE IF EXISTS {view}")
+                self.spark.catalog.dropGlobalTempView(view.split(".", 1)[1])
+            self._shared = None
+
+    def submit(self, path: str, submission: Optional[str] = None) -> "Future[GradeResult]":
+        submission = submission or os.path.splitext(os.path.basename(path))[0]
+        queued = time.perf_counter()
+        return self._pool.submit(self._grade_one, submission, path, queued)
+
+    def grade(self, submissions: Dict[str, str]) -> GradingReport:
+        """Grade ``{submission id: notebook path}`` concurrently."""
+        self.prepare()
+        report = GradingReport()
+        start = time.perf_counter()
+        futures = [self.submit(path, name) for name, path in submissions.items()]
+        report.results = [f.result() for f in futures]
+        report.wall_time_s = time.perf_counter() - start
+        return report
+
+    def _grade_one(self, submission: str, path: str, queued: float) -> GradeResult:
+        start = time.perf_counter()
+        result = GradeResult(submission, path, queued_s=start - queued)
+        session = self.spark.newSession()
+        sc = session.sparkContext
+        slot = threading.current_thread().name.rsplit("_", 1)[-1]
+        sc.setLocalProperty("spark.scheduler.pool", f"{POOL_PREFIX}-{slot}")
+        classroom = Classroom(
+            session, Manifest(lesson=f"grading-{submission}"), LazyViews(session), hosted=True
+        )
+        try:
+            runner = SubmissionRunner(
+                session, shared=self.prepare(), display_limit=self.display_limit,
+                continue_on_error=True, namespace={CONTEXT_KEY: classroom},
+            )
+            self._score(result, runner.run(path), Notebook.load(path))
+            if self.check is not None:
+                result.checks = LESSON_CHECKS[self.check](session).run()
+            if result.tests_failed or (result.checks is not None and not result.checks.ok):
+                result.status = "failed"
+        except Exception as exc:  # noqa: BLE001 - reported per submission
+            result.status = "error"
+            result.error = str(exc).splitlines()[0] if str(exc) else type(exc).__name__
+            log.debug("grading %s failed", submission, exc_info=True)
+        finally:
+            cleanup(classroom=classroom, force=True)
+            sc.setLocalProperty("spark.scheduler.pool", None)
+            result.latency_s = time.perf_counter() - start
+        log.info("graded %s: %s in %.2fs", submission, result.status, result.latency_s)
+        return result
+
+    @staticmethod
+    def _score(result: GradeResult, report: RunReport, notebook: Notebook) -> None:
+        tests = {c.index for c in notebook if c.is_test}
+        for cell in report.cells:
+            if cell.notebook != notebook.path or cell.index not in tests:
+                continue
+            if cell.status == "ok":
+                result.tests_passed += 1
+            else:
+                result.tests_failed += 1
+
+
+def find_submissions(targets: List[str]) -> Dict[str, str]:
+    """``{submission id: path}`` for notebook files and directories of them."""
+    found: Dict[str, str] = {}
+    for target in targets:
+        target = paths.resolve(target)
+        if os.path.isdir(target):
+            files = [os.path.join(target, n) for n in sorted(os.listdir(target)) if n.endswith(".py")]
+        else:
+            files = [target]
+        for file in files:
+            name = base = os.path.splitext(os.path.basename(file))[0]
+            suffix = 2
+            while name in found:
+                name, suffix = f"{base}-{suffix}", suffix + 1
+            found[name] = file
+    return found
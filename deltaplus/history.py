@@ -0,0 +1,292 @@
+"""Per-cell run history with rolling baselines and regression flags.
+
+A slower normalization view or a changed Spark setting only shows up as a
+lesson that "feels slow".  :class:`RunHistory` appends every headless run's
+per-cell wall time, rows, bytes read and peak execution memory (see
+``NotebookRunner(stage_metrics=True)``) to a local SQLite database and
+compares a new run with its baseline: per cell and metric, the median of
+the same notebook's previous ``window`` runs in which the cell succeeded.
+A cell regresses when a metric exceeds its baseline by more than
+``threshold`` (a fraction) *and* by more than the metric's noise floor, so
+a 20 ms cell taking 30 ms is not flagged.  :meth:`RunHistory.trend_report`
+summarizes each cell of a notebook over its recent runs.
+
+Cells are identified as ``<notebook file>:<cell index>``; the cells of
+``%run`` includes are recorded under their own notebook.  The default
+database lives at ``dbfs:/deltaplus/history/runs.sqlite``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from deltaplus import paths
+from deltaplus.runner import RunReport
+
+log = logging.getLogger(__name__)
+
+HISTORY_PATH = "dbfs:/deltaplus/history/runs.sqlite"
+DEFAULT_WINDOW = 10
+DEFAULT_THRESHOLD = 0.25
+# Fewer earlier runs than this give no baseline.
+MIN_BASELINE_RUNS = 3
+
+# Metrics compared against the baseline, with the absolute increase below
+# which a change is noise.
+METRIC_FLOORS = {
+    "wall_time_s": 0.1,
+    "input_bytes": 1 << 20,
+    "peak_memory": 16 << 20,
+}
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT, notebook TEXT NOT NULL,
+    started_at REAL NOT NULL, wall_time_s REAL NOT NULL, ok INTEGER NOT NULL,
+    label TEXT, conf TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_notebook ON runs (notebook, run_id);
+CREATE TABLE IF NOT EXISTS cells (
+    run_id INTEGER NOT NULL, cell TEXT NOT NULL, line INTEGER NOT NULL, kind TEXT NOT NULL,
+    status TEXT NOT NULL, wall_time_s REAL NOT NULL, jobs INTEGER NOT NULL, rows INTEGER,
+    input_bytes INTEGER, peak_memory INTEGER,
+    PRIMARY KEY (run_id, cell)
+);
+"""
+
+_CELL_COLUMNS = ("cell", "line", "kind", "status", "wall_time_s", "jobs", "rows", "input_bytes", "peak_memory")
+
+
+def cell_key(notebook: str, index: int) -> str:
+    return f"{os.path.basename(notebook)}:{index}"
+
+
+def _mb(value: Optional[int]) -> str:
+    return "-" if value is None else f"{value / (1 << 20):.1f}"
+
+
+def _format(metric: str, value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    if metric == "wall_time_s":
+        return f"{value:.3f}s"
+    return f"{value / (1 << 20):.1f} MB"
+
+
+@dataclass
+class CellDelta:
+    cell: str
+    line: int
+    metric: str
+    baseline: float
+    value: float
+    samples: int
+    regressed: bool = False
+
+    @property
+    def change(self) -> Optional[float]:
+        return self.value / self.baseline - 1 if self.baseline else None
+
+    def describe(self) -> str:
+        change = "" if self.change is None else f" ({self.change:+.0%})"
+        return (
+            f"{self.cell} (line {self.line}) {self.metric} "
+            f"{_format(self.metric, self.baseline)} -> {_format(self.metric, self.value)}{change}"
+        )
+
+
+@dataclass
+class Comparison:
+    run_id: int
+    notebook: str
+    window: int
+    threshold: float
+    baseline_runs: int = 0
+    deltas: List[CellDelta] = field(default_factory=list)
+    # Cells with too few earlier successful runs to compare.
+    new_cells: List[str] = field(default_factory=list)
+
+    @property
+    def regressions(self) -> List[CellDelta]:
+        return [d for d in self.deltas if d.regressed]
+
+    def summary(self) -> str:
+        head = f"{self.notebook} run {self.run_id}"
+        if self.baseline_runs < MIN_BASELINE_RUNS:
+            return f"{head}: no baseline yet ({self.baseline_runs} earlier runs, needs {MIN_BASELINE_RUNS})"
+        lines = [
+            f"{head} vs median of {self.baseline_runs} earlier runs: "
+            f"{len(self.regressions)} regressions (threshold +{self.threshold:.0%})"
+        ]
+        lines += [f"  REGRESSED {d.describe()}" for d in self.regressions]
+        if self.new_cells:
+            lines.append(f"  no baseline for {len(self.new_cells)} cells")
+        return "\n".join(lines)
+
+
+class RunHistory:
+    def __init__(self, path: Optional[str] = None):
+        self.path = paths.resolve(path or HISTORY_PATH)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA_SQL)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def record(
+        self, report: RunReport, label: Optional[str] = None, conf: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """Append ``report`` to the history; return its run id."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (notebook, started_at, wall_time_s, ok, label, conf) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    os.path.basename(report.notebook), report.started_at or time.time(),
+                    report.wall_time_s, int(report.ok), label,
+                    json.dumps(conf, sort_keys=True) if conf else None,
+                ),
+            )
+            run_id = cursor.lastrowid
+            # A notebook included twice keeps its last execution.
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        run_id, cell_key(c.notebook, c.index), c.line, c.kind, c.status,
+                        c.wall_time_s, c.jobs, c.rows, c.input_bytes, c.peak_memory,
+                    )
+                    for c in report.cells
+                ],
+            )
+        return run_id
+
+    def runs(self, notebook: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """The latest runs, newest first."""
+        sql = "SELECT run_id, notebook, started_at, wall_time_s, ok, label FROM runs"
+        params: Tuple[Any, ...] = ()
+        if notebook:
+            sql += " WHERE notebook = ?"
+            params = (os.path.basename(notebook),)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY run_id DESC LIMIT ?", params + (limit,)).fetchall()
+        keys = ("run_id", "notebook", "started_at", "wall_time_s", "ok", "label")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def _run_ids(self, notebook: str, before: Optional[int], limit: int) -> List[int]:
+        sql = "SELECT run_id FROM runs WHERE notebook = ?"
+        params: Tuple[Any, ...] = (notebook,)
+        if before is not None:
+            sql += " AND run_id < ?"
+            params += (before,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY run_id DESC LIMIT ?", params + (limit,)).fetchall()
+        return [r[0] for r in reversed(rows)]
+
+    def _cells(self, run_ids: List[int]) -> Dict[int, Dict[str, Dict[str, Any]]]:
+        """``{run id: {cell: row}}``."""
+        if not run_ids:
+            return {}
+        marks = ", ".join("?" * len(run_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT run_id, {', '.join(_CELL_COLUMNS)} FROM cells WHERE run_id IN ({marks})",
+                run_ids,
+            ).fetchall()
+        cells: Dict[int, Dict[str, Dict[str, Any]]] = {run_id: {} for run_id in run_ids}
+        for row in rows:
+            entry = dict(zip(_CELL_COLUMNS, row[1:]))
+            cells[row[0]][entry["cell"]] = entry
+        return cells
+
+    def baseline(
+        self, notebook: str, before: Optional[int] = None, window: int = DEFAULT_WINDOW
+    ) -> Dict[str, Dict[str, Tuple[float, int]]]:
+        """``{cell: {metric: (median, samples)}}`` over the runs before ``before``."""
+        samples: Dict[str, Dict[str, List[float]]] = {}
+        run_ids = self._run_ids(os.path.basename(notebook), before, window)
+        for cells in self._cells(run_ids).values():
+            for cell, entry in cells.items():
+                if entry["status"] != "ok":
+                    continue
+                for metric in METRIC_FLOORS:
+                    if entry[metric] is not None:
+                        samples.setdefault(cell, {}).setdefault(metric, []).append(entry[metric])
+        return {
+            cell: {metric: (statistics.median(values), len(values)) for metric, values in metrics.items()}
+            for cell, metrics in samples.items()
+        }
+
+    def compare(
+        self, run_id: int, window: int = DEFAULT_WINDOW, threshold: float = DEFAULT_THRESHOLD
+    ) -> Comparison:
+        """Compare run ``run_id`` with the median of its notebook's previous runs."""
+        with self._lock:
+            row = self._conn.execute("SELECT notebook FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"no run {run_id}")
+        notebook = row[0]
+        comparison = Comparison(run_id, notebook, window, threshold)
+        comparison.baseline_runs = len(self._run_ids(notebook, run_id, window))
+        baseline = self.baseline(notebook, before=run_id, window=window)
+        for cell, entry in sorted(self._cells([run_id])[run_id].items(), key=lambda kv: kv[1]["line"]):
+            if entry["status"] != "ok":
+                continue
+            known = baseline.get(cell, {})
+            if known.get("wall_time_s", (0, 0))[1] < MIN_BASELINE_RUNS:
+                comparison.new_cells.append(cell)
+                continue
+            for metric, floor in METRIC_FLOORS.items():
+                value = entry[metric]
+                if value is None or metric not in known or known[metric][1] < MIN_BASELINE_RUNS:
+                    continue
+                median, samples = known[metric]
+                regressed = value > median * (1 + threshold) and value - median > floor
+                comparison.deltas.append(
+                    CellDelta(cell, entry["line"], metric, median, value, samples, regressed)
+                )
+        return comparison
+
+    def trend(self, notebook: str, limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        """``{cell: [row per run, oldest first]}`` over the notebook's last ``limit`` runs."""
+        series: Dict[str, List[Dict[str, Any]]] = {}
+        for run_id, cells in self._cells(self._run_ids(os.path.basename(notebook), None, limit)).items():
+            for cell, entry in cells.items():
+                series.setdefault(cell, []).append(dict(entry, run_id=run_id))
+        return series
+
+    def trend_report(self, notebook: str, limit: int = 20) -> str:
+        """Per cell: wall time range and median, the latest run against that median."""
+        series = self.trend(notebook, limit)
+        runs = self._run_ids(os.path.basename(notebook), None, limit)
+        lines = [
+            f"{os.path.basename(notebook)}: last {len(runs)} runs",
+            f"{'cell':<36} {'line':>5} {'runs':>4} {'min_s':>8} {'median_s':>8} {'max_s':>8} "
+            f"{'last_s':>8} {'change':>7} {'rows':>8} {'read_mb':>8} {'peak_mb':>8}",
+        ]
+        for cell, rows in sorted(series.items(), key=lambda kv: (kv[0].rsplit(":", 1)[0], kv[1][-1]["line"])):
+            times = [r["wall_time_s"] for r in rows if r["status"] == "ok"]
+            if not times:
+                continue
+            last = rows[-1]
+            median = statistics.median(times)
+            change = f"{last['wall_time_s'] / median - 1:+.0%}" if median and last["status"] == "ok" else "-"
+            lines.append(
+                f"{cell:<36} {last['line']:>5} {len(times):>4} {min(times):>8.3f} {median:>8.3f} "
+                f"{max(times):>8.3f} {last['wall_time_s']:>8.3f} {change:>7} "
+                f"{'-' if last['rows'] is None else last['rows']:>8} "
+                f"{_mb(last['input_bytes']):>8} {_mb(last['peak_memory']):>8}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,336 @@
+"""Convert raw CSV/JSON/XML city drops into normalized Parquet tables.
+
+Data lakes fill up with text dumps; querying them in place re-parses every
+file on every query.  :class:`Ingestor` converts each city's drop directory
+once, on a process pool (one file per task), into Parquet with the
+normalized schema ``(city, month, offense, offense_category)`` — the same
+rules :class:`~deltaplus.cities.CitySpec` applies in SQL, evaluated in Python
+(``is_homicide``, ``category_of``, ``month_of``) so workers need no Spark.
+
+Files are read as streams and written in row batches, so memory stays flat
+however large a drop is:
+
+* CSV through :mod:`csv` with a header row
+* JSON as line-delimited records, concatenated documents or one top-level
+  array, decoded value by value
+* XML through ``iterparse``: every child of the root element is a record,
+  its attributes and child elements are the fields
+
+``.gz`` variants of all three are read transparently.  The state file maps
+each drop file to its size, mtime and SHA-256; files whose stat is unchanged
+are skipped without being read, touched files whose checksum is unchanged
+only have their stat refreshed.  Changed files replace their previous
+output; outputs of deleted drops are kept.
+
+Layout::
+
+    <drops>/<CityKey>/*.csv|*.json|*.jsonl|*.xml[.gz]
+    <root>/<CityKey>/<file>-<sha256[:12]>.parquet
+    <root>/_ingested.json
+
+Writing Parquet outside Spark needs ``pyarrow``.
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+from deltaplus import paths
+from deltaplus.cities import NORMALIZED_COLUMNS, CitySpec, get_cities
+from deltaplus.fsutil import write_json_atomic
+from deltaplus.parquet import require_pyarrow
+
+log = logging.getLogger(__name__)
+
+DROPS_DIR = "dbfs:/deltaplus/drops"
+INGESTED_DIR = "dbfs:/deltaplus/ingested"
+STATE_FILE = "_ingested.json"
+FORMATS = {".csv": "csv", ".json": "json", ".jsonl": "json", ".ndjson": "json", ".xml": "xml"}
+BATCH_ROWS = 64 * 1024
+CHECKSUM_CHUNK = 1 << 20
+_READ_CHUNK = 1 << 16
+_NUMBER_TAIL_RE = re.compile(r"[0-9.eE+-]*\Z")
+
+
+def drop_format(name: str) -> Optional[str]:
+    """``csv``, ``json`` or ``xml`` for a drop file name, None otherwise."""
+    if name.startswith(("_", ".")):
+        return None
+    base = name[:-3] if name.endswith(".gz") else name
+    return FORMATS.get(os.path.splitext(base)[1].lower())
+
+
+def checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHECKSUM_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def iter_csv(path: str) -> Iterator[Dict[str, Any]]:
+    with _open_text(path) as fh:
+        yield from csv.DictReader(fh)
+
+
+def iter_json(path: str) -> Iterator[Dict[str, Any]]:
+    """Records of a JSON-lines file, concatenated objects or a top-level array."""
+    decoder = json.JSONDecoder()
+    with _open_text(path) as fh:
+        buffer, pos, eof = "", 0, False
+        in_array = None
+        while True:
+            # Skip whitespace and, inside the array, the separating commas.
+            while pos < len(buffer) and (buffer[pos].isspace() or (in_array and buffer[pos] == ",")):
+                pos += 1
+            if pos < len(buffer):
+                if in_array is None:
+                    in_array = buffer[pos] == "["
+                    pos += in_array
+                    continue
+                if in_array and buffer[pos] == "]":
+                    return
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    end = None
+                # A number followed by nothing but number characters may be
+                # cut at the buffer edge ("1." of "1.5e10").
+                if end is not None and (eof or not isinstance(value, (int, float))
+                                        or _NUMBER_TAIL_RE.match(buffer, end) is None):
+                    pos = end
+                    if isinstance(value, dict):
+                        yield value
+                    continue
+            elif eof:
+                return
+            chunk = fh.read(_READ_CHUNK)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+
+
+def iter_xml(path: str) -> Iterator[Dict[str, Any]]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as fh:
+        depth = 0
+        root = None
+        for event, elem in ElementTree.iterparse(fh, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if root is None:
+                    root = elem
+                continue
+            depth -= 1
+            if depth == 1:
+                record: Dict[str, Any] = dict(elem.attrib)
+                for child in elem:
+                    record[child.tag] = child.text
+                yield record
+                # Drop the parsed record so the tree never grows.
+                root.clear()
+
+
+_READERS = {"csv": iter_csv, "json": iter_json, "xml": iter_xml}
+
+
+def _field(record: Dict[str, Any], column: str) -> Any:
+    if column in record:
+        return record[column]
+    wanted = column.lower()
+    for key, value in record.items():
+        if key.lower() == wanted:
+            return value
+    return None
+
+
+def convert_file(spec: CitySpec, source: str, target: str, fmt: str,
+                 batch_rows: int = BATCH_ROWS) -> Dict[str, int]:
+    """Stream one drop file into a normalized Parquet file at ``target``."""
+    pq = require_pyarrow()
+    import pyarrow as pa
+
+    schema = pa.schema(list(zip(NORMALIZED_COLUMNS, (pa.string(), pa.int32(), pa.string(), pa.string()))))
+    counts = {"rows": 0, "homicides": 0, "unparsed_months": 0}
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = target + ".tmp"
+    columns: Dict[str, list] = {name: [] for name in schema.names}
+
+    def flush(writer) -> None:
+        if columns["city"]:
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            for values in columns.values():
+                values.clear()
+
+    with pq.ParquetWriter(tmp, schema) as writer:
+        for record in _READERS[fmt](source):
+            offense = _field(record, spec.offense_column)
+            raw_month = _field(record, spec.date_column)
+            month = spec.month_of(raw_month)
+            category = spec.category_of(offense)
+            if month is None and raw_month not in (None, ""):
+                counts["unparsed_months"] += 1
+            columns["city"].append(spec.name)
+            columns["month"].append(month)
+            columns["offense"].append(offense)
+            columns["offense_category"].append(category)
+            counts["rows"] += 1
+            counts["homicides"] += spec.is_homicide(offense)
+            if len(columns["city"]) >= batch_rows:
+                flush(writer)
+        flush(writer)
+    os.replace(tmp, target)
+    return counts
+
+
+def _ingest_one(spec: CitySpec, source: str, target_dir: str, fmt: str,
+                known: Optional[str], batch_rows: int) -> Dict[str, Any]:
+    """Process-pool task: checksum ``source`` and convert it if it changed."""
+    st = os.stat(source)
+    digest = checksum(source)
+    entry: Dict[str, Any] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+    if digest == known:
+        entry["status"] = "unchanged"
+        return entry
+    stem = os.path.basename(source).split(".", 1)[0]
+    target = os.path.join(target_dir, f"{stem}-{digest[:12]}.parquet")
+    entry.update(convert_file(spec, source, target, fmt, batch_rows))
+    entry.update(status="converted", output=os.path.basename(target))
+    return entry
+
+
+@dataclass
+class IngestResult:
+    converted: Dict[str, int] = field(default_factory=dict)  # file -> rows
+    unchanged: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    wall_time_s: float = 0.0
+
+
+class Ingestor:
+    def __init__(
+        self,
+        drops: Optional[str] = None,
+        root: Optional[str] = None,
+        cities: Optional[List[CitySpec]] = None,
+        max_workers: Optional[int] = None,
+        batch_rows: int = BATCH_ROWS,
+    ):
+        self.drops = paths.resolve(drops or DROPS_DIR)
+        self.root = paths.resolve(root or INGESTED_DIR)
+        self.cities = cities if cities is not None else get_cities()
+        self.max_workers = max_workers
+        self.batch_rows = batch_rows
+
+    def drop_path(self, spec: CitySpec) -> str:
+        return os.path.join(self.drops, spec.key)
+
+    def table_path(self, spec: CitySpec) -> str:
+        return os.path.join(self.root, spec.key)
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.root, STATE_FILE)
+
+    def load_state(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {}
+
+    def _has_output(self, spec: CitySpec, entry: Dict[str, Any]) -> bool:
+        return "output" in entry and os.path.isfile(os.path.join(self.table_path(spec), entry["output"]))
+
+    def pending(self, state: Dict[str, Dict[str, Dict[str, Any]]]
+                ) -> Tuple[List[Tuple[CitySpec, str, str]], List[str]]:
+        """Drop files that need a checksum, and those skipped on stat alone."""
+        todo, skipped = [], []
+        for spec in self.cities:
+            directory = self.drop_path(spec)
+            if not os.path.isdir(directory):
+                continue
+            seen = state.get(spec.key, {})
+            for name in sorted(os.listdir(directory)):
+                fmt = drop_format(name)
+                source = os.path.join(directory, name)
+                if fmt is None or not os.path.isfile(source):
+                    continue
+                entry = seen.get(name, {})
+                st = os.stat(source)
+                if (entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns
+                        and self._has_output(spec, entry)):
+                    skipped.append(f"{spec.key}/{name}")
+                else:
+                    todo.append((spec, name, fmt))
+        return todo, skipped
+
+    def run(self) -> IngestResult:
+        start = time.perf_counter()
+        state = self.load_state()
+        todo, skipped = self.pending(state)
+        result = IngestResult(unchanged=skipped)
+        if todo:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {}
+                for spec, name, fmt in todo:
+                    entry = state.get(spec.key, {}).get(name, {})
+                    known = entry.get("sha256") if self._has_output(spec, entry) else None
+                    future = pool.submit(
+                        _ingest_one, spec, os.path.join(self.drop_path(spec), name),
+                        self.table_path(spec), fmt, known, self.batch_rows,
+                    )
+                    futures[future] = (spec, name)
+                for future in as_completed(futures):
+                    spec, name = futures[future]
+                    self._record(state, spec, name, future, result)
+            write_json_atomic(self.state_path, state)
+        result.wall_time_s = time.perf_counter() - start
+        return result
+
+    def _record(self, state, spec: CitySpec, name: str, future, result: IngestResult) -> None:
+        label = f"{spec.key}/{name}"
+        try:
+            entry = future.result()
+        except Exception as exc:  # noqa: BLE001 - one bad drop must not stop the rest
+            log.warning("ingest %s failed: %s", label, exc)
+            result.failed[label] = str(exc)
+            return
+        previous = state.setdefault(spec.key, {}).get(name, {})
+        status = entry.pop("status")
+        if status == "unchanged":
+            previous.update(entry)
+            state[spec.key][name] = previous
+            result.unchanged.append(label)
+            return
+        old = previous.get("output")
+        if old and old != entry["output"]:
+            try:
+                os.remove(os.path.join(self.table_path(spec), old))
+            except FileNotFoundError:
+                pass
+        entry["ingested_at"] = time.time()
+        state[spec.key][name] = entry
+        result.converted[label] = entry["rows"]
+        log.info("ingested %s: %d rows, %d homicides", label, entry["rows"], entry["homicides"])
+
+    def read(self, spark, spec: CitySpec):
+        """The ingested rows of ``spec`` as a DataFrame of the normalized schema."""
+        return spark.read.parquet(self.table_path(spec))
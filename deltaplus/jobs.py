@@ -0,0 +1,39 @@
+"""Counting the Spark jobs triggered by a block of driver code."""
+
+from __future__ import annotations
+
+import uuid
+from typing import List
+
+
+class JobGroup:
+    """Run a block under a fresh Spark job group and record its job ids.
+
+    ::
+
+        with JobGroup(sc, "cell 12") as group:
+            df.collect()
+        group.jobs  # number of Spark jobs the block started
+
+    Job groups are thread-local properties, so concurrent blocks on other
+    threads are not counted.
+    """
+
+    def __init__(self, sc, description: str = ""):
+        self.sc = sc
+        self.description = description
+        self.group_id = f"deltaplus-{uuid.uuid4().hex[:12]}"
+        self.job_ids: List[int] = []
+
+    def __enter__(self) -> "JobGroup":
+        self.sc.setJobGroup(self.group_id, self.description)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.job_ids = sorted(self.sc.statusTracker().getJobIdsForGroup(self.group_id))
+        self.sc.setLocalProperty("spark.jobGroup.id", None)
+        self.sc.setLocalProperty("spark.job.description", None)
+
+    @property
+    def jobs(self) -> int:
+        return len(self.job_ids)
@@ -0,0 +1,311 @@
+"""Partitioned, compacted physical layout of the crime-data lake.
+
+The mount is a flat directory with one Parquet file per city, so every query
+on one month of one city scans the whole city.  :class:`LakeLayout` rewrites
+each city as Hive-style ``year=/month=`` partitions with files close to a
+target size, and records every data file in a manifest.  Readers select files
+from the manifest (partition pruning without touching the file system) and
+pass the recorded schema, so neither directory listing nor footer reads
+happen before the query runs.
+
+Layout under the lake root::
+
+    <root>/<CityKey>/year=<Y>/month=<M>/part-*.parquet
+    <root>/_manifest.json     per city: source digest, schema, files
+                              ([{path, bytes, year, month}, ...])
+
+Source columns named ``year`` or ``month`` (in any case, e.g. Boston's
+``YEAR``/``MONTH``) are replaced by the derived partition columns, which
+hold the same values.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import shutil
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from deltaplus import paths
+from deltaplus.cities import CitySpec, get_cities
+from deltaplus.fingerprints import fingerprint, path_digest
+from deltaplus.fsutil import swap_directory, write_json_atomic
+
+log = logging.getLogger(__name__)
+
+LAYOUT_DIR = "dbfs:/deltaplus/lake"
+MANIFEST_FILE = "_manifest.json"
+STAGING_DIR = "_staging"
+PARTITION_COLUMNS = ("year", "month")
+LAYOUT_FORMAT = 1
+
+DEFAULT_TARGET_FILE_BYTES = 128 << 20
+
+# Partitions with more than one file smaller than this fraction of the
+# target are rewritten by compact().
+SMALL_FILE_FRACTION = 0.5
+
+_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+@dataclass
+class LayoutResult:
+    rewritten: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    # city -> (partitions rewritten, files before, files after)
+    compacted: Dict[str, Tuple[int, int, int]] = field(default_factory=dict)
+    wall_time_s: float = 0.0
+
+
+def _partition_value(raw: str) -> Optional[int]:
+    return None if raw == _NULL_PARTITION else int(raw)
+
+
+def _partition_of(rel: str) -> Tuple[Optional[int], Optional[int]]:
+    """``(year, month)`` from a ``year=Y/month=M/part-*`` relative path."""
+    values = dict(part.split("=", 1) for part in rel.split(os.sep)[:-1] if "=" in part)
+    return _partition_value(values["year"]), _partition_value(values["month"])
+
+
+def _file_entries(city_root: str) -> List[Dict[str, Any]]:
+    entries = []
+    for rel, size, _ in fingerprint(city_root):
+        year, month = _partition_of(rel)
+        entries.append({"path": rel, "bytes": size, "year": year, "month": month})
+    return entries
+
+
+def _matches(value: Optional[int], wanted: Optional[Iterable[int]]) -> bool:
+    return wanted is None or value in wanted
+
+
+class LakeLayout:
+    def __init__(
+        self,
+        spark,
+        root: Optional[str] = None,
+        cities: Optional[List[CitySpec]] = None,
+        target_file_bytes: int = DEFAULT_TARGET_FILE_BYTES,
+    ):
+        self.spark = spark
+        self.root = paths.resolve(root or LAYOUT_DIR)
+        self.cities = cities if cities is not None else get_cities()
+        self.target_file_bytes = target_file_bytes
+
+    def city_path(self, spec: CitySpec) -> str:
+        return os.path.join(self.root, spec.key)
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    def load_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {"format": LAYOUT_FORMAT, "cities": {}}
+
+    def _save_manifest(self, manifest: Dict[str, Any]) -> None:
+        write_json_atomic(self._manifest_path(), manifest)
+
+    def is_stale(self, spec: CitySpec, manifest: Optional[Dict[str, Any]] = None) -> bool:
+        manifest = self.load_manifest() if manifest is None else manifest
+        entry = manifest.get("cities", {}).get(spec.key)
+        if entry is None or not os.path.isdir(self.city_path(spec)):
+            return True
+        if manifest.get("format") != LAYOUT_FORMAT:
+            return True
+        return entry.get("source_digest") != path_digest(spec.local_path)
+
+    def rewrite(self, force: bool = False) -> LayoutResult:
+        """Rewrite every city whose source changed into the partitioned layout."""
+        start = time.perf_counter()
+        result = LayoutResult()
+        manifest = self.load_manifest()
+        if manifest.get("format") != LAYOUT_FORMAT:
+            manifest = {"format": LAYOUT_FORMAT, "cities": {}}
+        for spec in self.cities:
+            if not force and not self.is_stale(spec, manifest):
+                result.unchanged.append(spec.key)
+                continue
+            manifest["cities"][spec.key] = self._rewrite_city(spec)
+            self._save_manifest(manifest)
+            result.rewritten.append(spec.key)
+        result.wall_time_s = time.perf_counter() - start
+        return result
+
+    def _partitioned(self, spec: CitySpec, source=None):
+        """Raw rows of ``spec`` with the derived ``year``/``month`` columns."""
+        from pyspark.sql import functions as F
+
+        source = spec.read(self.spark) if source is None else source
+        kept = [F.col(f"`{c}`") for c in source.columns if c.lower() not in PARTITION_COLUMNS]
+        return source.select(
+            *kept,
+            F.expr(spec.year_expr).cast("int").alias("year"),
+            F.expr(spec.month_expr).cast("int").alias("month"),
+        )
+
+    def _rewrite_city(self, spec: CitySpec) -> Dict[str, Any]:
+        digest = path_digest(spec.local_path)
+        source_bytes = sum(size for _, size, _ in fingerprint(spec.local_path))
+        log.info("rewriting %s into the partitioned layout", spec.name)
+        df = self._partitioned(spec)
+        rows = df.count()
+        # Parquet output is about as dense as the input, so the source's
+        # bytes per row turn the target file size into a row limit.
+        bytes_per_row = max(1.0, source_bytes / max(1, rows))
+        max_records = max(1, int(self.target_file_bytes / bytes_per_row))
+
+        target = self.city_path(spec)
+        staging = target + ".staging"
+        shutil.rmtree(staging, ignore_errors=True)
+        (
+            df.repartition(*PARTITION_COLUMNS)
+            .write.mode("overwrite")
+            .option("maxRecordsPerFile", max_records)
+            .partitionBy(*PARTITION_COLUMNS)
+            .parquet(staging)
+        )
+        files = _file_entries(staging)
+        swap_directory(staging, target)
+        return {
+            "source": spec.path,
+            "source_digest": digest,
+            "schema": df.schema.json(),
+            "rows": rows,
+            "files": files,
+            "built_at": time.time(),
+        }
+
+    def compact(self, small_fraction: float = SMALL_FILE_FRACTION) -> LayoutResult:
+        """Merge partitions that accumulated small files into target-sized files.
+
+        Files are found by listing each city directory, so files appended by
+        other writers are picked up and recorded in the manifest.  New files
+        are written next to the old ones and published in the manifest before
+        the old files are deleted, so manifest readers never miss data.
+        """
+        start = time.perf_counter()
+        result = LayoutResult()
+        manifest = self.load_manifest()
+        small = self.target_file_bytes * small_fraction
+        for spec in self.cities:
+            entry = manifest.get("cities", {}).get(spec.key)
+            if entry is None:
+                continue
+            city_root = self.city_path(spec)
+            by_partition: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            for file in _file_entries(city_root):
+                by_partition[os.path.dirname(file["path"])].append(file)
+            rewritten, before, after, retired = 0, 0, 0, []
+            for partition, files in sorted(by_partition.items()):
+                if sum(1 for f in files if f["bytes"] < small) < 2:
+                    continue
+                written = self._compact_partition(spec, partition, files)
+                rewritten += 1
+                before += len(files)
+                after += len(written)
+                retired += [os.path.join(city_root, f["path"]) for f in files]
+            retired_set = set(retired)
+            entry["files"] = [
+                f for f in _file_entries(city_root)
+                if os.path.join(city_root, f["path"]) not in retired_set
+            ]
+            self._save_manifest(manifest)
+            for path in retired:
+                os.remove(path)
+            if rewritten:
+                result.compacted[spec.key] = (rewritten, before, after)
+            else:
+                result.unchanged.append(spec.key)
+        result.wall_time_s = time.perf_counter() - start
+        return result
+
+    def _compact_partition(self, spec: CitySpec, partition: str, files: List[Dict[str, Any]]) -> List[str]:
+        city_root = self.city_path(spec)
+        total = sum(f["bytes"] for f in files)
+        count = max(1, math.ceil(total / self.target_file_bytes))
+        log.info("compacting %s/%s: %d files -> %d", spec.key, partition, len(files), count)
+        staging = os.path.join(self.root, STAGING_DIR, spec.key, partition)
+        shutil.rmtree(staging, ignore_errors=True)
+        (
+            self.spark.read.parquet(*[os.path.join(city_root, f["path"]) for f in files])
+            .repartition(count)
+            .write.mode("overwrite")
+            .parquet(staging)
+        )
+        prefix = f"compact-{uuid.uuid4().hex[:8]}-"
+        written = []
+        for name in sorted(os.listdir(staging)):
+            if name.startswith("part-"):
+                dest = os.path.join(city_root, partition, prefix + name)
+                os.rename(os.path.join(staging, name), dest)
+                written.append(dest)
+        shutil.rmtree(staging, ignore_errors=True)
+        return written
+
+    def files(
+        self,
+        spec: CitySpec,
+        years: Optional[Iterable[int]] = None,
+        months: Optional[Iterable[int]] = None,
+    ) -> List[str]:
+        """Data files of ``spec`` in the selected partitions, from the manifest."""
+        entry = self.load_manifest().get("cities", {}).get(spec.key)
+        if entry is None:
+            raise FileNotFoundError(f"{spec.key} is not in {self._manifest_path()}; run rewrite() first")
+        years = None if years is None else set(years)
+        months = None if months is None else set(months)
+        return [
+            os.path.join(self.city_path(spec), f["path"])
+            for f in entry["files"]
+            if _matches(f["year"], years) and _matches(f["month"], months)
+        ]
+
+    def read(
+        self,
+        spec: CitySpec,
+        years: Optional[Iterable[int]] = None,
+        months: Optional[Iterable[int]] = None,
+    ):
+        """Rows of ``spec`` (with ``year``/``month``) in the selected partitions.
+
+        The schema comes from the manifest, so Spark neither lists the city
+        directory nor reads footers to plan the scan.
+        """
+        from pyspark.sql.types import StructType
+
+        entry = self.load_manifest()["cities"][spec.key]
+        schema = StructType.fromJson(json.loads(entry["schema"]))
+        selected = self.files(spec, years, months)
+        if not selected:
+            return self.spark.createDataFrame([], schema)
+        return (
+            self.spark.read.schema(schema)
+            .option("basePath", self.city_path(spec))
+            .parquet(*selected)
+        )
+
+    def register_views(self) -> List[str]:
+        """Register ``CrimeData<City>`` and ``Homicides<City>`` over the layout.
+
+        ``CrimeData<City>`` keeps the raw columns plus ``year`` and ``month``,
+        so the lesson's ``Homicides*`` definitions still resolve; filters on
+        ``month`` prune partitions.
+        """
+        names = []
+        for spec in self.cities:
+            source = self.read(spec)
+            source.createOrReplaceTempView(spec.source_view)
+            spec.homicides(self.spark, source).select("month", "offense").createOrReplaceTempView(
+                spec.homicides_view
+            )
+            names += [spec.source_view, spec.homicides_view]
+        return names
@@ -0,0 +1,324 @@
+"""Static performance checks for the ``%sql`` cells of a notebook.
+
+The lesson's SQL is written for a small sample; several of its idioms do not
+survive a real lake and are easy to miss in review.  :func:`lint_notebook`
+reads the ``%sql`` cells (without running anything) and reports:
+
+``non-sargable``
+    a predicate on a function of a column (``lower(offense) LIKE
+    'murder%'``, ``month(date) = 7``): it is evaluated row by row after the
+    scan, so no filter reaches Parquet and no row group can be skipped
+``leading-wildcard``
+    ``LIKE '%...'``: row-group statistics cannot exclude anything
+``unbounded-select``
+    ``SELECT *`` from a view without ``LIMIT``: every row of every column is
+    read to show a screenful
+``unbounded-sort``
+    a top-level ``ORDER BY`` without ``LIMIT`` over ungrouped rows: a full
+    shuffle sort; with a limit Spark keeps a per-partition top-N instead
+``sorted-view``
+    ``ORDER BY`` inside a view definition: every reader sorts again and
+    most throw the order away
+``uncached-reuse``
+    a view derived from other views that later cells read several times
+    without ``CACHE TABLE``: its whole lineage is recomputed for each
+``large-scan``
+    (with ``stats=True``) an unbounded query whose estimated scan, from the
+    lake's file sizes and, with ``pyarrow``, the footer statistics of the
+    columns it uses, exceeds ``max_scan_bytes``
+
+Every finding carries a suggested rewrite.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from deltaplus import paths
+from deltaplus.classroom import created_names
+from deltaplus.dag import identifiers
+from deltaplus.notebook import Cell, Notebook
+from deltaplus.runner import is_query, split_statements
+
+log = logging.getLogger(__name__)
+
+DEFAULT_REUSE_THRESHOLD = 2
+DEFAULT_MAX_SCAN_BYTES = 1 << 30
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_CASE_FUNCTIONS = {"lower", "upper", "trim", "ltrim", "rtrim", "initcap"}
+_DATE_FUNCTIONS = {"month", "year", "dayofmonth", "to_date", "to_timestamp", "date_format"}
+_WRAPPED_RE = re.compile(
+    r"\b(" + "|".join(sorted(_CASE_FUNCTIONS | _DATE_FUNCTIONS | {"cast", "substr", "substring"}))
+    + r")\s*\(\s*`?([A-Za-z_][\w.]*)`?\s*(?:,[^()]*|\s+AS\s+\w+)?\)\s*"
+    r"(=|<>|!=|<=|>=|<|>|(?:NOT\s+)?LIKE\b|(?:NOT\s+)?IN\b|BETWEEN\b)\s*('[^']*')?",
+    re.I,
+)
+_LEADING_WILDCARD_RE = re.compile(r"\bLIKE\s+'%", re.I)
+_SELECT_STAR_RE = re.compile(r"\bSELECT\s+(?:DISTINCT\s+)?\*", re.I)
+_ORDER_BY_RE = re.compile(r"\bORDER\s+BY\b", re.I)
+_LIMIT_RE = re.compile(r"\bLIMIT\b", re.I)
+_GROUP_BY_RE = re.compile(r"\bGROUP\s+BY\b", re.I)
+_VIEW_KINDS = ("views", "global_views")
+_USING_PARQUET_RE = re.compile(
+    r"\bVIEW\s+`?([\w.]+)`?\s+USING\s+parquet\s+OPTIONS\s*\((.*)\)", re.I | re.S
+)
+_PATH_OPTION_RE = re.compile(r"\bpath\s*=?\s*(['\"])(.*?)\1", re.I)
+_PARQUET_REF_RE = re.compile(r"\bparquet\.`([^`]+)`", re.I)
+
+
+@dataclass
+class Finding:
+    notebook: str
+    cell: int
+    line: int
+    rule: str
+    severity: str  # "warning" or "info"
+    message: str
+    suggestion: str
+
+    def format(self) -> str:
+        return (
+            f"{os.path.basename(self.notebook)}:{self.line}: [{self.rule}] {self.message}\n"
+            f"    suggestion: {self.suggestion}"
+        )
+
+
+@dataclass
+class LintReport:
+    findings: List[Finding] = field(default_factory=list)
+
+    @property
+    def warnings(self) -> List[Finding]:
+        return [f for f in self.findings if f.severity == "warning"]
+
+    def to_dict(self) -> List[Dict[str, Any]]:
+        return [asdict(f) for f in self.findings]
+
+    def summary(self) -> str:
+        lines = [f.format() for f in self.findings]
+        lines.append(f"{len(self.findings)} findings ({len(self.warnings)} warnings)")
+        return "\n".join(lines)
+
+
+def _code(statement: str) -> str:
+    """``statement`` without comments and with string literals emptied."""
+    return _STRING_RE.sub("''", _COMMENT_RE.sub(" ", statement))
+
+
+def _top_level(text: str) -> str:
+    """``text`` with everything inside parentheses removed."""
+    out, depth = [], 0
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(0, depth - 1)
+        elif depth == 0:
+            out.append(ch)
+    return "".join(out)
+
+
+def _line(cell: Cell, statement: str) -> int:
+    head = statement.strip()[:60]
+    offset = cell.source.find(head) if head else -1
+    return cell.line + (cell.source.count("\n", 0, offset) if offset > 0 else 0)
+
+
+def _rewrite_hint(function: str, column: str, operator: str, literal: Optional[str]) -> str:
+    function = function.lower()
+    if function in _CASE_FUNCTIONS:
+        condition = f"{function}({column}) {operator.upper()}" + (f" {literal}" if literal else " ...")
+        example = literal.upper() if literal else "'VALUE'"
+        return (
+            f"list the stored values that match with SELECT DISTINCT {column} ... WHERE "
+            f"{condition} and filter on {column} IN (<those values>), so the filter is "
+            f"pushed to Parquet and row groups can be skipped; {column} {operator.upper()} "
+            f"{example} is only equivalent if every value of {column} is stored in that case"
+        )
+    if function in _DATE_FUNCTIONS:
+        return (
+            f"filter {column} on a range (e.g. {column} >= '2016-07-01' AND "
+            f"{column} < '2016-08-01') or on a year/month partition column "
+            f"(python -m deltaplus layout)"
+        )
+    return f"compare {column} with a literal of its own type instead of converting the column"
+
+
+class _Linter:
+    def __init__(self, notebook: Notebook, reuse_threshold: int, stats: bool, max_scan_bytes: int):
+        self.notebook = notebook
+        self.reuse_threshold = reuse_threshold
+        self.stats = stats
+        self.max_scan_bytes = max_scan_bytes
+        self.report = LintReport()
+        # Latest definition of every view, and the files of views over files.
+        self.definitions: Dict[str, str] = {}
+        self.files: Dict[str, str] = {}
+        self.derived: Dict[str, Cell] = {}
+        self.readers: Dict[str, Set[int]] = {}
+        self.cached: Set[str] = set()
+        self.names: Dict[str, str] = {}  # lower-cased -> as written
+
+    def add(self, cell: Cell, statement: str, rule: str, severity: str,
+            message: str, suggestion: str) -> None:
+        self.report.findings.append(Finding(
+            self.notebook.path, cell.index, _line(cell, statement), rule, severity, message, suggestion,
+        ))
+
+    def run(self) -> LintReport:
+        for cell in self.notebook:
+            if cell.kind != "sql":
+                continue
+            for statement in split_statements(cell.source):
+                self.statement(cell, statement)
+        self.reuse()
+        return self.report
+
+    def statement(self, cell: Cell, statement: str) -> None:
+        code = _code(statement)
+        top = _top_level(code)
+        created = created_names(statement)
+        views = []
+        for kind, name in created:
+            if kind in _VIEW_KINDS:
+                views.append(name.lower())
+                self.names[name.lower()] = name
+        reads = {n for n in identifiers(statement) if n in self.definitions} - set(views)
+        for name in reads:
+            self.readers.setdefault(name, set()).add(cell.index)
+        self.cached |= {name.lower() for kind, name in created if kind == "cached"}
+
+        for match in _WRAPPED_RE.finditer(_COMMENT_RE.sub(" ", statement)):
+            function, column, operator, literal = match.groups()
+            self.add(
+                cell, statement, "non-sargable", "warning",
+                f"predicate on {function}({column}) cannot be pushed down to the scan",
+                _rewrite_hint(function, column, operator, literal),
+            )
+        if _LEADING_WILDCARD_RE.search(_COMMENT_RE.sub(" ", statement)):
+            self.add(
+                cell, statement, "leading-wildcard", "info",
+                "LIKE pattern starts with '%'; statistics cannot skip any row group",
+                "anchor the pattern at the start ('value%') if the data allows it",
+            )
+
+        bounded = bool(_LIMIT_RE.search(top))
+        if views:
+            self.define(cell, statement, views, reads, top)
+        elif is_query(statement) and not bounded:
+            if _SELECT_STAR_RE.search(top):
+                self.add(
+                    cell, statement, "unbounded-select", "warning",
+                    "SELECT * without LIMIT reads every row and column",
+                    "add LIMIT (or run with --preview), and select only the columns needed",
+                )
+            if _ORDER_BY_RE.search(top) and not _GROUP_BY_RE.search(top):
+                self.add(
+                    cell, statement, "unbounded-sort", "warning",
+                    "ORDER BY without LIMIT sorts the full result",
+                    "add LIMIT n so Spark keeps a per-partition top-N instead of a global sort",
+                )
+            if self.stats:
+                self.scan_size(cell, statement, reads, code)
+
+    def define(self, cell: Cell, statement: str, views: List[str], reads: Set[str], top: str) -> None:
+        using = _USING_PARQUET_RE.search(statement)
+        option = using and _PATH_OPTION_RE.search(using.group(2))
+        for view in views:
+            self.definitions[view] = statement
+            self.readers[view] = set()
+            self.files.pop(view, None)
+            self.derived.pop(view, None)
+            if option:
+                self.files[view] = paths.resolve(option.group(2))
+            elif reads:
+                self.derived[view] = cell
+        if not option:
+            for ref in _PARQUET_REF_RE.finditer(statement):
+                for view in views:
+                    self.files[view] = paths.resolve(ref.group(1))
+        if _ORDER_BY_RE.search(top) and not _LIMIT_RE.search(top):
+            self.add(
+                cell, statement, "sorted-view", "info",
+                f"view {', '.join(self.names[v] for v in views)} sorts its rows; every reader pays for the sort",
+                "drop ORDER BY from the view and order the final (limited) query instead",
+            )
+
+    def reuse(self) -> None:
+        for view, cell in self.derived.items():
+            readers = self.readers.get(view, set())
+            if len(readers) >= self.reuse_threshold and view not in self.cached:
+                statement, name = self.definitions[view], self.names[view]
+                self.add(
+                    cell, statement, "uncached-reuse", "warning",
+                    f"view {name} is read by {len(readers)} later cells and recomputed each time",
+                    f"CACHE TABLE {name} after defining it (or run with --parallel, "
+                    f"which caches shared views)",
+                )
+
+    def _sources(self, names: Set[str], chain: List[str], seen: Set[str]) -> Set[str]:
+        found = set()
+        for name in names - seen:
+            seen.add(name)
+            if name in self.files:
+                found.add(self.files[name])
+            if name in self.definitions:
+                definition = self.definitions[name]
+                chain.append(definition)
+                inner = {n for n in identifiers(definition) if n in self.definitions}
+                found |= self._sources(inner, chain, seen)
+        return found
+
+    def scan_size(self, cell: Cell, statement: str, reads: Set[str], code: str) -> None:
+        chain = [statement]
+        sources = self._sources(reads, chain, set())
+        if not sources:
+            return
+        star = any(_SELECT_STAR_RE.search(_top_level(_code(s))) for s in chain)
+        columns = set().union(*(identifiers(s) for s in chain))
+        total = files = 0
+        for path in sorted(sources):
+            size, count = _estimate(path, None if star else columns)
+            total += size
+            files += count
+        if total > self.max_scan_bytes:
+            self.add(
+                cell, statement, "large-scan", "warning",
+                f"unbounded query reads ~{total / (1 << 20):.0f} MB from {files} files",
+                "add LIMIT, filter on a partition column or raw column values, "
+                "or query a pre-aggregated table (python -m deltaplus golden)",
+            )
+
+
+def _estimate(path: str, columns: Optional[Set[str]]):
+    """Bytes and files read from ``path`` for ``columns`` (None: all)."""
+    from deltaplus.parquet import data_files, estimate_scan
+
+    if not os.path.exists(path):
+        return 0, 0
+    files = data_files(path)
+    if columns is not None:
+        try:
+            from deltaplus.footers import default_cache
+
+            return estimate_scan(path, sorted(columns), cache=default_cache()).bytes_read, len(files)
+        except ImportError:
+            log.debug("pyarrow not available; estimating %s from file sizes", path)
+    return sum(os.path.getsize(f) for f in files), len(files)
+
+
+def lint_notebook(
+    path: str,
+    *,
+    reuse_threshold: int = DEFAULT_REUSE_THRESHOLD,
+    stats: bool = False,
+    max_scan_bytes: int = DEFAULT_MAX_SCAN_BYTES,
+) -> LintReport:
+    """Lint the ``%sql`` cells of the notebook at ``path``."""
+    return _Linter(Notebook.load(path), reuse_threshold, stats, max_scan_bytes).run()
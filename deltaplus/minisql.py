@@ -0,0 +1,1278 @@
+"""In-process SQL over Parquet files, for queries too small to need Spark.
+
+A lesson's TEST cells count a few hundred thousand rows and group a few
+hundred; planning and scheduling such a query on the JVM costs far more
+than computing it.  :class:`Engine` runs the subset of Spark SQL the
+lessons use directly on the files with ``pyarrow``: scans read only the
+referenced columns, batch by batch, filters and projections are
+``pyarrow.compute`` kernels over whole batches and aggregates are Arrow
+hash aggregates.  Plans without a sort or an aggregate are streamed, so a
+``LIMIT`` stops the scan early.
+
+The dialect:
+
+* ``CREATE [OR REPLACE] TEMP[ORARY] VIEW v USING parquet OPTIONS (path ...)``
+  and ``CREATE ... VIEW v [(columns)] AS <query>``
+* ``SELECT [DISTINCT] ... FROM view | parquet.`path` | (subquery)
+  [WHERE] [GROUP BY] [UNION [ALL] ...] [ORDER BY] [LIMIT]``
+* ``AND OR NOT``, comparisons, ``+ - * /``, ``[NOT] LIKE``, ``[NOT] IN``,
+  ``[NOT] BETWEEN``, ``IS [NOT] NULL``, ``CASE``, ``CAST``
+* ``lower upper trim ltrim rtrim length substring concat coalesce abs
+  month year dayofmonth hour to_timestamp to_date`` and the aggregates
+  ``count [DISTINCT] sum min max avg``
+
+Names are resolved case-insensitively and unaliased columns are named the
+way Spark names them (``count(*)`` is ``count(1)``); ``month()`` and friends
+work in UTC, the runner's session time zone.  Anything else -- joins,
+window functions, ``HAVING``, global temp views, a type Spark would coerce
+but Arrow will not -- raises :class:`UnsupportedSQL`; callers run the
+statement in Spark instead (see :mod:`deltaplus.fastpath`).
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from deltaplus.cities import strptime_format
+from deltaplus.parquet import data_files, require_pyarrow
+
+
+class UnsupportedSQL(Exception):
+    """The statement is outside the in-process dialect; run it in Spark."""
+
+
+# -- syntax tree -------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    qualifier: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Literal:
+    value: Any
+
+
+@dataclass(frozen=True)
+class Star:
+    qualifier: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Call:
+    name: str  # lower case
+    args: Tuple[Any, ...] = ()
+    distinct: bool = False
+    star: bool = False  # count(*)
+
+
+@dataclass(frozen=True)
+class Cast:
+    expr: Any
+    type: str  # upper case
+
+
+@dataclass(frozen=True)
+class Unary:
+    op: str  # "NOT", "-", "IS NULL", "IS NOT NULL"
+    expr: Any
+
+
+@dataclass(frozen=True)
+class Binary:
+    op: str  # "AND", "OR", "LIKE", comparisons, arithmetic
+    left: Any
+    right: Any
+
+
+@dataclass(frozen=True)
+class In:
+    expr: Any
+    values: Tuple[Any, ...]
+    negated: bool = False
+
+
+@dataclass(frozen=True)
+class Between:
+    expr: Any
+    low: Any
+    high: Any
+    negated: bool = False
+
+
+@dataclass(frozen=True)
+class Case:
+    whens: Tuple[Tuple[Any, Any], ...]
+    default: Any = None
+
+
+@dataclass
+class Item:
+    expr: Any
+    alias: Optional[str] = None
+
+
+@dataclass
+class FileSource:
+    path: str
+
+
+@dataclass
+class TableRef:
+    name: str
+
+
+@dataclass
+class Select:
+    items: List[Item]
+    source: Any  # FileSource, TableRef or Query
+    where: Any = None
+    group_by: List[Any] = field(default_factory=list)
+    distinct: bool = False
+
+
+@dataclass
+class OrderKey:
+    expr: Any
+    ascending: bool = True
+    nulls_first: bool = True
+
+
+@dataclass
+class Query:
+    terms: List[Any]  # Select or Query
+    unions: List[str] = field(default_factory=list)  # "ALL" or "DISTINCT" between terms
+    order_by: List[OrderKey] = field(default_factory=list)
+    limit: Optional[int] = None
+
+
+@dataclass
+class CreateView:
+    name: str
+    body: Any  # FileSource or Query
+    columns: Optional[List[str]] = None
+    replace: bool = False
+    if_not_exists: bool = False
+
+
+AGGREGATES = {"count", "sum", "min", "max", "avg", "mean"}
+FUNCTIONS = {
+    "lower", "upper", "trim", "ltrim", "rtrim", "length", "substring", "substr",
+    "concat", "coalesce", "abs", "month", "year", "dayofmonth", "hour",
+    "to_timestamp", "to_date",
+}
+_COMPARISONS = {"=", "<>", "<", "<=", ">", ">="}
+
+
+def render(expr: Any) -> str:
+    """The column name Spark gives an unaliased expression."""
+    if isinstance(expr, Column):
+        return expr.name
+    if isinstance(expr, Literal):
+        if expr.value is None:
+            return "NULL"
+        if isinstance(expr.value, bool):
+            return str(expr.value).lower()
+        return str(expr.value)
+    if isinstance(expr, Star):
+        return "*"
+    if isinstance(expr, Call):
+        if expr.star:
+            return f"{expr.name}(1)"
+        args = ", ".join(render(a) for a in expr.args)
+        return f"{expr.name}({'DISTINCT ' if expr.distinct else ''}{args})"
+    if isinstance(expr, Cast):
+        return f"CAST({render(expr.expr)} AS {expr.type})"
+    if isinstance(expr, Unary):
+        if expr.op.startswith("IS"):
+            return f"({render(expr.expr)} {expr.op})"
+        return f"({expr.op} {render(expr.expr)})"
+    if isinstance(expr, Binary):
+        return f"({render(expr.left)} {expr.op} {render(expr.right)})"
+    if isinstance(expr, In):
+        values = ", ".join(render(v) for v in expr.values)
+        return f"({render(expr.expr)} {'NOT ' if expr.negated else ''}IN ({values}))"
+    if isinstance(expr, Between):
+        low, high, e = render(expr.low), render(expr.high), render(expr.expr)
+        return f"({'NOT ' if expr.negated else ''}(({e} >= {low}) AND ({e} <= {high})))"
+    if isinstance(expr, Case):
+        whens = " ".join(f"WHEN {render(c)} THEN {render(v)}" for c, v in expr.whens)
+        default = "" if expr.default is None else f" ELSE {render(expr.default)}"
+        return f"CASE {whens}{default} END"
+    raise UnsupportedSQL(f"cannot name {expr!r}")
+
+
+def _canonical(expr: Any) -> str:
+    return render(expr).lower()
+
+
+def _children(expr: Any) -> List[Any]:
+    if isinstance(expr, Call):
+        return list(expr.args)
+    if isinstance(expr, (Cast, Unary)):
+        return [expr.expr]
+    if isinstance(expr, Binary):
+        return [expr.left, expr.right]
+    if isinstance(expr, In):
+        return [expr.expr, *expr.values]
+    if isinstance(expr, Between):
+        return [expr.expr, expr.low, expr.high]
+    if isinstance(expr, Case):
+        children = [part for when in expr.whens for part in when]
+        return children + ([expr.default] if expr.default is not None else [])
+    return []
+
+
+def _walk(expr: Any) -> Iterator[Any]:
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(_children(node))
+
+
+def _is_aggregate(expr: Any) -> bool:
+    return isinstance(expr, Call) and expr.name in AGGREGATES
+
+
+def _has_aggregate(expr: Any) -> bool:
+    return any(_is_aggregate(node) for node in _walk(expr))
+
+
+def _column_names(exprs: Sequence[Any]) -> Set[str]:
+    return {n.name.lower() for e in exprs if e is not None for n in _walk(e) if isinstance(n, Column)}
+
+
+# -- parser ------------------------------------------------------------------
+
+_TOKEN_RE = re.compile(
+    r"""
+      (?P<space>\s+|--[^\n]*|/\*.*?\*/)
+    | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    | (?P<quoted>`(?:[^`]|``)*`)
+    | (?P<number>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?)
+    | (?P<name>[A-Za-z_]\w*)
+    | (?P<op><=|>=|<>|!=|==|[=<>(),.*;+\-/])
+    """,
+    re.S | re.X,
+)
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "0": "\0", "Z": "\x1a"}
+_RESERVED = {
+    "ALL", "AND", "AS", "ASC", "BETWEEN", "BY", "CASE", "CAST", "CROSS", "DESC", "DISTINCT",
+    "ELSE", "END", "EXCEPT", "EXISTS", "FALSE", "FROM", "FULL", "GROUP", "HAVING", "IN",
+    "INNER", "INTERSECT", "INTERVAL", "IS", "JOIN", "LATERAL", "LEFT", "LIKE", "LIMIT", "MINUS",
+    "NATURAL", "NOT", "NULL", "NULLS", "ON", "OR", "ORDER", "OUTER", "OVER", "RIGHT", "RLIKE",
+    "SELECT", "THEN", "TRUE", "UNION", "USING", "WHEN", "WHERE", "WINDOW", "WITH",
+}
+
+
+@dataclass(frozen=True)
+class _Token:
+    kind: str  # "string", "quoted", "number", "name" or "op"
+    text: str
+    value: Any
+
+
+def _unescape(body: str) -> str:
+    out, i = [], 0
+    while i < len(body):
+        ch = body[i]
+        if ch == "\\" and i + 1 < len(body):
+            nxt = body[i + 1]
+            # Spark keeps LIKE escapes as written.
+            out.append("\\" + nxt if nxt in "%_" else _ESCAPES.get(nxt, nxt))
+            i += 2
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def tokenize(text: str) -> List[_Token]:
+    tokens, pos = [], 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise UnsupportedSQL(f"unexpected character {text[pos]!r}")
+        kind, value = match.lastgroup, match.group()
+        pos = match.end()
+        if kind == "space":
+            continue
+        if kind == "string":
+            tokens.append(_Token(kind, value, _unescape(value[1:-1])))
+        elif kind == "quoted":
+            tokens.append(_Token(kind, value, value[1:-1].replace("``", "`")))
+        elif kind == "number":
+            number = float(value) if any(c in value for c in ".eE") else int(value)
+            tokens.append(_Token(kind, value, number))
+        else:
+            tokens.append(_Token(kind, value, value))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    # token helpers
+
+    def peek(self, offset: int = 0) -> Optional[_Token]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self) -> _Token:
+        token = self.peek()
+        if token is None:
+            raise UnsupportedSQL("unexpected end of statement")
+        self.pos += 1
+        return token
+
+    def at_keyword(self, *words: str) -> bool:
+        for offset, word in enumerate(words):
+            token = self.peek(offset)
+            if token is None or token.kind != "name" or token.text.upper() != word:
+                return False
+        return True
+
+    def keyword(self, *words: str) -> bool:
+        if self.at_keyword(*words):
+            self.pos += len(words)
+            return True
+        return False
+
+    def expect_keyword(self, *words: str) -> None:
+        if not self.keyword(*words):
+            raise UnsupportedSQL(f"expected {' '.join(words)} at {self._where()}")
+
+    def op(self, symbol: str) -> bool:
+        token = self.peek()
+        if token is not None and token.kind == "op" and token.text == symbol:
+            self.pos += 1
+            return True
+        return False
+
+    def expect_op(self, symbol: str) -> None:
+        if not self.op(symbol):
+            raise UnsupportedSQL(f"expected {symbol!r} at {self._where()}")
+
+    def _where(self) -> str:
+        token = self.peek()
+        return "end of statement" if token is None else repr(token.text)
+
+    def identifier(self) -> str:
+        token = self.next()
+        if token.kind == "quoted" or (token.kind == "name" and token.text.upper() not in _RESERVED):
+            return token.value
+        raise UnsupportedSQL(f"unexpected {token.text!r}")
+
+    def alias(self) -> Optional[str]:
+        if self.keyword("AS"):
+            return self.identifier()
+        token = self.peek()
+        if token is not None and (
+            token.kind == "quoted" or (token.kind == "name" and token.text.upper() not in _RESERVED)
+        ):
+            self.pos += 1
+            return token.value
+        return None
+
+    # statements
+
+    def statement(self) -> Union[CreateView, Query]:
+        node = self.create_view() if self.keyword("CREATE") else self.query()
+        self.op(";")
+        if self.peek() is not None:
+            raise UnsupportedSQL(f"unexpected {self._where()}")
+        return node
+
+    def create_view(self) -> CreateView:
+        replace = self.keyword("OR", "REPLACE")
+        if self.at_keyword("GLOBAL"):
+            raise UnsupportedSQL("global temporary views")
+        if not (self.keyword("TEMPORARY") or self.keyword("TEMP")):
+            raise UnsupportedSQL("only temporary views")
+        self.expect_keyword("VIEW")
+        if_not_exists = self.keyword("IF", "NOT", "EXISTS")
+        name = self.identifier()
+        if self.op("."):
+            raise UnsupportedSQL("qualified view names")
+        columns = self.column_list() if self.op("(") else None
+        if self.keyword("USING"):
+            if self.identifier().lower() != "parquet":
+                raise UnsupportedSQL("only parquet data sources")
+            # A column list here is the file's schema (see deltaplus.footers).
+            return CreateView(name, FileSource(self.path_option()), None, replace, if_not_exists)
+        self.expect_keyword("AS")
+        return CreateView(name, self.query(), columns, replace, if_not_exists)
+
+    def column_list(self) -> List[str]:
+        """Names of a ``(name [type] [COMMENT ...], ...)`` list; ``(`` is consumed."""
+        names, depth, start = [], 1, True
+        while depth:
+            token = self.next()
+            if token.kind == "op" and token.text in "()":
+                depth += 1 if token.text == "(" else -1
+            elif depth == 1 and token.kind == "op" and token.text == ",":
+                start = True
+            elif start and depth == 1:
+                names.append(token.value)
+                start = False
+        return names
+
+    def path_option(self) -> str:
+        self.expect_keyword("OPTIONS")
+        self.expect_op("(")
+        path = None
+        while True:
+            key = self.next()
+            self.op("=")
+            value = self.next()
+            if str(key.value).lower() != "path" or value.kind != "string":
+                raise UnsupportedSQL(f"data source option {key.text}")
+            path = value.value
+            if not self.op(","):
+                break
+        self.expect_op(")")
+        return path
+
+    def query(self) -> Query:
+        query = Query([self.query_term()])
+        while self.keyword("UNION"):
+            if self.keyword("ALL"):
+                query.unions.append("ALL")
+            else:
+                self.keyword("DISTINCT")
+                query.unions.append("DISTINCT")
+            query.terms.append(self.query_term())
+        if self.keyword("ORDER", "BY"):
+            query.order_by.append(self.order_key())
+            while self.op(","):
+                query.order_by.append(self.order_key())
+        if self.keyword("LIMIT"):
+            token = self.next()
+            if token.kind != "number" or not isinstance(token.value, int):
+                raise UnsupportedSQL(f"LIMIT {token.text}")
+            query.limit = token.value
+        return query
+
+    def query_term(self) -> Union[Select, Query]:
+        if self.op("("):
+            query = self.query()
+            self.expect_op(")")
+            return query
+        self.expect_keyword("SELECT")
+        return self.select()
+
+    def select(self) -> Select:
+        distinct = self.keyword("DISTINCT")
+        if not distinct:
+            self.keyword("ALL")
+        items = [self.item()]
+        while self.op(","):
+            items.append(self.item())
+        if not self.keyword("FROM"):
+            raise UnsupportedSQL("SELECT without FROM")
+        select = Select(items, self.source(), distinct=distinct)
+        self.alias()
+        if self.op(",") or self.at_keyword("JOIN") or self.at_keyword("NATURAL") or any(
+            self.at_keyword(kind, "JOIN") or self.at_keyword(kind, "OUTER")
+            for kind in ("INNER", "LEFT", "RIGHT", "FULL", "CROSS")
+        ):
+            raise UnsupportedSQL("joins")
+        if self.keyword("WHERE"):
+            select.where = self.expr()
+        if self.keyword("GROUP", "BY"):
+            select.group_by.append(self.expr())
+            while self.op(","):
+                select.group_by.append(self.expr())
+        if self.at_keyword("HAVING"):
+            raise UnsupportedSQL("HAVING")
+        return select
+
+    def source(self) -> Any:
+        if self.op("("):
+            query = self.query()
+            self.expect_op(")")
+            return query
+        name = self.identifier()
+        if not self.op("."):
+            return TableRef(name)
+        token = self.next()
+        if name.lower() == "parquet" and token.kind == "quoted":
+            return FileSource(token.value)
+        raise UnsupportedSQL(f"{name}.{token.value}: only temporary views and parquet files")
+
+    def item(self) -> Item:
+        if self.op("*"):
+            return Item(Star())
+        token, dot, star = self.peek(), self.peek(1), self.peek(2)
+        if (
+            token is not None and token.kind in ("name", "quoted")
+            and dot is not None and dot.text == "." and star is not None and star.text == "*"
+        ):
+            self.pos += 3
+            return Item(Star(token.value))
+        expr = self.expr()
+        return Item(expr, self.alias())
+
+    def order_key(self) -> OrderKey:
+        expr = self.expr()
+        ascending = not self.keyword("DESC")
+        if ascending:
+            self.keyword("ASC")
+        nulls_first = ascending
+        if self.keyword("NULLS"):
+            if self.keyword("FIRST"):
+                nulls_first = True
+            else:
+                self.expect_keyword("LAST")
+                nulls_first = False
+        return OrderKey(expr, ascending, nulls_first)
+
+    # expressions, loosest binding first
+
+    def expr(self) -> Any:
+        left = self.conjunction()
+        while self.keyword("OR"):
+            left = Binary("OR", left, self.conjunction())
+        return left
+
+    def conjunction(self) -> Any:
+        left = self.negation()
+        while self.keyword("AND"):
+            left = Binary("AND", left, self.negation())
+        return left
+
+    def negation(self) -> Any:
+        if self.keyword("NOT"):
+            return Unary("NOT", self.negation())
+        return self.predicate()
+
+    def predicate(self) -> Any:
+        left = self.additive()
+        while True:
+            token = self.peek()
+            if token is not None and token.kind == "op" and token.text in ("=", "==", "<>", "!=", "<", "<=", ">", ">="):
+                self.pos += 1
+                op = {"==": "=", "!=": "<>"}.get(token.text, token.text)
+                left = Binary(op, left, self.additive())
+                continue
+            negated = any(self.at_keyword("NOT", word) for word in ("LIKE", "IN", "BETWEEN"))
+            if negated:
+                self.pos += 1
+            if self.keyword("LIKE"):
+                left = Binary("LIKE", left, self.additive())
+                if self.at_keyword("ESCAPE"):
+                    raise UnsupportedSQL("LIKE ... ESCAPE")
+                left = Unary("NOT", left) if negated else left
+            elif self.keyword("IN"):
+                self.expect_op("(")
+                if self.at_keyword("SELECT"):
+                    raise UnsupportedSQL("IN (subquery)")
+                values = [self.expr()]
+                while self.op(","):
+                    values.append(self.expr())
+                self.expect_op(")")
+                left = In(left, tuple(values), negated)
+            elif self.keyword("BETWEEN"):
+                low = self.additive()
+                self.expect_keyword("AND")
+                left = Between(left, low, self.additive(), negated)
+            elif self.keyword("IS"):
+                negated = self.keyword("NOT")
+                self.expect_keyword("NULL")
+                left = Unary("IS NOT NULL" if negated else "IS NULL", left)
+            else:
+                return left
+
+    def additive(self) -> Any:
+        left = self.multiplicative()
+        while True:
+            if self.op("+"):
+                left = Binary("+", left, self.multiplicative())
+            elif self.op("-"):
+                left = Binary("-", left, self.multiplicative())
+            else:
+                return left
+
+    def multiplicative(self) -> Any:
+        left = self.unary()
+        while True:
+            if self.op("*"):
+                left = Binary("*", left, self.unary())
+            elif self.op("/"):
+                left = Binary("/", left, self.unary())
+            else:
+                return left
+
+    def unary(self) -> Any:
+        if self.op("-"):
+            operand = self.unary()
+            if isinstance(operand, Literal) and isinstance(operand.value, (int, float)):
+                return Literal(-operand.value)
+            return Unary("-", operand)
+        if self.op("+"):
+            return self.unary()
+        return self.primary()
+
+    def primary(self) -> Any:
+        token = self.next()
+        if token.kind in ("string", "number"):
+            return Literal(token.value)
+        if token.kind == "op":
+            if token.text != "(":
+                raise UnsupportedSQL(f"unexpected {token.text!r}")
+            if self.at_keyword("SELECT"):
+                raise UnsupportedSQL("scalar subqueries")
+            expr = self.expr()
+            self.expect_op(")")
+            return expr
+        word = token.text.upper() if token.kind == "name" else None
+        if word == "NULL":
+            return Literal(None)
+        if word in ("TRUE", "FALSE"):
+            return Literal(word == "TRUE")
+        if word == "CASE":
+            return self.case()
+        if word == "CAST":
+            return self.cast()
+        if word in _RESERVED:
+            raise UnsupportedSQL(f"unexpected {token.text!r}")
+        if token.kind == "name" and self.op("("):
+            return self.call(token.value)
+        if self.op("."):
+            return Column(self.identifier(), qualifier=token.value)
+        nxt = self.peek()
+        if word in ("DATE", "TIMESTAMP", "INTERVAL") and nxt is not None and nxt.kind == "string":
+            raise UnsupportedSQL(f"{word} literals")
+        return Column(token.value)
+
+    def call(self, name: str) -> Call:
+        fname = name.lower()
+        if self.op("*"):
+            self.expect_op(")")
+            if fname != "count":
+                raise UnsupportedSQL(f"{name}(*)")
+            node = Call("count", star=True)
+        else:
+            distinct = self.keyword("DISTINCT")
+            args = []
+            if not self.op(")"):
+                args.append(self.expr())
+                while self.op(","):
+                    args.append(self.expr())
+                self.expect_op(")")
+            node = Call(fname, tuple(args), distinct)
+        if self.at_keyword("OVER") or self.at_keyword("FILTER"):
+            raise UnsupportedSQL("window and filtered aggregates")
+        if fname not in FUNCTIONS and fname not in AGGREGATES:
+            raise UnsupportedSQL(f"function {name}")
+        return node
+
+    def case(self) -> Case:
+        operand = None if self.at_keyword("WHEN") else self.expr()
+        whens = []
+        while self.keyword("WHEN"):
+            condition = self.expr()
+            if operand is not None:
+                condition = Binary("=", operand, condition)
+            self.expect_keyword("THEN")
+            whens.append((condition, self.expr()))
+        default = self.expr() if self.keyword("ELSE") else None
+        self.expect_keyword("END")
+        if not whens:
+            raise UnsupportedSQL("CASE without WHEN")
+        return Case(tuple(whens), default)
+
+    def cast(self) -> Cast:
+        self.expect_op("(")
+        expr = self.expr()
+        self.expect_keyword("AS")
+        type_name = self.identifier().upper()
+        if self.op("("):
+            raise UnsupportedSQL(f"CAST AS {type_name}(...)")
+        self.expect_op(")")
+        return Cast(expr, type_name)
+
+
+def parse(text: str) -> Union[CreateView, Query]:
+    """Parse one statement, or raise :class:`UnsupportedSQL`."""
+    return _Parser(text).statement()
+
+
+# -- execution ---------------------------------------------------------------
+
+
+@dataclass
+class _View:
+    name: str
+    body: Any  # FileSource or Query
+    columns: Optional[List[str]] = None
+
+
+def _arrow():
+    require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    return pa, pc, ds
+
+
+def _cast_type(pa, name: str):
+    types = {
+        "TINYINT": pa.int8(), "BYTE": pa.int8(), "SMALLINT": pa.int16(), "SHORT": pa.int16(),
+        "INT": pa.int32(), "INTEGER": pa.int32(), "BIGINT": pa.int64(), "LONG": pa.int64(),
+        "FLOAT": pa.float32(), "REAL": pa.float32(), "DOUBLE": pa.float64(),
+        "STRING": pa.string(), "BOOLEAN": pa.bool_(), "DATE": pa.date32(),
+        "TIMESTAMP": pa.timestamp("us"),
+    }
+    if name not in types:
+        raise UnsupportedSQL(f"CAST AS {name}")
+    return types[name]
+
+
+class Engine:
+    """Temporary views and queries over Parquet files, run with ``pyarrow``."""
+
+    def __init__(self):
+        self.pa, self.pc, self.ds = _arrow()
+        self.views: Dict[str, _View] = {}
+
+    # catalog
+
+    def define(self, statement: CreateView) -> bool:
+        """Register a view; False if ``IF NOT EXISTS`` kept an existing one."""
+        key = statement.name.lower()
+        if key in self.views and statement.if_not_exists:
+            return False
+        if key in self.views and not statement.replace:
+            raise UnsupportedSQL(f"view {statement.name} already exists")
+        if isinstance(statement.body, Query) and key in self._referenced_views(statement.body):
+            raise UnsupportedSQL(f"recursive view {statement.name}")
+        # Resolves every referenced view, as Spark does when creating one.
+        self.input_files(statement.body)
+        self.views[key] = _View(statement.name, statement.body, statement.columns)
+        return True
+
+    def drop(self, name: str) -> bool:
+        return self.views.pop(name.lower(), None) is not None
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self.views
+
+    def _view(self, name: str) -> _View:
+        try:
+            return self.views[name.lower()]
+        except KeyError:
+            raise UnsupportedSQL(f"unknown view {name}") from None
+
+    def _referenced_views(self, node: Any) -> Set[str]:
+        found: Set[str] = set()
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, TableRef):
+                found.add(node.name.lower())
+                view = self.views.get(node.name.lower())
+                if view is not None:
+                    stack.append(view.body)
+            elif isinstance(node, Query):
+                stack.extend(node.terms)
+            elif isinstance(node, Select):
+                stack.append(node.source)
+        return found
+
+    def input_files(self, node: Any) -> List[str]:
+        """Data files ``node`` reads; raises for views the engine does not hold."""
+        if isinstance(node, FileSource):
+            return data_files(node.path) if os.path.exists(node.path) else []
+        if isinstance(node, TableRef):
+            return self.input_files(self._view(node.name).body)
+        if isinstance(node, Query):
+            return [f for term in node.terms for f in self.input_files(term)]
+        if isinstance(node, Select):
+            return self.input_files(node.source)
+        if isinstance(node, CreateView):
+            return self.input_files(node.body)
+        raise UnsupportedSQL(f"cannot read {node!r}")
+
+    def input_bytes(self, node: Any) -> int:
+        return sum(os.path.getsize(f) for f in set(self.input_files(node)))
+
+    # queries
+
+    def execute(self, query: Query, limit: Optional[int] = None):
+        """Run ``query`` (at most ``limit`` rows) into a ``pyarrow.Table``."""
+        chunks = list(self._limit(self._query(query), limit))
+        return chunks[0] if len(chunks) == 1 else self.pa.concat_tables(chunks)
+
+    # Every stream yields at least one, possibly empty, chunk, so the
+    # result schema is known even when no rows qualify.
+
+    def _stream(self, node: Any, columns: Optional[Set[str]] = None) -> Iterator[Any]:
+        if isinstance(node, FileSource):
+            yield from self._scan(node.path, columns)
+        elif isinstance(node, TableRef):
+            view = self._view(node.name)
+            pruned = columns if isinstance(view.body, FileSource) else None
+            for chunk in self._stream(view.body, pruned):
+                if view.columns is not None:
+                    if len(view.columns) != chunk.num_columns:
+                        raise UnsupportedSQL(f"column list of view {view.name}")
+                    chunk = chunk.rename_columns(view.columns)
+                yield chunk
+        elif isinstance(node, Query):
+            yield from self._query(node)
+        elif isinstance(node, Select):
+            yield from self._select(node)
+        else:
+            raise UnsupportedSQL(f"cannot read {node!r}")
+
+    def _scan(self, path: str, columns: Optional[Set[str]]) -> Iterator[Any]:
+        dataset = self.ds.dataset(path, format="parquet", partitioning="hive")
+        names = None
+        if columns is not None:
+            names = [n for n in dataset.schema.names if n.lower() in columns]
+        empty = True
+        for batch in dataset.to_batches(columns=names):
+            empty = False
+            yield self.pa.Table.from_batches([batch])
+        if empty:
+            table = dataset.schema.empty_table()
+            yield table if names is None else table.select(names)
+
+    def _query(self, query: Query) -> Iterator[Any]:
+        if len(query.terms) == 1:
+            stream = self._stream(query.terms[0])
+        else:
+            stream = self._union(query)
+        if query.order_by:
+            stream = iter([self._sort(self._collect(stream), query)])
+        yield from self._limit(stream, query.limit)
+
+    def _limit(self, stream: Iterator[Any], limit: Optional[int]) -> Iterator[Any]:
+        if limit is None:
+            yield from stream
+            return
+        for chunk in stream:
+            if chunk.num_rows >= limit:
+                yield chunk.slice(0, limit)
+                return
+            yield chunk
+            limit -= chunk.num_rows
+
+    def _collect(self, stream: Iterator[Any]):
+        chunks = list(stream)
+        return chunks[0] if len(chunks) == 1 else self.pa.concat_tables(chunks)
+
+    def _union(self, query: Query) -> Iterator[Any]:
+        if len(set(query.unions)) > 1:
+            raise UnsupportedSQL("mixed UNION and UNION ALL")
+        streams = [self._stream(term) for term in query.terms]
+        # Spark unions by position, named after the first branch and widened
+        # to a common type; the first chunk of every branch gives the schema.
+        firsts = [next(stream) for stream in streams]
+        names = firsts[0].column_names
+        if any(chunk.num_columns != len(names) for chunk in firsts):
+            raise UnsupportedSQL("UNION branches with different column counts")
+        types = [self._common_type([chunk.schema.types[i] for chunk in firsts]) for i in range(len(names))]
+
+        def conformed() -> Iterator[Any]:
+            for first, stream in zip(firsts, streams):
+                for chunk in _chain(first, stream):
+                    arrays = [
+                        column if column.type == typ else self.pc.cast(column, typ)
+                        for column, typ in zip(chunk.columns, types)
+                    ]
+                    yield self.pa.Table.from_arrays(arrays, names=names)
+
+        if query.unions[0] == "ALL":
+            yield from conformed()
+        else:
+            yield self._distinct(self._collect(conformed()))
+
+    def _common_type(self, types: List[Any]):
+        pa = self.pa
+        known = [t for t in types if not pa.types.is_null(t)]
+        if not known:
+            return types[0]
+        if all(t == known[0] for t in known):
+            return known[0]
+        if all(pa.types.is_integer(t) for t in known):
+            return pa.int64()
+        if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in known):
+            return pa.float64()
+        if all(pa.types.is_string(t) or pa.types.is_large_string(t) for t in known):
+            return pa.large_string()
+        raise UnsupportedSQL(f"UNION of {', '.join(map(str, known))}")
+
+    def _select(self, select: Select) -> Iterator[Any]:
+        if any(isinstance(item.expr, Star) for item in select.items):
+            needed = None
+        else:
+            needed = _column_names([i.expr for i in select.items] + [select.where] + select.group_by)
+        stream = self._stream(select.source, needed)
+        if select.where is not None:
+            stream = (self._filter(chunk, select.where) for chunk in stream)
+        if select.group_by or any(_has_aggregate(item.expr) for item in select.items):
+            yield self._aggregate(select, self._collect(stream))
+        elif select.distinct:
+            yield self._distinct(self._collect(self._project(chunk, select.items) for chunk in stream))
+        else:
+            for chunk in stream:
+                yield self._project(chunk, select.items)
+
+    def _filter(self, chunk, condition):
+        mask = self._eval(condition, chunk)
+        if isinstance(mask, self.pa.Scalar):
+            return chunk if mask.as_py() is True else chunk.slice(0, 0)
+        if not self.pa.types.is_boolean(mask.type):
+            raise UnsupportedSQL(f"non-boolean filter {render(condition)}")
+        return chunk.filter(mask)
+
+    def _project(self, chunk, items: List[Item]):
+        arrays, names = [], []
+        for item in items:
+            if isinstance(item.expr, Star):
+                arrays += chunk.columns
+                names += chunk.column_names
+                continue
+            arrays.append(self._array(self._eval(item.expr, chunk), chunk.num_rows))
+            names.append(item.alias or self._name(item.expr, chunk))
+        return self.pa.Table.from_arrays(arrays, names=names)
+
+    def _name(self, expr: Any, table) -> str:
+        if isinstance(expr, Column):
+            return table.column_names[self._resolve(table, expr.name)]
+        return render(expr)
+
+    def _distinct(self, table):
+        names = table.column_names
+        work = table.rename_columns([f"c{i}" for i in range(len(names))])
+        unique = work.group_by(work.column_names).aggregate([])
+        return unique.select(work.column_names).rename_columns(names)
+
+    def _group_key(self, key: Any, select: Select, table) -> Any:
+        if isinstance(key, Literal) and isinstance(key.value, int) and not isinstance(key.value, bool):
+            if not 1 <= key.value <= len(select.items) or isinstance(select.items[key.value - 1].expr, Star):
+                raise UnsupportedSQL(f"GROUP BY position {key.value}")
+            return select.items[key.value - 1].expr
+        if isinstance(key, Column) and not self._has_column(table, key.name):
+            # Spark also groups by select-list aliases.
+            for item in select.items:
+                if item.alias and item.alias.lower() == key.name.lower():
+                    return item.expr
+        return key
+
+    def _aggregate(self, select: Select, table):
+        pa = self.pa
+        keys = [self._group_key(k, select, table) for k in select.group_by]
+        key_arrays = [self._array(self._eval(k, table), table.num_rows) for k in keys]
+        canonical_keys = [_canonical(k) for k in keys]
+        outputs: List[Tuple[str, int]] = []  # ("key", index) or ("agg", index)
+        aggregates: List[Tuple[str, Any]] = []  # (arrow function, argument array)
+        names = []
+        for item in select.items:
+            expr = item.expr
+            if isinstance(expr, Star):
+                raise UnsupportedSQL("SELECT * with GROUP BY")
+            if _is_aggregate(expr):
+                if any(_has_aggregate(a) for a in expr.args):
+                    raise UnsupportedSQL("nested aggregates")
+                outputs.append(("agg", len(aggregates)))
+                aggregates.append(self._aggregate_input(expr, table))
+            elif _has_aggregate(expr):
+                raise UnsupportedSQL(f"expression over aggregates: {render(expr)}")
+            elif _canonical(expr) in canonical_keys:
+                outputs.append(("key", canonical_keys.index(_canonical(expr))))
+            else:
+                raise UnsupportedSQL(f"{render(expr)} is neither grouped nor aggregated")
+            names.append(item.alias or self._name(expr, table))
+
+        if keys:
+            work = {f"k{i}": array for i, array in enumerate(key_arrays)}
+            specs = []
+            for j, (function, argument) in enumerate(aggregates):
+                work[f"v{j}"] = key_arrays[0] if argument is None else argument
+                specs.append((f"v{j}", *self._hash_function(function)))
+            grouped = pa.table(work).group_by([f"k{i}" for i in range(len(keys))]).aggregate(specs)
+            columns = {
+                ("key", i): grouped.column(f"k{i}") for i in range(len(keys))
+            }
+            for j, spec in enumerate(specs):
+                columns[("agg", j)] = grouped.column(f"v{j}_{spec[1]}")
+            return pa.Table.from_arrays([columns[o] for o in outputs], names=names)
+
+        values = [self._scalar_aggregate(function, argument, table.num_rows) for function, argument in aggregates]
+        return pa.Table.from_arrays(
+            [pa.array([values[i].as_py()], type=values[i].type) for _, i in outputs], names=names
+        )
+
+    def _aggregate_input(self, call: Call, table) -> Tuple[str, Any]:
+        if call.star or (
+            call.name == "count" and len(call.args) == 1 and not call.distinct
+            and isinstance(call.args[0], Literal) and call.args[0].value is not None
+        ):
+            return "count_all", None
+        if len(call.args) != 1:
+            raise UnsupportedSQL(f"{call.name} of {len(call.args)} arguments")
+        if call.distinct and call.name != "count":
+            raise UnsupportedSQL(f"{call.name}(DISTINCT ...)")
+        argument = self._array(self._eval(call.args[0], table), table.num_rows)
+        if call.distinct:
+            return "count_distinct", argument
+        return {"avg": "mean"}.get(call.name, call.name), argument
+
+    def _hash_function(self, function: str) -> Tuple[str, ...]:
+        pc = self.pc
+        if function == "count_all":
+            return "count", pc.CountOptions(mode="all")
+        if function in ("count", "count_distinct"):
+            return function, pc.CountOptions(mode="only_valid")
+        return (function,)
+
+    def _scalar_aggregate(self, function: str, argument, rows: int):
+        pa, pc = self.pa, self.pc
+        if function == "count_all":
+            return pa.scalar(rows, pa.int64())
+        if function in ("count", "count_distinct"):
+            return getattr(pc, function)(argument, mode="only_valid").cast(pa.int64())
+        return getattr(pc, function)(argument)
+
+    def _sort(self, table, query: Query):
+        pa, pc = self.pa, self.pc
+        work, sort_keys = {}, []
+        for i, key in enumerate(query.order_by):
+            values = self._order_values(key.expr, table, query)
+            # Arrow places nulls once for all keys; a leading null flag per
+            # key gives every key its own NULLS FIRST / LAST.
+            work[f"n{i}"] = pc.is_null(values)
+            work[f"k{i}"] = values
+            sort_keys += [
+                (f"n{i}", "descending" if key.nulls_first else "ascending"),
+                (f"k{i}", "ascending" if key.ascending else "descending"),
+            ]
+        indices = pc.sort_indices(pa.table(work), sort_keys=sort_keys)
+        return table.take(indices)
+
+    def _order_values(self, expr: Any, table, query: Query):
+        if isinstance(expr, Literal) and isinstance(expr.value, int) and not isinstance(expr.value, bool):
+            if not 1 <= expr.value <= table.num_columns:
+                raise UnsupportedSQL(f"ORDER BY position {expr.value}")
+            return table.column(expr.value - 1)
+        try:
+            return self._array(self._eval(expr, table), table.num_rows)
+        except UnsupportedSQL:
+            # ``ORDER BY count(*)`` names a select item by its expression.
+            select = query.terms[0] if len(query.terms) == 1 else None
+            if not isinstance(select, Select) or any(isinstance(i.expr, Star) for i in select.items):
+                raise
+            for position, item in enumerate(select.items):
+                if _canonical(item.expr) == _canonical(expr):
+                    return table.column(position)
+            raise
+
+    # expressions
+
+    def _has_column(self, table, name: str) -> bool:
+        return any(n.lower() == name.lower() for n in table.column_names)
+
+    def _resolve(self, table, name: str) -> int:
+        matches = [i for i, n in enumerate(table.column_names) if n.lower() == name.lower()]
+        if len(matches) != 1:
+            raise UnsupportedSQL(f"{'ambiguous' if matches else 'unknown'} column {name}")
+        return matches[0]
+
+    def _array(self, value, rows: int):
+        if isinstance(value, self.pa.Scalar):
+            if self.pa.types.is_null(value.type):
+                return self.pa.nulls(rows)
+            return self.pa.repeat(value, rows)
+        return value
+
+    def _eval(self, expr: Any, table):
+        pa, pc = self.pa, self.pc
+        if isinstance(expr, Column):
+            return table.column(self._resolve(table, expr.name))
+        if isinstance(expr, Literal):
+            return pa.scalar(expr.value)
+        if isinstance(expr, Call):
+            if expr.name in AGGREGATES:
+                raise UnsupportedSQL(f"aggregate {render(expr)} outside an aggregation")
+            return self._call(expr, [self._eval(a, table) for a in expr.args])
+        if isinstance(expr, Cast):
+            value = self._eval(expr.expr, table)
+            target = _cast_type(pa, expr.type)
+            # Spark truncates fractions when casting to an integer type.
+            safe = not (pa.types.is_floating(value.type) and pa.types.is_integer(target))
+            return pc.cast(value, target, safe=safe)
+        if isinstance(expr, Unary):
+            value = self._eval(expr.expr, table)
+            if expr.op == "NOT":
+                return pc.invert(value)
+            if expr.op == "-":
+                return pc.negate(value)
+            return pc.is_null(value) if expr.op == "IS NULL" else pc.is_valid(value)
+        if isinstance(expr, Binary):
+            return self._binary(expr, table)
+        if isinstance(expr, In):
+            if not all(isinstance(v, Literal) and v.value is not None for v in expr.values):
+                raise UnsupportedSQL("IN with non-literal or NULL values")
+            value = self._eval(expr.expr, table)
+            found = pc.is_in(value, value_set=pa.array([v.value for v in expr.values], type=value.type))
+            # SQL: NULL IN (...) is NULL, not false.
+            found = pc.if_else(pc.is_valid(value), found, pa.scalar(None, pa.bool_()))
+            return pc.invert(found) if expr.negated else found
+        if isinstance(expr, Between):
+            value = self._eval(expr.expr, table)
+            inside = pc.and_kleene(
+                pc.greater_equal(value, self._eval(expr.low, table)),
+                pc.less_equal(value, self._eval(expr.high, table)),
+            )
+            return pc.invert(inside) if expr.negated else inside
+        if isinstance(expr, Case):
+            return self._case(expr, table)
+        raise UnsupportedSQL(f"cannot evaluate {expr!r}")
+
+    def _binary(self, expr: Binary, table):
+        pa, pc = self.pa, self.pc
+        left, right = self._eval(expr.left, table), self._eval(expr.right, table)
+        if expr.op == "AND":
+            return pc.and_kleene(left, right)
+        if expr.op == "OR":
+            return pc.or_kleene(left, right)
+        if pa.types.is_null(left.type) or pa.types.is_null(right.type):
+            # Any comparison or arithmetic with NULL is NULL.
+            if expr.op in _COMPARISONS or expr.op == "LIKE":
+                return pa.scalar(None, pa.bool_())
+            return pa.scalar(None)
+        if expr.op == "LIKE":
+            if not isinstance(expr.right, Literal) or not isinstance(expr.right.value, str):
+                raise UnsupportedSQL("LIKE with a non-literal pattern")
+            self._require_string(left, "LIKE")
+            return pc.match_like(left, expr.right.value)
+        if expr.op in _COMPARISONS:
+            function = {
+                "=": pc.equal, "<>": pc.not_equal, "<": pc.less,
+                "<=": pc.less_equal, ">": pc.greater, ">=": pc.greater_equal,
+            }[expr.op]
+            return function(left, right)
+        if expr.op == "/":
+            # Spark divides as double and yields NULL for a zero divisor.
+            left, right = pc.cast(left, pa.float64()), pc.cast(right, pa.float64())
+            right = pc.if_else(pc.equal(right, 0), pa.scalar(None, pa.float64()), right)
+            return pc.divide(left, right)
+        function = {"+": pc.add, "-": pc.subtract, "*": pc.multiply}[expr.op]
+        return function(left, right)
+
+    def _case(self, expr: Case, table):
+        pa, pc = self.pa, self.pc
+        branches = [(self._eval(c, table), self._eval(v, table)) for c, v in expr.whens]
+        result = None if expr.default is None else self._eval(expr.default, table)
+        typed = [v.type for _, v in branches if not pa.types.is_null(v.type)]
+        if result is not None and not pa.types.is_null(result.type):
+            typed.append(result.type)
+        target = self._common_type(typed) if typed else pa.null()
+        if result is None or pa.types.is_null(result.type):
+            result = pa.scalar(None, target)
+        for condition, value in reversed(branches):
+            if pa.types.is_null(value.type):
+                value = pa.scalar(None, target)
+            result = pc.if_else(pc.fill_null(condition, False), pc.cast(value, target), pc.cast(result, target))
+        return result
+
+    def _require_string(self, value, what: str) -> None:
+        pa = self.pa
+        if not (pa.types.is_string(value.type) or pa.types.is_large_string(value.type)):
+            raise UnsupportedSQL(f"{what} of {value.type}")
+
+    def _call(self, call: Call, args: List[Any]):
+        pa, pc = self.pa, self.pc
+        name = call.name
+        arity = {"concat": None, "coalesce": None, "substring": (2, 3), "substr": (2, 3),
+                 "to_timestamp": (1, 2), "to_date": (1, 2)}.get(name, (1, 1))
+        if arity is not None and not arity[0] <= len(args) <= arity[1]:
+            raise UnsupportedSQL(f"{name} of {len(args)} arguments")
+        if name in ("lower", "upper", "trim", "ltrim", "rtrim", "length"):
+            self._require_string(args[0], name)
+            if name in ("lower", "upper"):
+                return getattr(pc, f"utf8_{name}")(args[0])
+            if name == "length":
+                return pc.utf8_length(args[0])
+            kernel = {"trim": pc.utf8_trim, "ltrim": pc.utf8_ltrim, "rtrim": pc.utf8_rtrim}[name]
+            return kernel(args[0], characters=" ")
+        if name in ("substring", "substr"):
+            return self._substring(call, args)
+        if name == "concat":
+            for value in args:
+                self._require_string(value, name)
+            return pc.binary_join_element_wise(*args, "")
+        if name == "coalesce":
+            return pc.coalesce(*args)
+        if name == "abs":
+            return pc.abs(args[0])
+        if name in ("month", "year", "dayofmonth", "hour"):
+            value = self._temporal(args[0], name)
+            kernel = {"month": pc.month, "year": pc.year, "dayofmonth": pc.day, "hour": pc.hour}[name]
+            return pc.cast(kernel(value), pa.int32())
+        if name in ("to_timestamp", "to_date"):
+            value = self._timestamp(call, args)
+            return pc.cast(value, pa.date32()) if name == "to_date" else value
+        raise UnsupportedSQL(f"function {name}")
+
+    def _substring(self, call: Call, args: List[Any]):
+        if not all(isinstance(a, Literal) and isinstance(a.value, int) for a in call.args[1:]):
+            raise UnsupportedSQL("substring with non-literal bounds")
+        self._require_string(args[0], "substring")
+        position = call.args[1].value
+        length = call.args[2].value if len(call.args) == 3 else None
+        # Spark positions are 1-based; 0 means 1, negatives count from the end.
+        start = position - 1 if position > 0 else position
+        if length is None:
+            stop = None
+        elif length <= 0:
+            stop = start
+        elif start < 0:
+            if start + length < 0:
+                stop = start + length
+            else:
+                stop = None
+        else:
+            stop = start + length
+        return self.pc.utf8_slice_codeunits(args[0], start=start, stop=stop)
+
+    def _temporal(self, value, function: str):
+        pa, pc = self.pa, self.pc
+        if pa.types.is_timestamp(value.type):
+            # Field extraction works in the session time zone: UTC.
+            if value.type.tz is not None and value.type.tz not in ("UTC", "+00:00", "Z"):
+                value = pc.cast(value, pa.timestamp(value.type.unit, tz="UTC"))
+            return value
+        if pa.types.is_date(value.type):
+            return value
+        if pa.types.is_string(value.type) or pa.types.is_large_string(value.type):
+            return pc.cast(value, pa.timestamp("us"))
+        raise UnsupportedSQL(f"{function} of {value.type}")
+
+    def _timestamp(self, call: Call, args: List[Any]):
+        pc = self.pc
+        value = args[0]
+        if len(args) == 1:
+            return self._temporal(value, call.name)
+        if not isinstance(call.args[1], Literal) or not isinstance(call.args[1].value, str):
+            raise UnsupportedSQL(f"{call.name} with a non-literal format")
+        self._require_string(value, call.name)
+        # Unparseable values are NULL, as in Spark with ANSI mode off.
+        return pc.strptime(value, format=strptime_format(call.args[1].value), unit="us", error_is_null=True)
+
+
+def _chain(first, rest: Iterator[Any]) -> Iterator[Any]:
+    yield first
+    yield from rest
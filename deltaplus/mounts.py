@@ -0,0 +1,554 @@
+"""Read-through block cache for the lake mount.
+
+On Databricks ``dbfs:/mnt/training/crime-data-2016/...`` is object storage,
+so every rerun of a lesson fetches the same city files again.  A
+:class:`Mount` sits between :func:`deltaplus.paths.resolve` and the readers:
+
+* a :class:`MountSource` serves byte ranges of the files behind the mount;
+  :class:`LocalDirectorySource` stands in for the mount offline (a local
+  directory, optionally with a simulated per-request latency)
+* a :class:`BlockCache` keeps fixed-size blocks of those files on local
+  disk, indexed in SQLite and evicted least recently used once they exceed
+  a byte budget; blocks are memory-mapped and handed out as zero-copy
+  ``memoryview`` slices
+* :meth:`Mount.read_table` reads columns with ``pyarrow`` through a
+  read-through file, after fetching, in parallel, only the blocks that hold
+  those columns' chunks according to the Parquet footer
+* :meth:`Mount.localize` assembles complete local copies for Spark, which
+  can only read local paths.  Copies keep the remote size and mtime, so
+  fingerprints (and everything keyed on them) are unaffected; once a file
+  is localized its blocks are served from the copy instead
+
+Blocks are keyed by the remote path, size and mtime, so a rewritten file
+never hits stale blocks.  :func:`install` mounts a source at
+``/mnt/training``: from then on ``paths.resolve`` returns localized paths
+for everything under it.  Evicting a copy Spark is still reading makes that
+query fail, so the budget should hold the lesson's working set.
+
+Layout::
+
+    <cache>/index.sqlite
+    <cache>/blocks/<key[:2]>/<key>.<block>
+    <cache>/files/<path under the mount>
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from deltaplus import paths
+from deltaplus.fingerprints import fingerprint
+
+log = logging.getLogger(__name__)
+
+MOUNT_CACHE_DIR = "dbfs:/deltaplus/cache/mounts"
+DEFAULT_PREFIX = "/mnt/training"
+DEFAULT_BLOCK_SIZE = 4 << 20
+DEFAULT_MAX_BYTES = 4 << 30
+PREFETCH_WORKERS = 8
+# Memory maps kept open; older ones are closed once no slice refers to them.
+OPEN_MAPS = 256
+# Entries with this block number are localized whole files.
+FILE_BLOCK = -1
+
+_INDEX_SQL = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT NOT NULL, block INTEGER NOT NULL, path TEXT, bytes INTEGER NOT NULL,
+    last_used REAL NOT NULL, PRIMARY KEY (key, block)
+)
+"""
+
+
+@dataclass(frozen=True)
+class RemoteFile:
+    # Path relative to the mount point.
+    path: str
+    size: int
+    mtime_ns: int
+
+    @property
+    def key(self) -> str:
+        return hashlib.sha1(f"{self.path}\0{self.size}\0{self.mtime_ns}".encode("utf-8")).hexdigest()
+
+
+class MountSource:
+    """Byte-range access to the files behind a mount."""
+
+    def stat(self, path: str) -> Optional[RemoteFile]:
+        raise NotImplementedError
+
+    def list(self, path: str) -> List[RemoteFile]:
+        """Data files at ``path``, or under it when it is a directory."""
+        raise NotImplementedError
+
+    def read(self, file: RemoteFile, offset: int, length: int) -> bytes:
+        raise NotImplementedError
+
+
+class LocalDirectorySource(MountSource):
+    """A local directory standing in for the mount, for offline use.
+
+    ``latency_s`` is slept before every read to model the round trip to
+    object storage.
+    """
+
+    def __init__(self, root: str, latency_s: float = 0.0):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.latency_s = latency_s
+        self.requests = 0
+        self.bytes_read = 0
+        self._lock = threading.Lock()
+
+    def _local(self, path: str) -> str:
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def stat(self, path: str) -> Optional[RemoteFile]:
+        local = self._local(path)
+        if not os.path.isfile(local):
+            return None
+        st = os.stat(local)
+        return RemoteFile(path.strip("/"), st.st_size, st.st_mtime_ns)
+
+    def list(self, path: str) -> List[RemoteFile]:
+        local = self._local(path)
+        if os.path.isfile(local):
+            return [self.stat(path)]
+        if not os.path.isdir(local):
+            return []
+        return [
+            RemoteFile(os.path.join(path.strip("/"), rel), size, mtime_ns)
+            for rel, size, mtime_ns in fingerprint(local)
+        ]
+
+    def read(self, file: RemoteFile, offset: int, length: int) -> bytes:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        with open(self._local(file.path), "rb") as fh:
+            fh.seek(offset)
+            data = fh.read(length)
+        with self._lock:
+            self.requests += 1
+            self.bytes_read += len(data)
+        return data
+
+
+class BlockCache:
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+    ):
+        self.root = paths.resolve(root or MOUNT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._maps: "OrderedDict[Tuple[str, int], memoryview]" = OrderedDict()
+        # Last use of entries since the index was last updated.
+        self._used: Dict[Tuple[str, int], float] = {}
+        self._conn = sqlite3.connect(
+            os.path.join(self.root, "index.sqlite"), check_same_thread=False, timeout=30
+        )
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_INDEX_SQL)
+
+    def _block_path(self, key: str, block: int) -> str:
+        return os.path.join(self.root, "blocks", key[:2], f"{key}.{block}")
+
+    def files_root(self) -> str:
+        return os.path.join(self.root, "files")
+
+    def _map(self, entry: Tuple[str, int], path: str) -> Optional[memoryview]:
+        with self._lock:
+            view = self._maps.get(entry)
+            if view is not None:
+                self._maps.move_to_end(entry)
+                self._used[entry] = time.time()
+                return view
+        try:
+            with open(path, "rb") as fh:
+                view = memoryview(mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ))
+        except (FileNotFoundError, ValueError):
+            # ValueError: empty files cannot be mapped.
+            return None
+        with self._lock:
+            self._maps[entry] = view
+            self._used[entry] = time.time()
+            while len(self._maps) > OPEN_MAPS:
+                self._maps.popitem(last=False)
+        return view
+
+    def _lookup(self, key: str, block: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM entries WHERE key = ? AND block = ?", (key, block)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0] or self._block_path(key, block)
+
+    def get(self, key: str, block: int) -> Optional[memoryview]:
+        """Block ``block`` of file ``key``, from its block file or a localized copy."""
+        start = block * self.block_size
+        # Open maps first: a lookup in the index per read adds up.
+        with self._lock:
+            for entry in ((key, block), (key, FILE_BLOCK)):
+                view = self._maps.get(entry)
+                if view is not None:
+                    self._maps.move_to_end(entry)
+                    self._used[entry] = time.time()
+                    return view if entry[1] == block else view[start:start + self.block_size]
+        path = self._lookup(key, block)
+        if path is not None:
+            view = self._map((key, block), path)
+            if view is not None:
+                return view
+        path = self._lookup(key, FILE_BLOCK)
+        if path is None:
+            return None
+        view = self._map((key, FILE_BLOCK), path)
+        if view is None:
+            return None
+        return view[start:start + self.block_size]
+
+    def contains(self, key: str, block: int) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM entries WHERE key = ? AND block IN (?, ?)", (key, block, FILE_BLOCK)
+            ).fetchone()
+        return row is not None
+
+    def put(self, key: str, block: int, data: bytes) -> None:
+        target = self._block_path(key, block)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, target)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, NULL, ?, ?)",
+                (key, block, len(data), time.time()),
+            )
+        self.evict(keep=(key, block))
+
+    def local_file(self, key: str) -> Optional[str]:
+        """Path of the localized copy of file ``key``, if there is one."""
+        path = self._lookup(key, FILE_BLOCK)
+        if path is None or not os.path.exists(path):
+            return None
+        with self._lock:
+            self._used[(key, FILE_BLOCK)] = time.time()
+        return path
+
+    def add_file(self, key: str, path: str, size: int) -> None:
+        """Record a localized copy; the file's blocks are no longer needed."""
+        with self._lock, self._conn:
+            # An older version of the file was localized to the same path.
+            self._conn.execute("DELETE FROM entries WHERE path = ? AND key != ?", (path, key))
+            blocks = [
+                row[0] for row in self._conn.execute(
+                    "SELECT block FROM entries WHERE key = ? AND block != ?", (key, FILE_BLOCK)
+                )
+            ]
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?)", (key, FILE_BLOCK, path, size, time.time())
+            )
+            for block in blocks:
+                self._maps.pop((key, block), None)
+        for block in blocks:
+            self._remove(self._block_path(key, block))
+        self.evict(keep=(key, FILE_BLOCK))
+
+    def remove_file(self, path: str) -> None:
+        """Forget and delete a localized copy whose source file is gone."""
+        with self._lock, self._conn:
+            for key, in self._conn.execute("SELECT key FROM entries WHERE path = ?", (path,)).fetchall():
+                self._maps.pop((key, FILE_BLOCK), None)
+            self._conn.execute("DELETE FROM entries WHERE path = ?", (path,))
+        self._remove(path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _flush_used(self) -> None:
+        # Called with the lock held.
+        if self._used:
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE entries SET last_used = max(last_used, ?) WHERE key = ? AND block = ?",
+                    [(used, key, block) for (key, block), used in self._used.items()],
+                )
+            self._used.clear()
+
+    def evict(self, keep: Optional[Tuple[str, int]] = None) -> int:
+        """Drop least recently used blocks and copies until the cache fits ``max_bytes``.
+
+        ``keep`` (the entry just added) is never dropped, so a budget smaller
+        than one file still returns that file.
+        """
+        with self._lock:
+            total = self._conn.execute("SELECT coalesce(sum(bytes), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            self._flush_used()
+            victims = []
+            for key, block, path, size in self._conn.execute(
+                "SELECT key, block, path, bytes FROM entries ORDER BY last_used"
+            ):
+                if total <= self.max_bytes:
+                    break
+                if (key, block) == keep:
+                    continue
+                victims.append((key, block, path or self._block_path(key, block)))
+                total -= size
+            with self._conn:
+                self._conn.executemany(
+                    "DELETE FROM entries WHERE key = ? AND block = ?", [(k, b) for k, b, _ in victims]
+                )
+            for key, block, _ in victims:
+                self._maps.pop((key, block), None)
+        for _, _, path in victims:
+            self._remove(path)
+        log.debug("evicted %d cache entries", len(victims))
+        return len(victims)
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            rows = self._conn.execute("SELECT key, block, path FROM entries").fetchall()
+            self._conn.execute("DELETE FROM entries")
+            self._maps.clear()
+            self._used.clear()
+        for key, block, path in rows:
+            self._remove(path or self._block_path(key, block))
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._flush_used()
+            blocks, block_bytes = self._conn.execute(
+                "SELECT count(*), coalesce(sum(bytes), 0) FROM entries WHERE block != ?", (FILE_BLOCK,)
+            ).fetchone()
+            files, file_bytes = self._conn.execute(
+                "SELECT count(*), coalesce(sum(bytes), 0) FROM entries WHERE block = ?", (FILE_BLOCK,)
+            ).fetchone()
+        return {"blocks": blocks, "files": files, "bytes": block_bytes + file_bytes}
+
+
+class CachedFile(io.RawIOBase):
+    """Seekable read-only file whose bytes come through the mount's block cache."""
+
+    def __init__(self, mount: "Mount", file: RemoteFile):
+        super().__init__()
+        self.mount = mount
+        self.file = file
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self.file.size}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def read_range(self, offset: int, length: int):
+        """``length`` bytes at ``offset``: a zero-copy view when they lie in one block."""
+        end = min(offset + length, self.file.size)
+        if end <= offset:
+            return b""
+        size = self.mount.cache.block_size
+        first, last = offset // size, (end - 1) // size
+        if first == last:
+            return self.mount.block(self.file, first)[offset - first * size:end - first * size]
+        parts = []
+        for index in range(first, last + 1):
+            start = index * size
+            parts.append(self.mount.block(self.file, index)[max(offset, start) - start:min(end, start + size) - start])
+        return b"".join(parts)
+
+    def read(self, size: int = -1):
+        remaining = self.file.size - self._pos
+        data = self.read_range(self._pos, remaining if size is None or size < 0 else min(size, remaining))
+        self._pos += len(data)
+        return data
+
+    def readall(self):
+        return self.read(-1)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def column_chunk_ranges(metadata, columns: Optional[Sequence[str]] = None) -> List[Tuple[int, int]]:
+    """``(offset, length)`` of every column chunk of ``columns`` (all when None)."""
+    wanted = None if columns is None else {c.lower() for c in columns}
+    ranges = []
+    for rg in range(metadata.num_row_groups):
+        group = metadata.row_group(rg)
+        for i in range(group.num_columns):
+            chunk = group.column(i)
+            if wanted is not None and chunk.path_in_schema.split(".")[0].lower() not in wanted:
+                continue
+            start = chunk.data_page_offset
+            if chunk.has_dictionary_page and chunk.dictionary_page_offset:
+                start = min(start, chunk.dictionary_page_offset)
+            ranges.append((start, chunk.total_compressed_size))
+    return ranges
+
+
+class Mount:
+    def __init__(
+        self,
+        source: MountSource,
+        cache: Optional[BlockCache] = None,
+        prefix: str = DEFAULT_PREFIX,
+        workers: int = PREFETCH_WORKERS,
+    ):
+        self.source = source
+        self.cache = cache if cache is not None else BlockCache()
+        self.prefix = "/" + prefix.strip("/")
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def relative(self, path: str) -> str:
+        """``path`` (``dbfs:`` or plain) relative to the mount point."""
+        if path.startswith("dbfs:"):
+            path = path[len("dbfs:"):]
+        if path != self.prefix and not path.startswith(self.prefix + "/"):
+            raise ValueError(f"{path} is not under {self.prefix}")
+        return path[len(self.prefix):].strip("/")
+
+    def block(self, file: RemoteFile, index: int) -> memoryview:
+        view = self.cache.get(file.key, index)
+        with self._lock:
+            if view is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if view is not None:
+            return view
+        start = index * self.cache.block_size
+        data = self.source.read(file, start, min(self.cache.block_size, file.size - start))
+        self.cache.put(file.key, index, data)
+        return memoryview(data)
+
+    def open(self, path: str) -> CachedFile:
+        file = self.source.stat(self.relative(path))
+        if file is None:
+            raise FileNotFoundError(path)
+        return CachedFile(self, file)
+
+    def prefetch(self, file: RemoteFile, ranges: Iterable[Tuple[int, int]]) -> int:
+        """Fetch the missing blocks covering ``ranges`` concurrently; return how many."""
+        size = self.cache.block_size
+        blocks = set()
+        for offset, length in ranges:
+            if length > 0:
+                blocks.update(range(offset // size, (min(offset + length, file.size) - 1) // size + 1))
+        missing = [b for b in sorted(blocks) if not self.cache.contains(file.key, b)]
+        if len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(lambda b: self.block(file, b), missing))
+        elif missing:
+            self.block(file, missing[0])
+        return len(missing)
+
+    def read_table(self, path: str, columns: Optional[Sequence[str]] = None, **kwargs):
+        """Read ``columns`` of the Parquet file or directory at ``path`` with pyarrow.
+
+        The footer is read first (through the cache); then the blocks of the
+        wanted column chunks are prefetched concurrently before decoding.
+        """
+        from deltaplus.parquet import require_pyarrow
+
+        pq = require_pyarrow()
+        import pyarrow as pa
+
+        tables = []
+        for file in self.source.list(self.relative(path)):
+            handle = CachedFile(self, file)
+            parquet_file = pq.ParquetFile(handle)
+            self.prefetch(file, column_chunk_ranges(parquet_file.metadata, columns))
+            tables.append(parquet_file.read(columns=columns, **kwargs))
+        if not tables:
+            raise FileNotFoundError(path)
+        return pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+
+    def localize(self, path: str) -> str:
+        """Local path with complete copies of the file(s) at ``path``.
+
+        Paths the source does not have resolve to a path that does not
+        exist, as an unmounted path would.
+        """
+        rel = self.relative(path)
+        target = os.path.join(self.cache.files_root(), rel)
+        files = self.source.list(rel)
+        for file in files:
+            local = os.path.join(self.cache.files_root(), file.path)
+            if self.cache.local_file(file.key) == local:
+                continue
+            self.prefetch(file, [(0, file.size)])
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+            # Hidden, so neither Spark nor the cleanup below picks it up.
+            tmp = os.path.join(os.path.dirname(local), f".{os.path.basename(local)}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as fh:
+                for index in range((file.size + self.cache.block_size - 1) // self.cache.block_size):
+                    fh.write(self.block(file, index))
+            os.utime(tmp, ns=(file.mtime_ns, file.mtime_ns))
+            os.replace(tmp, local)
+            self.cache.add_file(file.key, local, file.size)
+        if os.path.isdir(target):
+            # Files removed (or rewritten under new names) at the source.
+            current = {os.path.join(self.cache.files_root(), f.path) for f in files}
+            for rel_file, _, _ in fingerprint(target):
+                local = os.path.join(target, rel_file)
+                if local not in current:
+                    self.cache.remove_file(local)
+        return target
+
+    def stats(self) -> dict:
+        stats = dict(self.cache.stats(), hits=self.hits, misses=self.misses)
+        if isinstance(self.source, LocalDirectorySource):
+            stats.update(remote_requests=self.source.requests, remote_bytes=self.source.bytes_read)
+        return stats
+
+
+def install(
+    source_root: str,
+    cache_dir: Optional[str] = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    prefix: str = DEFAULT_PREFIX,
+    latency_s: float = 0.0,
+) -> Mount:
+    """Serve ``prefix`` through the block cache from ``source_root``, the directory standing in for it."""
+    mount = Mount(LocalDirectorySource(source_root, latency_s), BlockCache(cache_dir, max_bytes), prefix)
+    paths.mount(prefix, mount.localize)
+    return mount
@@ -0,0 +1,165 @@
+"""Parser for the Databricks "notebook source" export format.
+
+An exported notebook is a plain ``.py`` file whose cells are separated by
+``# COMMAND ----------`` lines.  Python cells are stored verbatim; every other
+language is stored as comment lines prefixed with ``# MAGIC`` whose first
+line names the magic (``%sql``, ``%md``, ``%run``, ``%fs`` ...).
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
+
+HEADER = "# Databricks notebook source"
+SEPARATOR = "# COMMAND ----------"
+MAGIC_PREFIX = "# MAGIC"
+
+_MAGIC_RE = re.compile(r"^%(?P<magic>[\w-]+)\s*(?P<rest>.*)$", re.DOTALL)
+
+
+@dataclass(frozen=True)
+class Cell:
+    """A single notebook cell.
+
+    ``kind`` is ``"python"`` for plain cells and the magic name otherwise
+    (``"sql"``, ``"md"``, ``"md-sandbox"``, ``"run"``, ``"fs"`` ...).
+    ``source`` is the cell body with the ``# MAGIC`` prefixes and the magic
+    line itself removed.
+    """
+
+    index: int
+    kind: str
+    source: str
+    line: int = 1
+
+    @property
+    def is_markdown(self) -> bool:
+        return self.kind in ("md", "md-sandbox")
+
+    @property
+    def is_test(self) -> bool:
+        return self.kind == "python" and self.source.lstrip().startswith("# TEST")
+
+    @property
+    def run_target(self) -> Optional[str]:
+        """The notebook path referenced by a ``%run`` cell, unquoted."""
+        if self.kind != "run":
+            return None
+        target = self.source.strip()
+        if len(target) >= 2 and target[0] == target[-1] and target[0] in "\"'":
+            target = target[1:-1]
+        return target
+
+    @property
+    def is_placeholder(self) -> bool:
+        """True for exercise cells that still contain ``FILL_IN``."""
+        return "FILL_IN" in self.source
+
+
+@dataclass
+class Notebook:
+    path: str
+    cells: List[Cell] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+    @property
+    def directory(self) -> str:
+        return os.path.dirname(os.path.abspath(self.path))
+
+    @classmethod
+    def load(cls, path: str) -> "Notebook":
+        with open(path, encoding="utf-8") as fh:
+            return cls.parse(fh.read(), path)
+
+    @classmethod
+    def parse(cls, text: str, path: str = "<notebook>") -> "Notebook":
+        lines = text.splitlines()
+        if lines and lines[0].strip() == HEADER:
+            lines = lines[1:]
+            start_line = 2
+        else:
+            start_line = 1
+
+        chunks: List[tuple] = []
+        current: List[str] = []
+        current_start = start_line
+        for offset, line in enumerate(lines):
+            if line.strip() == SEPARATOR:
+                chunks.append((current_start, current))
+                current = []
+                current_start = start_line + offset + 1
+            else:
+                current.append(line)
+        chunks.append((current_start, current))
+
+        cells = []
+        for start, chunk in chunks:
+            cell = _parse_cell(len(cells), start, chunk)
+            if cell is not None:
+                cells.append(cell)
+        return cls(path=path, cells=cells)
+
+    def __iter__(self) -> Iterator[Cell]:
+        return iter(self.cells)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def sql_cells(self) -> List[Cell]:
+        return [c for c in self.cells if c.kind == "sql"]
+
+    def resolve_run_target(self, cell: Cell) -> Optional[str]:
+        """Resolve a ``%run`` target relative to this notebook's directory."""
+        target = cell.run_target
+        if target is None:
+            return None
+        path = os.path.normpath(os.path.join(self.directory, target))
+        if not os.path.splitext(path)[1]:
+            path += ".py"
+        return path
+
+
+def _strip_magic(line: str) -> str:
+    if line.startswith(MAGIC_PREFIX + " "):
+        return line[len(MAGIC_PREFIX) + 1:]
+    if line.startswith(MAGIC_PREFIX):
+        return line[len(MAGIC_PREFIX):]
+    return line
+
+
+def _parse_cell(index: int, start: int, lines: List[str]) -> Optional[Cell]:
+    # Drop the blank padding lines the exporter puts around every separator.
+    while lines and not lines[0].strip():
+        lines = lines[1:]
+        start += 1
+    while lines and not lines[-1].strip():
+        lines = lines[:-1]
+    if not lines:
+        return None
+
+    if not all(line.startswith(MAGIC_PREFIX) for line in lines):
+        return Cell(index=index, kind="python", source="\n".join(lines), line=start)
+
+    body = [_strip_magic(line) for line in lines]
+    while body and not body[0].strip():
+        body = body[1:]
+    if not body:
+        return None
+    match = _MAGIC_RE.match(body[0].strip())
+    if match is None:
+        # Magic-prefixed cell without an explicit language is Python.
+        return Cell(index=index, kind="python", source="\n".join(body), line=start)
+    rest = match.group("rest").strip()
+    source_lines = ([rest] if rest else []) + body[1:]
+    return Cell(
+        index=index,
+        kind=match.group("magic"),
+        source="\n".join(source_lines).strip("\n"),
+        line=start,
+    )
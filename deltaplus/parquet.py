@@ -0,0 +1,141 @@
+"""Parquet footer inspection helpers (require ``pyarrow``)."""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def require_pyarrow():
+    """Import ``pyarrow.parquet`` or fail with an actionable message."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:  # pragma: no cover - depends on environment
+        raise ImportError(
+            "this feature needs pyarrow; install it with `pip install pyarrow`"
+        ) from exc
+    return pq
+
+
+def data_files(path: str) -> List[str]:
+    """All Parquet data files under ``path`` (a file or a dataset directory)."""
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(("_", ".")))
+        for name in sorted(filenames):
+            if name.startswith(("_", ".")) or name.endswith(".crc"):
+                continue
+            found.append(os.path.join(dirpath, name))
+    return found
+
+
+@dataclass
+class ScanEstimate:
+    """Bytes a reader must fetch for a projection under a pushed filter."""
+
+    files: int = 0
+    row_groups: int = 0
+    row_groups_read: int = 0
+    bytes_total: int = 0
+    bytes_read: int = 0
+
+    @property
+    def skipped_fraction(self) -> float:
+        if not self.row_groups:
+            return 0.0
+        return 1.0 - self.row_groups_read / self.row_groups
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "files": self.files,
+            "row_groups": self.row_groups,
+            "row_groups_read": self.row_groups_read,
+            "bytes_total": self.bytes_total,
+            "bytes_read": self.bytes_read,
+            "skipped_fraction": round(self.skipped_fraction, 4),
+        }
+
+
+# Per row group: {lower-cased column: [compressed bytes, min, max]}, with
+# min/max None when the footer has no statistics for the chunk.
+RowGroupStats = List[Dict[str, List[Any]]]
+
+
+def _json_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return str(value)
+
+
+def read_row_groups(file: str) -> RowGroupStats:
+    """Column-chunk sizes and min/max statistics of every row group of ``file``.
+
+    Values are JSON-compatible (bytes decoded, timestamps as strings) so the
+    result can be cached as is (see :mod:`deltaplus.footers`).
+    """
+    pq = require_pyarrow()
+    meta = pq.ParquetFile(file).metadata
+    groups = []
+    for i in range(meta.num_row_groups):
+        rg = meta.row_group(i)
+        columns = {}
+        for j in range(rg.num_columns):
+            chunk = rg.column(j)
+            stats = chunk.statistics
+            if stats is not None and stats.has_min_max:
+                low, high = _json_value(stats.min), _json_value(stats.max)
+            else:
+                low = high = None
+            columns[chunk.path_in_schema.lower()] = [chunk.total_compressed_size, low, high]
+        groups.append(columns)
+    return groups
+
+
+def _may_contain(low: Any, high: Any, value: Any) -> bool:
+    if low is None or high is None:
+        return True
+    try:
+        return low <= value <= high
+    except TypeError:
+        return True
+
+
+def estimate_scan(
+    path: str,
+    columns: Sequence[str],
+    equals: Optional[Dict[str, Any]] = None,
+    cache=None,
+) -> ScanEstimate:
+    """Estimate the column-chunk bytes read to evaluate a query.
+
+    ``columns`` is the projection (columns are matched case-insensitively, as
+    Spark does).  ``equals`` maps column names to values of pushed-down
+    equality filters: a row group whose min/max statistics exclude the value
+    is skipped, exactly as the Parquet reader does.  Without ``equals`` every
+    row group is read, which is what happens when the filter wraps the column
+    in a function such as ``lower()``.  With a
+    :class:`~deltaplus.footers.FooterCache` footers are only read for files
+    that changed since they were cached.
+    """
+    wanted = {c.lower() for c in columns}
+    filters = {k.lower(): v for k, v in (equals or {}).items()}
+    estimate = ScanEstimate()
+    for file in data_files(path):
+        groups = cache.row_groups(file) if cache is not None else read_row_groups(file)
+        estimate.files += 1
+        for chunks in groups:
+            size = sum(chunks[c][0] for c in wanted if c in chunks)
+            estimate.row_groups += 1
+            estimate.bytes_total += size
+            keep = all(
+                _may_contain(chunks[c][1], chunks[c][2], v) for c, v in filters.items() if c in chunks
+            )
+            if keep:
+                estimate.row_groups_read += 1
+                estimate.bytes_read += size
+    return estimate
@@ -0,0 +1,74 @@
+"""Translation of Databricks file-system paths to the local machine.
+
+The lesson notebooks address the training data as
+``dbfs:/mnt/training/crime-data-2016/...`` (and ``%fs`` cells as plain
+``/mnt/...``).  Locally those paths are served from a directory tree rooted at
+``$DELTAPLUS_DBFS_ROOT`` (``~/.deltaplus/dbfs`` by default), so
+``dbfs:/mnt/training/x.parquet`` becomes ``<root>/mnt/training/x.parquet``.
+
+A prefix can instead be mounted with a resolver of its own (:func:`mount`),
+which returns the local path to read (see :mod:`deltaplus.mounts`).
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import Callable, Dict, Optional
+
+DBFS_ROOT_ENV = "DELTAPLUS_DBFS_ROOT"
+DEFAULT_DBFS_ROOT = os.path.join("~", ".deltaplus", "dbfs")
+
+CRIME_DATA_DIR = "dbfs:/mnt/training/crime-data-2016"
+
+_DBFS_LITERAL_RE = re.compile(r"(?P<quote>[\"'`])dbfs:(?P<path>/[^\"'`]*)(?P=quote)")
+
+_root_override: Optional[str] = None
+# DBFS path prefix -> resolver of the paths under it.
+_mounts: Dict[str, Callable[[str], str]] = {}
+
+
+def set_dbfs_root(root: Optional[str]) -> None:
+    """Override the local DBFS root for this process (``None`` resets it)."""
+    global _root_override
+    _root_override = root
+
+
+def dbfs_root() -> str:
+    root = _root_override or os.environ.get(DBFS_ROOT_ENV) or DEFAULT_DBFS_ROOT
+    return os.path.abspath(os.path.expanduser(root))
+
+
+def mount(prefix: str, resolver: Callable[[str], str]) -> None:
+    """Resolve DBFS paths under ``prefix`` (e.g. ``/mnt/training``) with ``resolver``."""
+    _mounts["/" + prefix.strip("/")] = resolver
+
+
+def unmount(prefix: str) -> None:
+    _mounts.pop("/" + prefix.strip("/"), None)
+
+
+def resolve(path: str) -> str:
+    """Return the local file-system path for a ``dbfs:`` or ``/mnt`` path.
+
+    Paths that are neither (already local, ``file:``, ``s3a:`` ...) are
+    returned unchanged.
+    """
+    if path.startswith("dbfs:"):
+        path = path[len("dbfs:"):]
+    elif not path.startswith(("/mnt/", "/FileStore/", "/tmp/dbfs/")):
+        return path
+    for prefix in sorted(_mounts, key=len, reverse=True):
+        if path == prefix or path.startswith(prefix + "/"):
+            return _mounts[prefix](path)
+    return os.path.join(dbfs_root(), path.lstrip("/"))
+
+
+def rewrite_sql_paths(sql: str) -> str:
+    """Replace quoted ``dbfs:/...`` literals in ``sql`` with local paths."""
+
+    def _sub(match: "re.Match[str]") -> str:
+        quote = match.group("quote")
+        return quote + resolve("dbfs:" + match.group("path")) + quote
+
+    return _DBFS_LITERAL_RE.sub(_sub, sql)
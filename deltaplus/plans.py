@@ -0,0 +1,317 @@
+"""Physical plans and scan metrics of executed queries.
+
+A slow lesson cell usually has one of a few causes: a filter that was not
+pushed into the Parquet scan (``lower(col) LIKE ...`` cannot be), a scan that
+reads every file or row group, a large shuffle or a spill.  :func:`inspect`
+walks the executed physical plan of a query that has already run and
+collects exactly that:
+
+* per file scan: pushed, data and partition filters, files and bytes
+  selected, rows produced and, when ``pyarrow`` is installed, the row groups
+  the pushed equality filters let the reader skip
+* shuffle bytes written and bytes spilled, summed over the plan's operators
+* bytes actually read by the query's stages, from Spark's status API (only
+  when the Spark UI is enabled)
+
+Filters the scan could not push down are reported as warnings.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import time
+import urllib.request
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.error import URLError
+
+log = logging.getLogger(__name__)
+
+# Filters Spark adds for every comparison; they say nothing about whether
+# the user's predicate was pushed.
+_NOT_NULL_RE = re.compile(r"^(isnotnull|IsNotNull)\(")
+_EQUAL_TO_RE = re.compile(r"^EqualTo\((\w+),(.*)\)$")
+
+STAGE_POLL_TIMEOUT_S = 2.0
+
+
+@dataclass
+class ScanInfo:
+    location: str
+    format: str
+    pushed_filters: List[str] = field(default_factory=list)
+    data_filters: List[str] = field(default_factory=list)
+    partition_filters: List[str] = field(default_factory=list)
+    files: Optional[int] = None
+    bytes: Optional[int] = None
+    rows: Optional[int] = None
+    row_groups: Optional[int] = None
+    row_groups_read: Optional[int] = None
+
+    @property
+    def unpushed_filters(self) -> List[str]:
+        """Data filters beyond what the pushed filters cover.
+
+        Spark does not say which data filter a pushed filter came from, so
+        this compares counts after dropping the ``IsNotNull`` guards.
+        """
+        data = [f for f in self.data_filters if not _NOT_NULL_RE.match(f)]
+        pushed = [f for f in self.pushed_filters if not _NOT_NULL_RE.match(f)]
+        return data if len(pushed) < len(data) else []
+
+
+@dataclass
+class QueryMetrics:
+    statement: str
+    plan: str
+    scans: List[ScanInfo] = field(default_factory=list)
+    shuffle_bytes: int = 0
+    spill_bytes: int = 0
+    input_bytes: Optional[int] = None
+    jobs: List[int] = field(default_factory=list)
+    # Served from the result cache: the plan never ran, so there are no metrics.
+    cached: bool = False
+
+    @property
+    def warnings(self) -> List[str]:
+        warnings = []
+        for scan in self.scans:
+            if scan.unpushed_filters:
+                warnings.append(
+                    f"filter not pushed into {scan.format} scan of {scan.location}: "
+                    + ", ".join(scan.unpushed_filters)
+                )
+        if self.spill_bytes:
+            warnings.append(f"spilled {_mb(self.spill_bytes)}")
+        return warnings
+
+    def to_dict(self) -> Dict[str, Any]:
+        payload = asdict(self)
+        payload["warnings"] = self.warnings
+        return payload
+
+    def summary(self) -> str:
+        lines = [" ".join(self.statement.split())[:100]]
+        if self.cached:
+            lines.append("  served from the result cache; not executed")
+            return "\n".join(lines)
+        for scan in self.scans:
+            groups = ""
+            if scan.row_groups is not None:
+                groups = f", {scan.row_groups_read}/{scan.row_groups} row groups"
+            lines.append(
+                f"  scan {scan.location}: {scan.files} files, {_mb(scan.bytes)}{groups}, "
+                f"{scan.rows} rows; pushed {', '.join(scan.pushed_filters) or '-'}"
+            )
+        read = "-" if self.input_bytes is None else _mb(self.input_bytes)
+        lines.append(
+            f"  read {read}, shuffle {_mb(self.shuffle_bytes)}, spill {_mb(self.spill_bytes)}"
+        )
+        lines += [f"  WARN {w}" for w in self.warnings]
+        return "\n".join(lines)
+
+
+def _mb(value: Optional[int]) -> str:
+    return "-" if value is None else f"{value / (1 << 20):.1f} MB"
+
+
+def _split_list(text: str) -> List[str]:
+    """Split Spark's ``[a, f(b, c), d]`` rendering on top-level commas."""
+    text = text.strip()
+    if text.startswith("[") and text.endswith("]"):
+        text = text[1:-1]
+    items, depth, current = [], 0, []
+    for ch in text:
+        if ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth -= 1
+        if ch == "," and depth == 0:
+            items.append("".join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+    items.append("".join(current).strip())
+    return [item for item in items if item]
+
+
+def _option(scala_option) -> Any:
+    return scala_option.get() if scala_option.isDefined() else None
+
+
+def _metric(node, name: str) -> Optional[int]:
+    metric = _option(node.metrics().get(name))
+    return None if metric is None else int(metric.value())
+
+
+def _nodes(plan) -> Iterator[Tuple[str, Any]]:
+    """``(class name, node)`` of every operator, through AQE wrappers."""
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        name = node.getClass().getSimpleName()
+        if name == "AdaptiveSparkPlanExec":
+            stack.append(node.executedPlan())
+            continue
+        if name.endswith("QueryStageExec"):
+            stack.append(node.plan())
+            continue
+        yield name, node
+        if name == "ReusedExchangeExec":
+            # The reused exchange is reported where it first ran.
+            continue
+        children = node.children()
+        stack.extend(children.apply(i) for i in range(children.size()))
+
+
+def _selected_files(node) -> Optional[List[str]]:
+    try:
+        files = []
+        partitions = node.selectedPartitions()
+        for partition in partitions:
+            statuses = partition.files()
+            files += [statuses.apply(i).getPath().toString() for i in range(statuses.size())]
+        return files
+    except Exception:  # noqa: BLE001 - internal API differs across Spark versions
+        log.debug("cannot list selected files of scan", exc_info=True)
+        return None
+
+
+def _literal(raw: str) -> Any:
+    for convert in (int, float):
+        try:
+            return convert(raw)
+        except ValueError:
+            pass
+    return raw
+
+
+def _row_groups(node, scan: ScanInfo) -> None:
+    """Fill ``scan.row_groups*`` from footers, if pyarrow is available."""
+    from deltaplus.footers import default_cache
+    from deltaplus.parquet import estimate_scan
+
+    files = _selected_files(node)
+    if files is None:
+        return
+    equals = {}
+    for pushed in scan.pushed_filters:
+        match = _EQUAL_TO_RE.match(pushed)
+        if match:
+            equals[match.group(1)] = _literal(match.group(2))
+    columns = list(node.requiredSchema().fieldNames())
+    cache = default_cache()
+    row_groups = row_groups_read = 0
+    try:
+        for uri in files:
+            estimate = estimate_scan(_local(uri), columns, equals, cache=cache)
+            row_groups += estimate.row_groups
+            row_groups_read += estimate.row_groups_read
+    except (ImportError, OSError, TypeError):
+        return
+    scan.row_groups, scan.row_groups_read = row_groups, row_groups_read
+
+
+def _local(uri: str) -> str:
+    from urllib.parse import unquote, urlparse
+
+    return unquote(urlparse(uri).path)
+
+
+def _scan(node) -> ScanInfo:
+    meta = node.metadata()
+
+    def entry(key: str) -> str:
+        return _option(meta.get(key)) or ""
+
+    scan = ScanInfo(
+        location=entry("Location"),
+        format=entry("Format"),
+        pushed_filters=_split_list(entry("PushedFilters")),
+        data_filters=_split_list(entry("DataFilters")),
+        partition_filters=_split_list(entry("PartitionFilters")),
+        files=_metric(node, "numFiles"),
+        bytes=_metric(node, "filesSize"),
+        rows=_metric(node, "numOutputRows"),
+    )
+    if scan.format.lower() == "parquet":
+        _row_groups(node, scan)
+    return scan
+
+
+def _get_json(url: str) -> Any:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.load(response)
+
+
+def stage_totals(sc, job_ids: Sequence[int], timeout: float = STAGE_POLL_TIMEOUT_S) -> Optional[Dict[str, int]]:
+    """Totals over the stages of ``job_ids`` from the status API.
+
+    ``input_bytes`` is the bytes read from storage, ``peak_execution_memory``
+    the largest peak execution memory (sort, aggregation and join buffers) of
+    any of the stages.  The status store is fed asynchronously by Spark's
+    listener bus, so stages that have not been marked finished yet are polled
+    for up to ``timeout``.  Returns None when the UI (and with it the API) is
+    disabled.
+    """
+    url = sc.uiWebUrl
+    if not url or not job_ids:
+        return None
+    stage_ids = set()
+    for job_id in job_ids:
+        info = sc.statusTracker().getJobInfo(job_id)
+        if info is not None:
+            stage_ids.update(info.stageIds)
+    base = f"{url}/api/v1/applications/{sc.applicationId}/stages"
+    deadline = time.monotonic() + timeout
+    totals = {"input_bytes": 0, "peak_execution_memory": 0}
+    try:
+        for stage_id in sorted(stage_ids):
+            while True:
+                attempts = _get_json(f"{base}/{stage_id}")
+                if all(a["status"] != "ACTIVE" for a in attempts) or time.monotonic() > deadline:
+                    break
+                time.sleep(0.05)
+            totals["input_bytes"] += sum(a.get("inputBytes", 0) for a in attempts)
+            totals["peak_execution_memory"] = max(
+                [totals["peak_execution_memory"]] + [a.get("peakExecutionMemory", 0) for a in attempts]
+            )
+    except (URLError, OSError, ValueError):
+        log.debug("Spark status API unavailable at %s", url, exc_info=True)
+        return None
+    return totals
+
+
+def stage_input_bytes(sc, job_ids: Sequence[int], timeout: float = STAGE_POLL_TIMEOUT_S) -> Optional[int]:
+    """Bytes read from storage by the stages of ``job_ids`` (see :func:`stage_totals`)."""
+    totals = stage_totals(sc, job_ids, timeout)
+    return None if totals is None else totals["input_bytes"]
+
+
+def inspect(spark, df, statement: str = "", job_ids: Sequence[int] = ()) -> QueryMetrics:
+    """Metrics of ``df``, which must already have been executed.
+
+    Pass the DataFrame the action ran on (``df.limit(n)`` for a ``take``):
+    the metrics live in that DataFrame's executed plan.
+    """
+    plan = df._jdf.queryExecution().executedPlan()
+    metrics = QueryMetrics(statement=statement, plan=plan.toString(), jobs=list(job_ids))
+    for name, node in _nodes(plan):
+        if name == "FileSourceScanExec":
+            metrics.scans.append(_scan(node))
+        elif name == "ShuffleExchangeExec":
+            metrics.shuffle_bytes += _metric(node, "shuffleBytesWritten") or 0
+        metrics.spill_bytes += _metric(node, "spillSize") or 0
+    metrics.input_bytes = stage_input_bytes(spark.sparkContext, job_ids)
+    return metrics
+
+
+def join_strategies(df) -> List[str]:
+    """Physical join operators ``df`` plans to (or did) run, e.g. ``BroadcastHashJoinExec``.
+
+    Before the query has run, AQE plans are reported as initially planned.
+    """
+    plan = df._jdf.queryExecution().executedPlan()
+    return [name for name, _ in _nodes(plan) if name.endswith("JoinExec")]
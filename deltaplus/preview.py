@@ -0,0 +1,123 @@
+"""Bounded previews for exploratory cells.
+
+Cells like ``SELECT * FROM CrimeDataBoston`` or ``SELECT * FROM
+HomicidesBostonAndNewYork ORDER BY month`` have no ``LIMIT``; run as written
+they scan, and sort, everything to show a screenful.  :class:`Preview` caps
+such queries and picks the cheapest way to run the capped plan:
+
+* ``scan`` plans (projections and filters over files) are collected with
+  ``collect()`` on the limited DataFrame, which Spark runs incrementally:
+  one partition first, more only if it did not yield enough rows.  The
+  Arrow path would start a task on every partition of the input.
+* ``top-n`` plans (a global sort under the cap) become
+  ``TakeOrderedAndProject``: every partition keeps its best ``limit`` rows
+  and only those are merged, instead of a full shuffle sort.
+* anything else (aggregates, joins) runs with the cap on top.
+
+With ``stratify`` the preview is a stratified sample instead of the first
+rows: one pass over the stratum column counts the strata, ``sampleBy`` draws
+a matching fraction of every stratum and each stratum is cut to an equal
+share of ``limit`` rows, so a preview of all cities is not just the first
+city's file.  Sampled previews ignore the query's ``ORDER BY``; rows with a
+null stratum are never sampled.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Callable, Optional, Set
+
+from deltaplus.arrow import ColumnarResult, fetch
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PREVIEW_ROWS = 1000
+DEFAULT_SEED = 2016
+# sampleBy draws every row independently; draw a little more than the share.
+OVERSAMPLE = 1.5
+
+# Logical operators a limit can be applied to partition by partition.
+_SCAN_NODES = {
+    "Project", "Filter", "SubqueryAlias", "View", "GlobalLimit", "LocalLimit",
+    "LogicalRelation", "HiveTableRelation", "LocalRelation",
+}
+_PASS_THROUGH = {"GlobalLimit", "LocalLimit", "Project", "SubqueryAlias", "View"}
+
+
+def _children(node) -> list:
+    children = node.children()
+    return [children.apply(i) for i in range(children.size())]
+
+
+def _logical_names(plan) -> Set[str]:
+    names, stack = set(), [plan]
+    while stack:
+        node = stack.pop()
+        names.add(node.getClass().getSimpleName())
+        stack.extend(_children(node))
+    return names
+
+
+def shape(df) -> str:
+    """``scan``, ``top-n`` or ``query``: how a capped ``df`` is executed."""
+    plan = df._jdf.queryExecution().optimizedPlan()
+    if _logical_names(plan) <= _SCAN_NODES:
+        return "scan"
+    node = plan
+    while node.getClass().getSimpleName() in _PASS_THROUGH and node.children().size() == 1:
+        node = node.children().apply(0)
+    # ``Sort.global`` is a Python keyword as an attribute name.
+    if node.getClass().getSimpleName() == "Sort" and getattr(node, "global")():
+        return "top-n"
+    return "query"
+
+
+def stratified_sample(df, column: str, rows: int, seed: int = DEFAULT_SEED):
+    """About ``rows`` rows of ``df``, spread evenly over the values of ``column``."""
+    from pyspark.sql import Window
+    from pyspark.sql import functions as F
+
+    counts = {key: n for key, n in df.groupBy(column).count().collect() if key is not None}
+    if not counts:
+        return df.limit(rows)
+    share = max(1, rows // len(counts))
+    fractions = {key: min(1.0, share * OVERSAMPLE / n) for key, n in counts.items()}
+    ranked = Window.partitionBy(column).orderBy(F.rand(seed))
+    return (
+        df.sampleBy(column, fractions, seed)
+        .withColumn("__preview_rank", F.row_number().over(ranked))
+        .where(F.col("__preview_rank") <= share)
+        .drop("__preview_rank")
+        .limit(rows)
+    )
+
+
+@dataclass
+class Preview:
+    limit: int = DEFAULT_PREVIEW_ROWS
+    stratify: Optional[str] = None
+    seed: int = DEFAULT_SEED
+
+    def _stratum(self, df) -> Optional[str]:
+        if not self.stratify:
+            return None
+        for name in df.columns:
+            if name.lower() == self.stratify.lower():
+                return name
+        return None
+
+    def bound(self, df):
+        """``df`` capped to ``limit`` rows, or sampled when stratifying."""
+        column = self._stratum(df)
+        if column is not None:
+            return stratified_sample(df, column, self.limit, self.seed)
+        return df.limit(self.limit)
+
+    def collect(self, bounded, fetch: Callable[..., ColumnarResult] = fetch) -> ColumnarResult:
+        """Run a DataFrame returned by :meth:`bound`."""
+        kind = shape(bounded)
+        log.debug("preview runs as %s", kind)
+        if kind == "scan":
+            return ColumnarResult.from_rows(bounded.columns, bounded.collect())
+        return fetch(bounded)
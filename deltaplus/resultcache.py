@@ -0,0 +1,188 @@
+"""Disk-backed cache of query results, invalidated by source file changes.
+
+Re-running a lesson or a grading pass recomputes the same aggregates over
+the same unchanged Parquet files.  :class:`ResultCache` stores the
+:class:`~deltaplus.arrow.ColumnarResult` of a query under a key made of
+
+* the canonicalized analyzed plan (expression ids normalized, so the same
+  SQL text hits no matter which session analyzed it), and
+* the fingerprint ``(file, size, mtime_ns)`` of every input file
+  (``df.inputFiles()``)
+
+so rewriting, adding or removing a source file changes the key and the old
+entry is simply never hit again.  Only plans whose leaves are all file
+relations and that contain no non-deterministic function are cached; in
+memory data (``createDataFrame``) has no fingerprint.  Entries are evicted
+least recently used once the cache exceeds ``max_bytes``.
+
+Layout::
+
+    <root>/index.sqlite
+    <root>/<key[:2]>/<key>.pickle
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+from urllib.parse import unquote, urlparse
+
+from deltaplus import paths
+from deltaplus.arrow import ColumnarResult, fetch
+
+log = logging.getLogger(__name__)
+
+RESULT_CACHE_DIR = "dbfs:/deltaplus/cache/results"
+DEFAULT_MAX_BYTES = 512 << 20
+
+# Leaves whose data the input-file fingerprint covers.
+_FILE_LEAVES = {"LogicalRelation", "HiveTableRelation"}
+_NONDETERMINISTIC_RE = re.compile(
+    r"\b(rand|randn|uuid|shuffle|current_timestamp|current_date|now|localtimestamp|"
+    r"monotonically_increasing_id|spark_partition_id|input_file_name)\(",
+    re.I,
+)
+
+_INDEX_SQL = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY, bytes INTEGER NOT NULL, rows INTEGER NOT NULL,
+    created REAL NOT NULL, last_used REAL NOT NULL
+)
+"""
+
+
+def _local(uri: str) -> str:
+    return unquote(urlparse(uri).path) if uri.startswith("file:") else uri
+
+
+def _leaf_names(plan) -> set:
+    leaves = plan.collectLeaves()
+    return {leaves.apply(i).getClass().getSimpleName() for i in range(leaves.size())}
+
+
+class ResultCache:
+    def __init__(self, root: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = paths.resolve(root or RESULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(self.root, "index.sqlite"), check_same_thread=False, timeout=30
+        )
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_INDEX_SQL)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + ".pickle")
+
+    def key(self, df) -> Optional[str]:
+        """Cache key of ``df``, or None if its result cannot be cached."""
+        analyzed = df._jdf.queryExecution().analyzed()
+        if not _leaf_names(analyzed) <= _FILE_LEAVES:
+            return None
+        plan = analyzed.canonicalized().toString()
+        if _NONDETERMINISTIC_RE.search(plan):
+            return None
+        digest = hashlib.sha1(plan.encode("utf-8"))
+        for uri in sorted(df.inputFiles()):
+            try:
+                st = os.stat(_local(uri))
+            except OSError:
+                return None
+            digest.update(f"\0{uri}\0{st.st_size}\0{st.st_mtime_ns}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[ColumnarResult]:
+        try:
+            with open(self._entry_path(key), "rb") as fh:
+                result = pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return result
+
+    def put(self, key: str, result: ColumnarResult) -> None:
+        if result.arrow is None:
+            # Without Arrow the columns are the only copy of the data.
+            for i in range(len(result.columns)):
+                result.column(i)
+        target = self._entry_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump(result, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, target)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, os.path.getsize(target), len(result), now, now),
+            )
+        self.evict()
+
+    def fetch(self, df, limit: Optional[int] = None) -> ColumnarResult:
+        """:func:`deltaplus.arrow.fetch`, answered from the cache when possible."""
+        if limit is not None:
+            df = df.limit(limit)
+        key = self.key(df)
+        if key is not None:
+            cached = self.get(key)
+            if cached is not None:
+                self.hits += 1
+                cached.from_cache = True
+                return cached
+        self.misses += 1
+        result = fetch(df)
+        if key is not None:
+            self.put(key, result)
+        return result
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits ``max_bytes``."""
+        with self._lock:
+            total = self._conn.execute("SELECT coalesce(sum(bytes), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            victims = []
+            for key, size in self._conn.execute("SELECT key, bytes FROM entries ORDER BY last_used"):
+                if total <= self.max_bytes:
+                    break
+                victims.append(key)
+                total -= size
+            with self._conn:
+                self._conn.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in victims])
+        for key in victims:
+            try:
+                os.remove(self._entry_path(key))
+            except FileNotFoundError:
+                pass
+        log.debug("evicted %d cached results", len(victims))
+        return len(victims)
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            keys = [row[0] for row in self._conn.execute("SELECT key FROM entries")]
+            self._conn.execute("DELETE FROM entries")
+        for key in keys:
+            try:
+                os.remove(self._entry_path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT count(*), coalesce(sum(bytes), 0) FROM entries"
+            ).fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,190 @@
+"""Incrementally maintained monthly crime counts.
+
+``SELECT month, count(*) ... GROUP BY month`` over the homicide views
+re-reads every raw row on each call.  :class:`RollupStore` keeps counts per
+``(city, month, offense_category)`` instead, and maintains them per source
+file: each raw data file contributes a small partial aggregate tagged with
+its path, so when files land, change or disappear only those files are read
+and their partials replaced.  The by-month queries then aggregate a few
+hundred partial rows instead of the raw data.
+
+Layout under the store root::
+
+    <root>/partials/<CityKey>/part-*.parquet   (source_file, month, offense_category, crimes)
+    <root>/_rollup_state.json                  per-city {file: [size, mtime_ns]}
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+from deltaplus import paths
+from deltaplus.cities import HOMICIDE, CitySpec, get_cities
+from deltaplus.fingerprints import fingerprint
+from deltaplus.fsutil import swap_directory, write_json_atomic
+
+log = logging.getLogger(__name__)
+
+ROLLUP_DIR = "dbfs:/deltaplus/rollup"
+STATE_FILE = "_rollup_state.json"
+ROLLUP_VIEW = "MonthlyRollup"
+BY_MONTH_VIEW = "HomicidesByMonth"
+PARTIAL_SCHEMA = "source_file string, month int, offense_category string, crimes bigint"
+
+
+@dataclass
+class RollupRefresh:
+    updated: Dict[str, int] = field(default_factory=dict)  # city -> files re-aggregated
+    removed: Dict[str, int] = field(default_factory=dict)  # city -> files dropped
+    unchanged: List[str] = field(default_factory=list)
+    wall_time_s: float = 0.0
+
+
+def _source_base(spec: CitySpec) -> str:
+    """Directory that fingerprint paths of ``spec`` are relative to."""
+    local = spec.local_path
+    return os.path.dirname(local) if os.path.isfile(local) else local
+
+
+def _relative_source(uri: str, base: str) -> str:
+    return os.path.relpath(unquote(urlparse(uri).path), base)
+
+
+class RollupStore:
+    def __init__(self, spark, root: Optional[str] = None, cities: Optional[List[CitySpec]] = None):
+        self.spark = spark
+        self.root = paths.resolve(root or ROLLUP_DIR)
+        self.cities = cities if cities is not None else get_cities()
+
+    def partials_path(self, spec: CitySpec) -> str:
+        return os.path.join(self.root, "partials", spec.key)
+
+    def _state_path(self) -> str:
+        return os.path.join(self.root, STATE_FILE)
+
+    def load_state(self) -> Dict[str, Dict[str, List[int]]]:
+        try:
+            with open(self._state_path(), encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {}
+
+    def refresh(self) -> RollupRefresh:
+        """Bring every city's partials up to date with its source files."""
+        start = time.perf_counter()
+        result = RollupRefresh()
+        state = self.load_state()
+        for spec in self.cities:
+            current = {rel: [size, mtime] for rel, size, mtime in fingerprint(spec.local_path)}
+            known = state.get(spec.key, {})
+            if not os.path.isdir(self.partials_path(spec)):
+                known = {}
+            changed = sorted(rel for rel, fp in current.items() if known.get(rel) != fp)
+            removed = sorted(rel for rel in known if rel not in current)
+            if not changed and not removed:
+                result.unchanged.append(spec.key)
+                continue
+            self._update_city(spec, changed, removed, bool(known))
+            state[spec.key] = current
+            write_json_atomic(self._state_path(), state)
+            result.updated[spec.key] = len(changed)
+            if removed:
+                result.removed[spec.key] = len(removed)
+        result.wall_time_s = time.perf_counter() - start
+        return result
+
+    def _update_city(self, spec: CitySpec, changed: List[str], removed: List[str], existing: bool) -> None:
+        from pyspark.sql import functions as F
+
+        base = _source_base(spec)
+        log.info("rollup %s: %d new/changed files, %d removed", spec.name, len(changed), len(removed))
+        parts = []
+        if changed:
+            raw = self.spark.read.parquet(*[os.path.join(base, rel) for rel in changed])
+            # One job aggregates all new files; the per-file result is a few
+            # rows per file, so paths are made relative on the driver.
+            aggregated = (
+                spec.normalize(self.spark, raw)
+                .withColumn("source_uri", F.input_file_name())
+                .groupBy("source_uri", "month", "offense_category")
+                .agg(F.count(F.lit(1)).alias("crimes"))
+                .collect()
+            )
+            rows = [
+                (_relative_source(r.source_uri, base), r.month, r.offense_category, r.crimes)
+                for r in aggregated
+            ]
+            parts.append(self.spark.createDataFrame(rows, PARTIAL_SCHEMA))
+        if existing:
+            stale = changed + removed
+            parts.append(
+                self.spark.read.parquet(self.partials_path(spec))
+                .where(~F.col("source_file").isin(stale))
+                .select("source_file", "month", "offense_category", "crimes")
+            )
+        target = self.partials_path(spec)
+        staging = target + ".staging"
+        shutil.rmtree(staging, ignore_errors=True)
+        if parts:
+            combined = parts[0] if len(parts) == 1 else parts[0].unionByName(parts[1])
+            combined.coalesce(1).write.mode("overwrite").parquet(staging)
+            swap_directory(staging, target)
+
+    def read(self):
+        """Counts per ``(city, month, offense_category)``."""
+        from functools import reduce
+
+        from pyspark.sql import functions as F
+
+        frames = [
+            self.spark.read.parquet(self.partials_path(spec)).select(
+                F.lit(spec.name).alias("city"), "month", "offense_category", "crimes"
+            )
+            for spec in self.cities
+            if os.path.isdir(self.partials_path(spec))
+        ]
+        if not frames:
+            raise FileNotFoundError(f"no rollup partials under {self.root}; run refresh() first")
+        return (
+            reduce(lambda a, b: a.unionByName(b), frames)
+            .groupBy("city", "month", "offense_category")
+            .agg(F.sum("crimes").alias("crimes"))
+        )
+
+    def homicides_by_month(self, city_keys: Optional[List[str]] = None):
+        """``(month, homicides)`` sorted by month, answered from the rollup."""
+        from pyspark.sql import functions as F
+
+        df = self.read().where(F.col("offense_category") == HOMICIDE)
+        if city_keys:
+            names = [spec.name for spec in self.cities if spec.key in city_keys]
+            df = df.where(F.col("city").isin(names))
+        return (
+            df.groupBy("month")
+            .agg(F.sum("crimes").cast("long").alias("homicides"))
+            .orderBy("month")
+        )
+
+    def register_views(self, cache: bool = True) -> List[str]:
+        """Register ``MonthlyRollup`` and a rollup-backed ``HomicidesByMonth``.
+
+        With ``cache`` the (tiny) rollup is pinned in memory, so repeated
+        dashboard queries do not touch the file system at all.
+        """
+        rollup = self.read()
+        if cache:
+            rollup = rollup.cache()
+        rollup.createOrReplaceTempView(ROLLUP_VIEW)
+        self.spark.sql(
+            f"CREATE OR REPLACE TEMPORARY VIEW {BY_MONTH_VIEW} AS "
+            f"SELECT month, CAST(sum(crimes) AS BIGINT) AS homicides FROM {ROLLUP_VIEW} "
+            f"WHERE offense_category = '{HOMICIDE}' GROUP BY month ORDER BY month"
+        )
+        return [ROLLUP_VIEW, BY_MONTH_VIEW]
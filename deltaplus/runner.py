@@ -0,0 +1,329 @@
+"""Headless execution of Databricks-format notebooks against local Spark.
+
+Every executable cell runs under its own Spark job group so that, besides the
+wall time, the runner can report how many Spark jobs a cell triggered and how
+many rows it produced (rows returned to the notebook for ``%sql`` queries,
+entries listed for ``%fs ls``).  With ``instrument=True`` every ``%sql``
+query additionally records its physical plan and scan metrics (see
+:mod:`deltaplus.plans`).  Query results are fetched as Arrow batches (see
+:mod:`deltaplus.arrow`); only their row count is kept.  With a
+:class:`~deltaplus.resultcache.ResultCache`, results of queries over
+unchanged files are served from disk (and instrumented as cache hits,
+without plan metrics).  With a
+:class:`~deltaplus.preview.Preview`, queries are capped (or sampled) by its
+policy instead of the plain display limit.  With ``stage_metrics=True`` each
+cell also records the bytes its Spark stages read and their peak execution
+memory (see :mod:`deltaplus.history`).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from deltaplus import footers, paths, plans
+from deltaplus.arrow import fetch
+from deltaplus.classroom import CONTEXT_KEY, NOTEBOOK_KEY, db_test
+from deltaplus.jobs import JobGroup
+from deltaplus.notebook import Cell, Notebook
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DISPLAY_LIMIT = 1000
+
+_QUERY_RE = re.compile(r"^\s*(SELECT|WITH|TABLE|VALUES|FROM|SHOW|DESCRIBE|DESC|EXPLAIN)\b", re.I)
+_LINE_COMMENT_RE = re.compile(r"--[^\n]*")
+
+
+@dataclass
+class CellResult:
+    notebook: str
+    index: int
+    kind: str
+    line: int
+    status: str  # "ok", "error" or "skipped"
+    wall_time_s: float = 0.0
+    jobs: int = 0
+    rows: Optional[int] = None
+    # Spark stage metrics, only recorded with ``stage_metrics=True``.
+    input_bytes: Optional[int] = None
+    peak_memory: Optional[int] = None
+    error: Optional[str] = None
+    queries: List[plans.QueryMetrics] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        payload = asdict(self)
+        payload["queries"] = [q.to_dict() for q in self.queries]
+        return payload
+
+
+@dataclass
+class RunReport:
+    notebook: str
+    cells: List[CellResult] = field(default_factory=list)
+    started_at: float = 0.0
+    wall_time_s: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(c.status != "error" for c in self.cells)
+
+    @property
+    def total_jobs(self) -> int:
+        return sum(c.jobs for c in self.cells if c.kind != "run")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "notebook": self.notebook,
+            "started_at": self.started_at,
+            "wall_time_s": self.wall_time_s,
+            "ok": self.ok,
+            "total_jobs": self.total_jobs,
+            "cells": [c.to_dict() for c in self.cells],
+        }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def summary(self) -> str:
+        lines = [
+            f"{os.path.basename(self.notebook)}: {len(self.cells)} cells, "
+            f"{self.total_jobs} jobs, {self.wall_time_s:.3f}s",
+            f"{'cell':>5} {'line':>5} {'kind':<8} {'status':<8} {'time_s':>9} {'jobs':>5} {'rows':>8}",
+        ]
+        for c in self.cells:
+            rows = "" if c.rows is None else str(c.rows)
+            lines.append(
+                f"{c.index:>5} {c.line:>5} {c.kind:<8} {c.status:<8} "
+                f"{c.wall_time_s:>9.3f} {c.jobs:>5} {rows:>8}"
+            )
+            if c.error:
+                lines.append(f"{'':>12}{c.error.splitlines()[0]}")
+            for query in c.queries:
+                lines += [f"{'':>12}{line}" for line in query.summary().splitlines()]
+        return "\n".join(lines)
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a ``%sql`` cell into statements on top-level semicolons."""
+    statements, current, quote = [], [], None
+    i = 0
+    while i < len(sql):
+        ch = sql[i]
+        if quote:
+            current.append(ch)
+            if ch == quote:
+                quote = None
+        elif ch in "'\"`":
+            quote = ch
+            current.append(ch)
+        elif ch == "-" and sql.startswith("--", i):
+            end = sql.find("\n", i)
+            end = len(sql) if end == -1 else end
+            current.append(sql[i:end])
+            i = end
+            continue
+        elif ch == ";":
+            statements.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    statements.append("".join(current))
+    return [s for s in statements if _LINE_COMMENT_RE.sub("", s).strip()]
+
+
+def is_query(statement: str) -> bool:
+    return bool(_QUERY_RE.match(_LINE_COMMENT_RE.sub("", statement)))
+
+
+class NotebookRunner:
+    """Execute notebooks cell by cell and collect per-cell metrics.
+
+    Python cells share one namespace across the whole run (including notebooks
+    pulled in via ``%run``), pre-populated with ``spark``, ``sc``, ``dbTest``
+    and ``display`` as on Databricks, plus ``fetch`` for columnar results.
+    Once ``Includes/Classroom-Setup`` has run, SQL is routed through its
+    classroom context so lazily registered views are created on first
+    reference and created artifacts are recorded for cleanup.
+    """
+
+    def __init__(
+        self,
+        spark=None,
+        *,
+        display_limit: int = DEFAULT_DISPLAY_LIMIT,
+        continue_on_error: bool = False,
+        namespace: Optional[Dict[str, Any]] = None,
+        instrument: bool = False,
+        result_cache=None,
+        preview=None,
+        stage_metrics: bool = False,
+    ):
+        if spark is None:
+            from deltaplus.session import get_spark
+
+            spark = get_spark()
+        self.spark = spark
+        self.display_limit = display_limit
+        self.continue_on_error = continue_on_error
+        self.instrument = instrument
+        self.result_cache = result_cache
+        self.preview = preview
+        self.stage_metrics = stage_metrics
+        self._fetch = result_cache.fetch if result_cache is not None else fetch
+        # Per thread, so cells can run concurrently (see deltaplus.dag).
+        self._local = threading.local()
+        self.namespace: Dict[str, Any] = {
+            "spark": spark,
+            "sc": spark.sparkContext,
+            "dbTest": db_test,
+            "display": self._display,
+            "fetch": self._fetch,
+            "displayHTML": lambda html: None,
+        }
+        if namespace:
+            self.namespace.update(namespace)
+
+    def run(self, path: str) -> RunReport:
+        notebook = Notebook.load(path)
+        report = RunReport(notebook=path, started_at=time.time())
+        self.namespace[NOTEBOOK_KEY] = os.path.abspath(path)
+        start = time.perf_counter()
+        self._run_notebook(notebook, report)
+        report.wall_time_s = time.perf_counter() - start
+        return report
+
+    def _run_notebook(self, notebook: Notebook, report: RunReport) -> bool:
+        for cell in notebook:
+            if cell.is_markdown:
+                continue
+            if cell.kind == "run":
+                ok = self._run_include(notebook, cell, report)
+            else:
+                result = self._run_cell(notebook, cell)
+                report.cells.append(result)
+                ok = result.status != "error"
+            if not ok and not self.continue_on_error:
+                return False
+        return True
+
+    def _run_include(self, notebook: Notebook, cell: Cell, report: RunReport) -> bool:
+        target = notebook.resolve_run_target(cell)
+        result = CellResult(notebook.path, cell.index, cell.kind, cell.line, "ok")
+        report.cells.append(result)
+        if target is None or not os.path.exists(target):
+            result.status = "skipped"
+            result.error = f"%run target not found: {cell.run_target}"
+            log.warning(result.error)
+            return True
+        first = len(report.cells)
+        start = time.perf_counter()
+        ok = self._run_notebook(Notebook.load(target), report)
+        result.wall_time_s = time.perf_counter() - start
+        nested = report.cells[first:]
+        result.jobs = sum(c.jobs for c in nested if c.kind != "run")
+        if not ok:
+            result.status = "error"
+            result.error = f"error in {os.path.basename(target)}"
+        return ok
+
+    def _run_cell(self, notebook: Notebook, cell: Cell) -> CellResult:
+        result = CellResult(notebook.path, cell.index, cell.kind, cell.line, "ok")
+        handler = getattr(self, "_exec_" + cell.kind.replace("-", "_"), None)
+        if handler is None:
+            result.status = "skipped"
+            result.error = f"unsupported cell kind %{cell.kind}"
+            return result
+
+        group = JobGroup(self.spark.sparkContext, f"{notebook.name} cell {cell.index}")
+        self._local.queries = []
+        start = time.perf_counter()
+        with group:
+            try:
+                result.rows = handler(notebook, cell)
+            except Exception as exc:  # noqa: BLE001 - reported per cell
+                result.status = "error"
+                result.error = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+                log.debug("cell %s failed", cell.index, exc_info=True)
+        result.wall_time_s = time.perf_counter() - start
+        result.jobs = group.jobs
+        result.queries = self._local.queries
+        if self.stage_metrics and group.job_ids:
+            totals = plans.stage_totals(self.spark.sparkContext, group.job_ids)
+            if totals is not None:
+                result.input_bytes = totals["input_bytes"]
+                result.peak_memory = totals["peak_execution_memory"]
+        return result
+
+    def _exec_sql(self, notebook: Notebook, cell: Cell) -> Optional[int]:
+        rows = None
+        classroom = self.namespace.get(CONTEXT_KEY)
+        for statement in split_statements(cell.source):
+            if classroom is not None:
+                statement = classroom.redirect(statement)
+            statement = self._prepare_sql(paths.rewrite_sql_paths(statement))
+            if classroom is not None:
+                classroom.before_sql(statement)
+            df = self.spark.sql(statement)
+            if classroom is not None:
+                classroom.record_sql(statement)
+            if is_query(statement):
+                rows = self._show(df, statement)
+        return rows
+
+    def _prepare_sql(self, statement: str) -> str:
+        return footers.with_cached_schema(self.spark, statement)
+
+    def _show(self, df: Any, statement: str) -> int:
+        # ``take`` is ``limit(n).collect()``; running that DataFrame directly
+        # keeps hold of the executed plan the metrics are read from.
+        shown = self._bound(df)
+        if not self.instrument:
+            return len(self._collect(shown))
+        sc = self.spark.sparkContext
+        group_id = sc.getLocalProperty("spark.jobGroup.id")
+        before = set(sc.statusTracker().getJobIdsForGroup(group_id))
+        result = self._collect(shown)
+        jobs = sorted(set(sc.statusTracker().getJobIdsForGroup(group_id)) - before)
+        if result.from_cache:
+            # ``shown`` never ran; its plan holds no metrics.
+            self._local.queries.append(plans.QueryMetrics(statement, plan="", jobs=jobs, cached=True))
+        else:
+            self._local.queries.append(plans.inspect(self.spark, shown, statement, jobs))
+        return len(result)
+
+    def _bound(self, df: Any) -> Any:
+        if self.preview is not None:
+            return self.preview.bound(df)
+        return df.limit(self.display_limit)
+
+    def _collect(self, shown: Any):
+        if self.preview is not None:
+            return self.preview.collect(shown, self._fetch)
+        return self._fetch(shown)
+
+    def _exec_python(self, notebook: Notebook, cell: Cell) -> None:
+        classroom = self.namespace.get(CONTEXT_KEY)
+        if classroom is not None:
+            classroom.before_sql(cell.source)
+        code = compile(cell.source, f"{notebook.path}:{cell.line}", "exec")
+        exec(code, self.namespace)
+
+    def _exec_fs(self, notebook: Notebook, cell: Cell) -> int:
+        parts = cell.source.split()
+        if not parts or parts[0] != "ls":
+            raise NotImplementedError(f"%fs {cell.source!r}")
+        target = paths.resolve(parts[1] if len(parts) > 1 else "/")
+        return len(os.listdir(target))
+
+    def _display(self, df: Any) -> None:
+        if hasattr(df, "limit"):
+            self._collect(self._bound(df))
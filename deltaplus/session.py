@@ -0,0 +1,83 @@
+"""Construction and reuse of the SparkSession used by the runner.
+
+Session startup (JVM launch, first-job class loading and code generation)
+dominates short lesson runs, so :func:`get_spark` keeps one session per
+process (shared by every notebook and ``%run`` include of a run), and
+:func:`warm_up` pays the first-job cost in the background while the notebook
+is still being parsed.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Dict, Optional
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MASTER = "local[*]"
+DEFAULT_APP_NAME = "deltaplus"
+
+# Small lesson datasets: the default of 200 shuffle partitions mostly
+# measures task scheduling, not the query.
+DEFAULT_CONF: Dict[str, str] = {
+    "spark.sql.shuffle.partitions": "8",
+    "spark.ui.showConsoleProgress": "false",
+    "spark.sql.session.timeZone": "UTC",
+}
+
+_lock = threading.Lock()
+_session = None
+_warm: Optional[threading.Thread] = None
+
+
+def get_spark(
+    master: str = DEFAULT_MASTER,
+    app_name: str = DEFAULT_APP_NAME,
+    conf: Optional[Dict[str, str]] = None,
+):
+    """Return the process-wide SparkSession, creating it on first use."""
+    global _session
+    with _lock:
+        if _session is not None and not _is_stopped(_session):
+            return _session
+        from pyspark.sql import SparkSession
+
+        builder = SparkSession.builder.master(master).appName(app_name)
+        for key, value in {**DEFAULT_CONF, **(conf or {})}.items():
+            builder = builder.config(key, value)
+        _session = builder.getOrCreate()
+        return _session
+
+
+def _is_stopped(spark) -> bool:
+    return spark.sparkContext._jsc is None
+
+
+def warm_up(spark, background: bool = True) -> Optional[threading.Thread]:
+    """Run a trivial job so the first real query skips one-time JVM costs."""
+    global _warm
+
+    def _run() -> None:
+        try:
+            spark.range(1).selectExpr("count(*)").collect()
+        except Exception:  # noqa: BLE001 - warm-up is best effort
+            log.debug("warm-up job failed", exc_info=True)
+
+    with _lock:
+        if _warm is not None:
+            return _warm
+        _warm = threading.Thread(target=_run, name="deltaplus-warm-up", daemon=True)
+    if background:
+        _warm.start()
+    else:
+        _warm.run()
+    return _warm
+
+
+def stop_spark() -> None:
+    global _session, _warm
+    with _lock:
+        if _session is not None:
+            _session.stop()
+        _session, _warm = None, None
@@ -0,0 +1,152 @@
+"""Continuously updated crime counts over a landing directory.
+
+The lesson loads the lake as static files, so refreshing ``HomicidesByMonth``
+after new data arrives means re-running everything.  :class:`CrimeStream`
+runs one Structured Streaming query instead: each city's landing directory
+is a file stream in the city's raw schema, normalized with the same
+:class:`~deltaplus.cities.CitySpec` rules as the batch views and aggregated
+to ``(city, month, offense_category) -> crimes``.  The aggregation state
+lives in the checkpoint, so a new file costs one micro-batch over that file,
+and a restarted stream resumes from where it stopped.
+
+Every micro-batch publishes the full (small) aggregate:
+
+* as Parquet under ``<root>/counts`` (swapped in atomically), for other
+  processes and restarts
+* as ``global_temp.StreamingCrimeCounts``, with
+  ``global_temp.StreamingHomicidesByMonth`` on top, for queries in this
+  application
+
+Layout::
+
+    <landing>/<CityKey>/*.parquet   new files, moved into place complete
+    <root>/counts/part-*.parquet
+    <root>/_checkpoint/
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+from functools import reduce
+from typing import List, Optional
+
+from deltaplus import paths
+from deltaplus.cities import HOMICIDE, CitySpec, get_cities
+from deltaplus.classroom import GLOBAL_DB
+from deltaplus.fingerprints import fingerprint
+from deltaplus.fsutil import swap_directory
+
+log = logging.getLogger(__name__)
+
+LANDING_DIR = "dbfs:/deltaplus/landing"
+STREAM_DIR = "dbfs:/deltaplus/stream"
+COUNTS_VIEW = "StreamingCrimeCounts"
+BY_MONTH_VIEW = "StreamingHomicidesByMonth"
+COUNTS_SCHEMA = "city string, month int, offense_category string, crimes bigint"
+QUERY_NAME = "deltaplus-crime-counts"
+DEFAULT_TRIGGER = "2 seconds"
+
+
+class CrimeStream:
+    def __init__(
+        self,
+        spark,
+        landing: Optional[str] = None,
+        root: Optional[str] = None,
+        cities: Optional[List[CitySpec]] = None,
+        max_files_per_trigger: Optional[int] = None,
+    ):
+        self.spark = spark
+        self.landing = paths.resolve(landing or LANDING_DIR)
+        self.root = paths.resolve(root or STREAM_DIR)
+        self.cities = cities if cities is not None else get_cities()
+        self.max_files_per_trigger = max_files_per_trigger
+
+    def landing_path(self, spec: CitySpec) -> str:
+        return os.path.join(self.landing, spec.key)
+
+    @property
+    def counts_path(self) -> str:
+        return os.path.join(self.root, "counts")
+
+    @property
+    def checkpoint_path(self) -> str:
+        return os.path.join(self.root, "_checkpoint")
+
+    def _schema(self, spec: CitySpec):
+        """The raw schema of ``spec``, from the lake or from landed files."""
+        for path in (spec.local_path, self.landing_path(spec)):
+            if os.path.exists(path) and fingerprint(path):
+                return self.spark.read.parquet(path).schema
+        raise FileNotFoundError(
+            f"no schema for {spec.key}: neither {spec.local_path} nor "
+            f"{self.landing_path(spec)} has Parquet files"
+        )
+
+    def counts_stream(self):
+        """Streaming ``(city, month, offense_category, crimes)`` over all cities."""
+        from pyspark.sql import functions as F
+
+        parts = []
+        for spec in self.cities:
+            os.makedirs(self.landing_path(spec), exist_ok=True)
+            reader = self.spark.readStream.schema(self._schema(spec))
+            if self.max_files_per_trigger:
+                reader = reader.option("maxFilesPerTrigger", self.max_files_per_trigger)
+            parts.append(spec.normalize(self.spark, reader.parquet(self.landing_path(spec))))
+        return (
+            reduce(lambda a, b: a.unionByName(b), parts)
+            .groupBy("city", "month", "offense_category")
+            .agg(F.count(F.lit(1)).alias("crimes"))
+        )
+
+    def _publish(self, batch, batch_id: int) -> None:
+        # Complete mode: every batch carries the whole aggregate, a few
+        # hundred rows, so it is collected once and published twice.
+        rows = [tuple(r) for r in batch.select("city", "month", "offense_category", "crimes").collect()]
+        counts = self.spark.createDataFrame(rows, COUNTS_SCHEMA)
+        staging = self.counts_path + ".staging"
+        shutil.rmtree(staging, ignore_errors=True)
+        counts.coalesce(1).write.mode("overwrite").parquet(staging)
+        swap_directory(staging, self.counts_path)
+        counts.createOrReplaceGlobalTempView(COUNTS_VIEW)
+        log.info("stream batch %d: %d count rows", batch_id, len(rows))
+
+    def register_views(self) -> List[str]:
+        """Register the global views from the last published counts."""
+        if os.path.isdir(self.counts_path):
+            rows = [tuple(r) for r in self.spark.read.parquet(self.counts_path).collect()]
+        else:
+            rows = []
+        self.spark.createDataFrame(rows, COUNTS_SCHEMA).createOrReplaceGlobalTempView(COUNTS_VIEW)
+        self.spark.sql(
+            f"CREATE OR REPLACE GLOBAL TEMP VIEW {BY_MONTH_VIEW} AS "
+            f"SELECT month, CAST(sum(crimes) AS BIGINT) AS homicides "
+            f"FROM {GLOBAL_DB}.{COUNTS_VIEW} WHERE offense_category = '{HOMICIDE}' "
+            f"GROUP BY month ORDER BY month"
+        )
+        return [f"{GLOBAL_DB}.{COUNTS_VIEW}", f"{GLOBAL_DB}.{BY_MONTH_VIEW}"]
+
+    def _writer(self):
+        return (
+            self.counts_stream()
+            .writeStream.queryName(QUERY_NAME)
+            .outputMode("complete")
+            .option("checkpointLocation", self.checkpoint_path)
+            .foreachBatch(self._publish)
+        )
+
+    def start(self, trigger: str = DEFAULT_TRIGGER):
+        """Start the stream, polling the landing directories every ``trigger``."""
+        self.register_views()
+        return self._writer().trigger(processingTime=trigger).start()
+
+    def run_once(self) -> None:
+        """Process every file landed since the last run, then stop."""
+        self.register_views()
+        self._writer().trigger(once=True).start().awaitTermination()
+
+    def homicides_by_month(self):
+        return self.spark.table(f"{GLOBAL_DB}.{BY_MONTH_VIEW}")
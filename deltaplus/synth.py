@@ -0,0 +1,215 @@
+"""Deterministic synthetic crime data in the lesson's per-city schemas.
+
+The real ``dbfs:/mnt/training/crime-data-2016`` lake is not reachable
+offline, so :func:`generate` writes look-alike files with the same column
+names, types and value quirks the notebook relies on:
+
+* New York: ``offenseDescription`` (upper case, homicides start with
+  ``MURDER`` or ``HOMICIDE``) and a ``reportDate`` timestamp
+* Boston: ``OFFENSE_CODE_GROUP`` (title case, ``Homicide``) and an integer
+  ``MONTH``
+* Chicago: ``primaryType`` (``HOMICIDE``) and a ``date`` timestamp
+
+At scale 1 the row and homicide counts reproduce every TEST-cell expectation
+of ``SSQL 06 - Data Lakes`` (267,872 Chicago rows, 1,203 homicides, the
+per-month counts); at scale ``k`` every count is multiplied by ``k``.  Output
+is a function of ``(scale, seed)`` only.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from deltaplus import paths
+from deltaplus.cities import CitySpec, get_cities
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SEED = 2016
+SYNTHETIC_DIR = "dbfs:/deltaplus/synthetic"
+MARKER_FILE = "_deltaplus_synthetic.json"
+SCALES = (1, 10, 100, 1000)
+
+# Homicides per month across New York, Boston and Chicago in the lesson.
+LESSON_HOMICIDES_BY_MONTH = (83, 68, 72, 76, 105, 120, 116, 144, 109, 109, 111, 90)
+CHICAGO_HOMICIDES_BY_MONTH = (54, 40, 44, 46, 66, 72, 71, 90, 66, 68, 70, 58)
+NEW_YORK_HOMICIDES_BY_MONTH = (20, 19, 19, 20, 26, 32, 30, 36, 29, 27, 27, 21)
+BOSTON_HOMICIDES_BY_MONTH = tuple(
+    total - chicago - new_york
+    for total, chicago, new_york in zip(
+        LESSON_HOMICIDES_BY_MONTH, CHICAGO_HOMICIDES_BY_MONTH, NEW_YORK_HOMICIDES_BY_MONTH
+    )
+)
+
+
+def _array(values: Sequence[str]) -> str:
+    return "array(" + ", ".join("'" + v.replace("'", "\\'") + "'" for v in values) + ")"
+
+
+def _pick(values: Sequence[str], salt: int) -> str:
+    """SQL choosing one of ``values`` deterministically per row."""
+    return f"element_at({_array(values)}, CAST(pmod(hash(id, {salt}), {len(values)}) AS INT) + 1)"
+
+
+def _timestamp(salt: int) -> str:
+    """SQL for a timestamp in 2016 within the row's ``month``.
+
+    Times fall between 07:00 and 17:00 UTC so ``month()`` gives the same
+    answer in any session time zone within seven hours of UTC.
+    """
+    first = "make_date(2016, month, 1)"
+    day = f"date_add({first}, CAST(pmod(hash(id, {salt}), day(last_day({first}))) AS INT))"
+    seconds = f"25200 + pmod(hash(id, {salt + 1}), 36000)"
+    return f"CAST(unix_timestamp({day}) + {seconds} AS TIMESTAMP)"
+
+
+def _new_york(df, seed: int):
+    homicide = _pick(["MURDER & NON-NEGL. MANSLAUGHTER", "HOMICIDE-NEGLIGENT,UNCLASSIFIE",
+                      "HOMICIDE-NEGLIGENT-VEHICLE"], seed + 10)
+    other = _pick(["PETIT LARCENY", "HARRASSMENT 2", "ASSAULT 3 & RELATED OFFENSES",
+                   "CRIMINAL MISCHIEF & RELATED OF", "GRAND LARCENY", "FELONY ASSAULT",
+                   "DANGEROUS DRUGS", "ROBBERY", "BURGLARY", "OFF. AGNST PUB ORD SENSBLTY &"],
+                  seed + 11)
+    return df.selectExpr(
+        "CAST(100000000 + id AS BIGINT) AS complaintNumber",
+        f"{_timestamp(seed + 12)} AS reportDate",
+        f"CAST(100 + pmod(hash(id, {seed + 13}), 600) AS INT) AS offenseCode",
+        f"CASE WHEN is_homicide THEN {homicide} ELSE {other} END AS offenseDescription",
+        f"CASE WHEN is_homicide THEN 'FELONY' "
+        f"ELSE {_pick(['MISDEMEANOR', 'FELONY', 'VIOLATION'], seed + 14)} END AS offenseLevel",
+        f"{_pick(['BROOKLYN', 'MANHATTAN', 'BRONX', 'QUEENS', 'STATEN ISLAND'], seed + 15)} AS boroughName",
+    )
+
+
+def _boston(df, seed: int):
+    other = _pick(["Motor Vehicle Accident Response", "Larceny", "Medical Assistance",
+                   "Investigate Person", "Other", "Drug Violation", "Simple Assault",
+                   "Vandalism", "Verbal Disputes", "Towed"], seed + 20)
+    return df.selectExpr(
+        "concat('I', lpad(CAST(id AS STRING), 9, '0')) AS INCIDENT_NUMBER",
+        f"CAST(CASE WHEN is_homicide THEN 111 ELSE 100 + pmod(hash(id, {seed + 21}), 3000) END AS INT) AS OFFENSE_CODE",
+        f"CASE WHEN is_homicide THEN 'Homicide' ELSE {other} END AS OFFENSE_CODE_GROUP",
+        f"{_pick(['B2', 'C11', 'D4', 'B3', 'A1', 'C6', 'D14', 'E13'], seed + 22)} AS DISTRICT",
+        f"{_timestamp(seed + 23)} AS OCCURRED_ON_DATE",
+        "2016 AS YEAR",
+        "CAST(month AS INT) AS MONTH",
+        f"CAST(pmod(hash(id, {seed + 25}), 24) AS INT) AS HOUR",
+    )
+
+
+def _chicago(df, seed: int):
+    other = _pick(["THEFT", "BATTERY", "CRIMINAL DAMAGE", "ASSAULT", "DECEPTIVE PRACTICE",
+                   "OTHER OFFENSE", "BURGLARY", "NARCOTICS", "ROBBERY", "MOTOR VEHICLE THEFT"],
+                  seed + 30)
+    return df.selectExpr(
+        "CAST(10000000 + id AS BIGINT) AS id",
+        "concat('HZ', lpad(CAST(id AS STRING), 6, '0')) AS caseNumber",
+        f"{_timestamp(seed + 31)} AS date",
+        f"concat(lpad(CAST(pmod(hash(id, {seed + 32}), 120) AS STRING), 3, '0'), 'XX W MADISON ST') AS block",
+        f"CASE WHEN is_homicide THEN 'HOMICIDE' ELSE {other} END AS primaryType",
+        "CASE WHEN is_homicide THEN 'FIRST DEGREE MURDER' ELSE 'SIMPLE' END AS description",
+        f"pmod(hash(id, {seed + 33}), 5) = 0 AS arrest",
+        f"CAST(1 + pmod(hash(id, {seed + 34}), 25) AS INT) AS district",
+        "2016 AS year",
+    )
+
+
+@dataclass(frozen=True)
+class CityProfile:
+    key: str
+    rows: int
+    homicides_by_month: Sequence[int]
+    build: Callable
+
+    def dataframe(self, spark, scale: int = 1, seed: int = DEFAULT_SEED):
+        """Rows for this city at ``scale``, in a deterministic shuffled order."""
+        from pyspark.sql import functions as F
+
+        bounds, total = [], 0
+        for count in self.homicides_by_month:
+            total += count * scale
+            bounds.append(total)
+        month_case = "CASE " + " ".join(
+            f"WHEN id < {bound} THEN {m}" for m, bound in enumerate(bounds, start=1)
+        ) + " END"
+        base = spark.range(self.rows * scale).selectExpr(
+            "id",
+            f"id < {total} AS is_homicide",
+            f"CASE WHEN id < {total} THEN {month_case} "
+            f"ELSE CAST(pmod(hash(id, {seed}), 12) AS INT) + 1 END AS month",
+        )
+        # Homicides take the lowest ids; sort by a hash so they are spread
+        # over the file like in the real data.
+        return self.build(base.orderBy(F.hash("id", F.lit(seed))), seed)
+
+
+PROFILES: Dict[str, CityProfile] = {
+    "NewYork": CityProfile("NewYork", 478_216, NEW_YORK_HOMICIDES_BY_MONTH, _new_york),
+    "Boston": CityProfile("Boston", 99_114, BOSTON_HOMICIDES_BY_MONTH, _boston),
+    "Chicago": CityProfile("Chicago", 267_872, CHICAGO_HOMICIDES_BY_MONTH, _chicago),
+}
+
+
+def scale_root(scale: int, root: Optional[str] = None) -> str:
+    """Directory standing in for ``crime-data-2016`` at ``scale``."""
+    return os.path.join(paths.resolve(root or SYNTHETIC_DIR), f"x{scale}", "crime-data-2016")
+
+
+def scaled_cities(
+    scale: int,
+    root: Optional[str] = None,
+    keys: Optional[List[str]] = None,
+    directory: Optional[str] = None,
+) -> List[CitySpec]:
+    """City specs pointing at the synthetic files for ``scale``.
+
+    ``directory`` overrides the location, e.g. ``paths.CRIME_DATA_DIR`` to
+    stand in for the lesson mount itself.
+    """
+    from dataclasses import replace
+
+    directory = paths.resolve(directory) if directory else scale_root(scale, root)
+    return [
+        replace(spec, path=os.path.join(directory, os.path.basename(spec.path)))
+        for spec in get_cities(keys)
+        if spec.key in PROFILES
+    ]
+
+
+def generate(
+    spark,
+    scale: int = 1,
+    root: Optional[str] = None,
+    seed: int = DEFAULT_SEED,
+    keys: Optional[List[str]] = None,
+    overwrite: bool = False,
+    directory: Optional[str] = None,
+) -> List[CitySpec]:
+    """Write the synthetic files for ``scale`` (skipped if already present)."""
+    directory = paths.resolve(directory) if directory else scale_root(scale, root)
+    marker = os.path.join(directory, MARKER_FILE)
+    wanted = {"scale": scale, "seed": seed}
+    try:
+        with open(marker, encoding="utf-8") as fh:
+            existing = json.load(fh)
+    except FileNotFoundError:
+        existing = {}
+    specs = scaled_cities(scale, root, keys, directory)
+    for spec in specs:
+        done = existing.get("cities", {}).get(spec.key) == wanted
+        if done and not overwrite and os.path.exists(spec.local_path):
+            continue
+        log.info("generating %s at scale %d", spec.name, scale)
+        profile = PROFILES[spec.key]
+        shutil.rmtree(spec.local_path, ignore_errors=True)
+        profile.dataframe(spark, scale, seed).write.mode("overwrite").parquet(spec.local_path)
+        existing.setdefault("cities", {})[spec.key] = wanted
+        os.makedirs(directory, exist_ok=True)
+        with open(marker, "w", encoding="utf-8") as fh:
+            json.dump(existing, fh, indent=2)
+    return specs
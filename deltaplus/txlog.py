@@ -0,0 +1,505 @@
+"""File-based transaction log for the normalized crime tables.
+
+Views over raw Parquet paths give no atomic updates (a reader can see half
+of an overwrite), no snapshot isolation and a directory listing on every
+read.  :class:`LogTable` keeps a table as immutable Parquet files plus an
+ordered log of commits, each a JSON-lines file of actions:
+
+* ``commitInfo`` -- operation, parameters, timestamp, read version
+* ``metaData`` -- the table schema
+* ``add`` -- a data file with its size, row count and per-column
+  ``[min, max, nulls]`` statistics, used to skip files on read
+* ``remove`` -- a data file that is no longer part of the table
+
+Version ``N`` is the state after replaying commits ``0..N``.  Commits are
+published with ``os.link`` from a complete temporary file, which fails if
+the version already exists, so concurrent writers never overwrite each
+other (optimistic concurrency): the loser re-reads the log, rebases and
+retries at the next version.  Appends always rebase; an overwrite replaces
+whatever the table holds when it commits; a compaction whose input files
+were removed by a concurrent commit fails with
+:class:`ConcurrentModificationError`.
+
+Every ``CHECKPOINT_INTERVAL`` versions the full state is written to a
+checkpoint and ``_last_checkpoint`` points at it, so loading the latest
+snapshot reads the checkpoint plus at most a few commits.  Older versions
+stay readable (time travel by version or timestamp) until :meth:`vacuum`
+deletes the files only they reference.
+
+Layout::
+
+    <root>/<uuid>-part-*.parquet
+    <root>/_log/<version:020d>.json
+    <root>/_log/<version:020d>.checkpoint.json
+    <root>/_log/_last_checkpoint
+    <root>/_staging/<uuid>/            writes in progress
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from deltaplus import paths
+from deltaplus.fsutil import write_json_atomic
+
+log = logging.getLogger(__name__)
+
+TABLES_DIR = "dbfs:/deltaplus/tables"
+LOG_DIR = "_log"
+STAGING_DIR = "_staging"
+LAST_CHECKPOINT = "_last_checkpoint"
+CHECKPOINT_INTERVAL = 10
+MAX_COMMIT_ATTEMPTS = 50
+DEFAULT_TARGET_FILE_BYTES = 128 << 20
+DEFAULT_RETENTION_HOURS = 168.0
+
+# Column types that get min/max statistics.
+_STATS_TYPES = {
+    "tinyint", "smallint", "int", "bigint", "float", "double", "string", "date", "timestamp",
+}
+
+
+class ConcurrentModificationError(RuntimeError):
+    """A concurrent commit invalidated the files this commit depends on."""
+
+
+@dataclass
+class AddFile:
+    path: str  # relative to the table root
+    size: int
+    rows: int
+    stats: Dict[str, List[Any]] = field(default_factory=dict)  # column -> [min, max, nulls]
+    modification_time: float = 0.0
+
+    def may_contain(self, column: str, value: Any) -> bool:
+        """False only if the statistics prove no row has ``column`` in ``value``.
+
+        ``value`` is a literal (equality) or a ``(low, high)`` range, either
+        bound None for open.
+        """
+        entry = self.stats.get(column.lower())
+        if entry is None or entry[0] is None or entry[1] is None:
+            return True
+        low, high = (value if isinstance(value, tuple) else (value, value))
+        try:
+            if low is not None and entry[1] < _stat_value(low):
+                return False
+            if high is not None and entry[0] > _stat_value(high):
+                return False
+        except TypeError:
+            return True
+        return True
+
+
+def _stat_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if hasattr(value, "isoformat"):
+        return value.isoformat(sep=" ") if hasattr(value, "hour") else value.isoformat()
+    return str(value)
+
+
+@dataclass
+class Snapshot:
+    version: int = -1
+    timestamp: float = 0.0
+    schema: Optional[str] = None  # StructType JSON
+    files: Dict[str, AddFile] = field(default_factory=dict)
+
+    @property
+    def rows(self) -> int:
+        return sum(f.rows for f in self.files.values())
+
+    @property
+    def bytes(self) -> int:
+        return sum(f.size for f in self.files.values())
+
+    def apply(self, version: int, actions: List[Dict[str, Any]]) -> "Snapshot":
+        """The snapshot after committing ``actions`` as ``version``."""
+        files = dict(self.files)
+        result = Snapshot(version, self.timestamp, self.schema, files)
+        for action in actions:
+            if "commitInfo" in action:
+                result.timestamp = action["commitInfo"]["timestamp"]
+            elif "metaData" in action:
+                result.schema = action["metaData"]["schema"]
+            elif "add" in action:
+                add = AddFile(**action["add"])
+                files[add.path] = add
+            elif "remove" in action:
+                files.pop(action["remove"]["path"], None)
+        return result
+
+    def select(self, where: Optional[Dict[str, Any]] = None) -> List[AddFile]:
+        """Files that may hold rows matching every ``column -> value`` in ``where``."""
+        return [
+            f for _, f in sorted(self.files.items())
+            if all(f.may_contain(c, v) for c, v in (where or {}).items())
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "timestamp": self.timestamp,
+            "schema": self.schema,
+            "files": [asdict(f) for _, f in sorted(self.files.items())],
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "Snapshot":
+        files = {f["path"]: AddFile(**f) for f in payload["files"]}
+        return cls(payload["version"], payload["timestamp"], payload["schema"], files)
+
+
+@dataclass
+class CommitResult:
+    version: int
+    added: int = 0
+    removed: int = 0
+    attempts: int = 1
+    wall_time_s: float = 0.0
+
+
+class LogTable:
+    def __init__(self, root: str, checkpoint_interval: int = CHECKPOINT_INTERVAL):
+        self.root = paths.resolve(root)
+        self.checkpoint_interval = checkpoint_interval
+
+    @classmethod
+    def named(cls, name: str, **kwargs) -> "LogTable":
+        return cls(os.path.join(TABLES_DIR, name), **kwargs)
+
+    @property
+    def log_dir(self) -> str:
+        return os.path.join(self.root, LOG_DIR)
+
+    def _commit_path(self, version: int) -> str:
+        return os.path.join(self.log_dir, f"{version:020d}.json")
+
+    def _checkpoint_path(self, version: int) -> str:
+        return os.path.join(self.log_dir, f"{version:020d}.checkpoint.json")
+
+    # -- reading the log -------------------------------------------------
+
+    def _read_commit(self, version: int) -> List[Dict[str, Any]]:
+        with open(self._commit_path(version), encoding="utf-8") as fh:
+            return [json.loads(line) for line in fh if line.strip()]
+
+    def _last_checkpoint(self) -> Optional[int]:
+        try:
+            with open(os.path.join(self.log_dir, LAST_CHECKPOINT), encoding="utf-8") as fh:
+                return json.load(fh)["version"]
+        except FileNotFoundError:
+            return None
+
+    def _checkpoint_before(self, version: int) -> Optional[int]:
+        last = self._last_checkpoint()
+        if last is not None and last <= version:
+            return last
+        # Time travel behind the last checkpoint: list the log once.
+        found = [
+            int(name.split(".", 1)[0]) for name in os.listdir(self.log_dir)
+            if name.endswith(".checkpoint.json")
+        ] if os.path.isdir(self.log_dir) else []
+        return max((v for v in found if v <= version), default=None)
+
+    def _load_checkpoint(self, version: int) -> Snapshot:
+        with open(self._checkpoint_path(version), encoding="utf-8") as fh:
+            return Snapshot.from_dict(json.load(fh))
+
+    def _replay(self, snapshot: Snapshot, until: Optional[int] = None) -> Snapshot:
+        """Apply the commits after ``snapshot`` (up to ``until``)."""
+        version = snapshot.version + 1
+        while until is None or version <= until:
+            try:
+                actions = self._read_commit(version)
+            except FileNotFoundError:
+                if until is not None:
+                    raise ValueError(f"{self.root}: no version {version}") from None
+                break
+            snapshot = snapshot.apply(version, actions)
+            version += 1
+        return snapshot
+
+    def snapshot(self, version: Optional[int] = None, timestamp: Optional[float] = None) -> Snapshot:
+        """The table state at ``version``, at ``timestamp`` (epoch seconds) or now."""
+        if timestamp is not None:
+            version = self.version_at(timestamp)
+        start = self._checkpoint_before(version) if version is not None else self._last_checkpoint()
+        base = self._load_checkpoint(start) if start is not None else Snapshot()
+        return self._replay(base, version)
+
+    def version_at(self, timestamp: float) -> int:
+        """The last version committed at or before ``timestamp``."""
+        latest = self.snapshot().version
+        for version in range(latest, -1, -1):
+            info = self._read_commit(version)[0]["commitInfo"]
+            if info["timestamp"] <= timestamp:
+                return version
+        raise ValueError(f"{self.root}: no version at or before {timestamp}")
+
+    def history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """``commitInfo`` of the latest commits, newest first."""
+        entries = []
+        version = self.snapshot().version
+        while version >= 0 and (limit is None or len(entries) < limit):
+            actions = self._read_commit(version)
+            info = dict(actions[0]["commitInfo"], version=version)
+            info["added"] = sum(1 for a in actions if "add" in a)
+            info["removed"] = sum(1 for a in actions if "remove" in a)
+            entries.append(info)
+            version -= 1
+        return entries
+
+    # -- committing ------------------------------------------------------
+
+    def _publish(self, version: int, actions: List[Dict[str, Any]]) -> bool:
+        os.makedirs(self.log_dir, exist_ok=True)
+        tmp = os.path.join(self.log_dir, f".{version:020d}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            for action in actions:
+                fh.write(json.dumps(action, sort_keys=True) + "\n")
+        try:
+            # link() refuses to replace an existing commit, and readers only
+            # ever see the complete file.
+            os.link(tmp, self._commit_path(version))
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp)
+
+    def commit(
+        self,
+        operation: str,
+        actions_for: Callable[[Snapshot], List[Dict[str, Any]]],
+        parameters: Optional[Dict[str, Any]] = None,
+        snapshot: Optional[Snapshot] = None,
+    ) -> CommitResult:
+        """Commit ``actions_for(snapshot)`` on top of the latest version.
+
+        ``actions_for`` is called again with the new state whenever a
+        concurrent writer took the version first.
+        """
+        start = time.perf_counter()
+        snapshot = snapshot if snapshot is not None else self.snapshot()
+        read_version = snapshot.version
+        for attempt in range(1, MAX_COMMIT_ATTEMPTS + 1):
+            actions = actions_for(snapshot)
+            missing = [
+                a["remove"]["path"] for a in actions
+                if "remove" in a and a["remove"]["path"] not in snapshot.files
+            ]
+            if missing:
+                raise ConcurrentModificationError(
+                    f"{operation} on {self.root}: {len(missing)} files were removed by a "
+                    f"concurrent commit (read version {read_version}, now {snapshot.version})"
+                )
+            version = snapshot.version + 1
+            info = {
+                "operation": operation,
+                "parameters": parameters or {},
+                "timestamp": time.time(),
+                "readVersion": read_version,
+            }
+            committed = [{"commitInfo": info}] + actions
+            if self._publish(version, committed):
+                new = snapshot.apply(version, committed)
+                if version % self.checkpoint_interval == 0:
+                    self.checkpoint(new)
+                log.info("%s: committed version %d (%s)", self.root, version, operation)
+                return CommitResult(
+                    version,
+                    added=sum(1 for a in actions if "add" in a),
+                    removed=sum(1 for a in actions if "remove" in a),
+                    attempts=attempt,
+                    wall_time_s=time.perf_counter() - start,
+                )
+            snapshot = self._replay(snapshot)
+        raise ConcurrentModificationError(
+            f"{operation} on {self.root}: gave up after {MAX_COMMIT_ATTEMPTS} conflicting commits"
+        )
+
+    def checkpoint(self, snapshot: Optional[Snapshot] = None) -> int:
+        """Write the full state of ``snapshot`` (default: latest) as a checkpoint."""
+        snapshot = snapshot if snapshot is not None else self.snapshot()
+        write_json_atomic(self._checkpoint_path(snapshot.version), snapshot.to_dict())
+        last = self._last_checkpoint()
+        if last is None or last < snapshot.version:
+            write_json_atomic(os.path.join(self.log_dir, LAST_CHECKPOINT), {"version": snapshot.version})
+        return snapshot.version
+
+    # -- data files ------------------------------------------------------
+
+    def _write_files(self, df) -> List[AddFile]:
+        """Write ``df`` as new data files under the root, with statistics."""
+        staging = os.path.join(self.root, STAGING_DIR, uuid.uuid4().hex)
+        df.write.parquet(staging)
+        stats = _file_stats(df.sparkSession, staging)
+        prefix = uuid.uuid4().hex[:12]
+        added = []
+        for name in sorted(os.listdir(staging)):
+            if not name.startswith("part-") or name not in stats:
+                continue
+            target = f"{prefix}-{name}"
+            os.rename(os.path.join(staging, name), os.path.join(self.root, target))
+            st = os.stat(os.path.join(self.root, target))
+            rows, columns = stats[name]
+            added.append(AddFile(target, st.st_size, rows, columns, st.st_mtime))
+        shutil.rmtree(staging, ignore_errors=True)
+        return added
+
+    def write(self, df, mode: str = "append") -> CommitResult:
+        """Append ``df`` to the table, or replace its contents (``overwrite``)."""
+        if mode not in ("append", "overwrite"):
+            raise ValueError(f"mode must be 'append' or 'overwrite', not {mode!r}")
+        snapshot = self.snapshot()
+        schema = df.schema.json()
+        if mode == "append" and snapshot.schema not in (None, schema):
+            raise ValueError(f"{self.root}: appended rows do not match the table schema")
+        added = self._write_files(df)
+
+        def actions_for(current: Snapshot) -> List[Dict[str, Any]]:
+            actions: List[Dict[str, Any]] = []
+            if current.schema != schema:
+                actions.append({"metaData": {"schema": schema}})
+            if mode == "overwrite":
+                actions += [
+                    {"remove": {"path": path, "deletionTimestamp": time.time()}}
+                    for path in sorted(current.files)
+                ]
+            actions += [{"add": asdict(f)} for f in added]
+            return actions
+
+        return self.commit(mode.upper(), actions_for, {"mode": mode}, snapshot)
+
+    def read(self, spark, version: Optional[int] = None, timestamp: Optional[float] = None,
+             where: Optional[Dict[str, Any]] = None):
+        """The table (at ``version``/``timestamp``), reading only files ``where`` may match.
+
+        ``where`` maps columns to a value or a ``(low, high)`` range; the
+        filter is also applied to the rows, so the result is exact.
+        """
+        from pyspark.sql import functions as F
+        from pyspark.sql.types import StructType
+
+        snapshot = self.snapshot(version, timestamp)
+        if snapshot.schema is None:
+            raise ValueError(f"{self.root}: table has no commits")
+        schema = StructType.fromJson(json.loads(snapshot.schema))
+        files = snapshot.select(where)
+        if not files:
+            return spark.createDataFrame([], schema)
+        df = spark.read.schema(schema).parquet(*[os.path.join(self.root, f.path) for f in files])
+        for column, value in (where or {}).items():
+            if isinstance(value, tuple):
+                low, high = value
+                if low is not None:
+                    df = df.where(F.col(column) >= low)
+                if high is not None:
+                    df = df.where(F.col(column) <= high)
+            else:
+                df = df.where(F.col(column) == value)
+        return df
+
+    def register_view(self, spark, name: str, **kwargs) -> str:
+        self.read(spark, **kwargs).createOrReplaceTempView(name)
+        return name
+
+    # -- maintenance -----------------------------------------------------
+
+    def optimize(self, spark, target_file_bytes: int = DEFAULT_TARGET_FILE_BYTES) -> CommitResult:
+        """Bin-pack files smaller than the target into target-sized files."""
+        from pyspark.sql.types import StructType
+
+        snapshot = self.snapshot()
+        small = sorted(
+            (f for f in snapshot.files.values() if f.size < target_file_bytes),
+            key=lambda f: f.size, reverse=True,
+        )
+        # First-fit decreasing.
+        bins: List[Tuple[int, List[AddFile]]] = []
+        for file in small:
+            for i, (size, members) in enumerate(bins):
+                if size + file.size <= target_file_bytes:
+                    bins[i] = (size + file.size, members + [file])
+                    break
+            else:
+                bins.append((file.size, [file]))
+        bins = [(size, members) for size, members in bins if len(members) > 1]
+        if not bins:
+            return CommitResult(snapshot.version, attempts=0)
+        schema = StructType.fromJson(json.loads(snapshot.schema))
+        removed, added = [], []
+        for _, members in bins:
+            files = [os.path.join(self.root, f.path) for f in members]
+            added += self._write_files(spark.read.schema(schema).parquet(*files).coalesce(1))
+            removed += [f.path for f in members]
+        log.info("optimize %s: %d files -> %d", self.root, len(removed), len(added))
+
+        def actions_for(current: Snapshot) -> List[Dict[str, Any]]:
+            now = time.time()
+            return (
+                [{"remove": {"path": p, "deletionTimestamp": now, "dataChange": False}} for p in removed]
+                + [{"add": asdict(f)} for f in added]
+            )
+
+        return self.commit(
+            "OPTIMIZE", actions_for, {"targetFileBytes": target_file_bytes}, snapshot
+        )
+
+    def vacuum(self, retention_hours: float = DEFAULT_RETENTION_HOURS) -> List[str]:
+        """Delete data files the latest version does not use, once older than the retention.
+
+        Versions that still referenced a deleted file can no longer be read.
+        """
+        live = set(self.snapshot().files)
+        cutoff = time.time() - retention_hours * 3600
+        deleted = []
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if name.startswith(("_", ".")) or name in live or not os.path.isfile(path):
+                continue
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                deleted.append(name)
+        staging = os.path.join(self.root, STAGING_DIR)
+        if os.path.isdir(staging):
+            for name in os.listdir(staging):
+                path = os.path.join(staging, name)
+                if os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+        return deleted
+
+
+def _file_stats(spark, directory: str) -> Dict[str, Tuple[int, Dict[str, List[Any]]]]:
+    """Per data file under ``directory``: row count and ``column -> [min, max, nulls]``."""
+    from pyspark.sql import functions as F
+
+    df = spark.read.parquet(directory)
+    columns = [f.name for f in df.schema.fields if f.dataType.simpleString() in _STATS_TYPES]
+    aggregates = [F.count(F.lit(1)).alias("__rows")]
+    for i, name in enumerate(columns):
+        aggregates += [
+            F.min(name).alias(f"__min{i}"),
+            F.max(name).alias(f"__max{i}"),
+            F.count(F.when(F.col(name).isNull(), 1)).alias(f"__nulls{i}"),
+        ]
+    stats = {}
+    for row in df.groupBy(F.input_file_name().alias("__file")).agg(*aggregates).collect():
+        name = os.path.basename(unquote(urlparse(row["__file"]).path))
+        stats[name] = (row["__rows"], {
+            column.lower(): [
+                _stat_value(row[f"__min{i}"]), _stat_value(row[f"__max{i}"]), row[f"__nulls{i}"],
+            ]
+            for i, column in enumerate(columns)
+        })
+    return stats
@@ -0,0 +1,10 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC Local stand-in for the courseware's Classroom-Cleanup: drops, in parallel, only the
+# MAGIC artifacts recorded in this lesson's manifest by Classroom-Setup.
+
+# COMMAND ----------
+
+from deltaplus import classroom
+
+classroom.cleanup(globals())
@@ -0,0 +1,16 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC Local stand-in for the courseware's Classroom-Setup, used when the lessons run
+# MAGIC headlessly through `python -m deltaplus run`.
+# MAGIC 
+# MAGIC * Reuses the runner's warm SparkSession instead of starting a new one
+# MAGIC * Defines `dbTest`
+# MAGIC * Exposes the crime-data lake as cached `global_temp.CrimeData<City>` views that are only created when first referenced
+# MAGIC * Points the lesson's own `CREATE TEMPORARY VIEW ... USING parquet` views over the lake at those cached views
+# MAGIC * Records every view, table and cache the lesson creates so that Classroom-Cleanup removes exactly those
+
+# COMMAND ----------
+
+from deltaplus import classroom
+
+classroom.setup(globals())
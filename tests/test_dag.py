@@ -0,0 +1,91 @@
+"""Failure reporting of :class:`deltaplus.dag.DagRunner`.
+
+The runner only talks to Spark through ``spark.sql`` and the job-group
+calls of the SparkContext, so a recording stand-in is enough here.
+"""
+
+import threading
+
+from deltaplus.dag import DagRunner
+
+NOTEBOOK = """# Databricks notebook source
+# MAGIC %sql
+# MAGIC CREATE OR REPLACE TEMPORARY VIEW CrimeData AS SELECT 'x' AS month
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC CREATE OR REPLACE TEMPORARY VIEW Homicides AS
+# MAGIC   SELECT CAST(month AS INT) AS month FROM CrimeData
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC CREATE OR REPLACE TEMPORARY VIEW HomicidesA AS SELECT * FROM Homicides
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC CREATE OR REPLACE TEMPORARY VIEW HomicidesB AS SELECT * FROM Homicides
+"""
+
+
+class _StatusTracker:
+    def getJobIdsForGroup(self, group_id):
+        return []
+
+
+class _SparkContext:
+    def __init__(self):
+        self._local = threading.local()
+
+    def setJobGroup(self, group_id, description):
+        self.setLocalProperty("spark.jobGroup.id", group_id)
+
+    def setLocalProperty(self, key, value):
+        setattr(self._local, key, value)
+
+    def getLocalProperty(self, key):
+        return getattr(self._local, key, None)
+
+    def statusTracker(self):
+        return _StatusTracker()
+
+
+class _Spark:
+    """Runs every statement but fails ``CACHE TABLE``, like a view with a bad cast."""
+
+    def __init__(self):
+        self.sparkContext = _SparkContext()
+        self.statements = []
+
+    def sql(self, statement):
+        self.statements.append(statement.strip())
+        if statement.startswith("CACHE TABLE"):
+            raise RuntimeError("[CAST_INVALID_INPUT] The value 'x' cannot be cast to INT")
+        return None
+
+
+def _notebook(tmp_path):
+    path = tmp_path / "Views.py"
+    path.write_text(NOTEBOOK)
+    return str(path)
+
+
+def test_failed_cache_table_is_reported_on_its_cell(tmp_path):
+    spark = _Spark()
+    runner = DagRunner(spark, max_workers=2)
+    report = runner.run(_notebook(tmp_path))
+
+    assert runner.last_plan.materialized == ["homicides"]
+    assert [c.status for c in report.cells] == ["ok", "error"]
+    assert "CAST_INVALID_INPUT" in report.cells[1].error
+    assert not report.ok
+    assert "UNCACHE TABLE IF EXISTS homicides" in spark.statements
+
+
+def test_failed_cache_table_continues_on_error(tmp_path):
+    runner = DagRunner(_Spark(), max_workers=2, continue_on_error=True)
+    report = runner.run(_notebook(tmp_path))
+
+    assert [c.status for c in report.cells] == ["ok", "error", "ok", "ok"]
@@ -0,0 +1,101 @@
+"""Baselines and regression flags of :class:`deltaplus.history.RunHistory`."""
+
+import pytest
+
+from deltaplus.history import METRIC_FLOORS, MIN_BASELINE_RUNS, RunHistory
+from deltaplus.runner import CellResult, RunReport
+
+NOTEBOOK = "/lessons/Lesson.py"
+MB = 1 << 20
+
+
+def _report(cells, notebook=NOTEBOOK):
+    """``cells`` maps cell index -> ``(wall_time_s, input_bytes)`` or ``"error"``."""
+    report = RunReport(notebook=notebook, started_at=1.0)
+    for index, metrics in sorted(cells.items()):
+        if metrics == "error":
+            report.cells.append(CellResult(notebook, index, "sql", 10 * index, "error", 0.5))
+        else:
+            wall, read = metrics
+            report.cells.append(CellResult(notebook, index, "sql", 10 * index, "ok", wall, input_bytes=read))
+    return report
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = RunHistory(str(tmp_path / "runs.sqlite"))
+    yield history
+    history.close()
+
+
+@pytest.fixture
+def baseline(history):
+    """Three earlier runs; cell 3 is new in the second, cell 4 fails once."""
+    runs = [
+        {0: (1.0, 20 * MB), 1: (0.02, None), 2: (1.0, 2 * MB), 4: "error"},
+        {0: (1.2, 20 * MB), 1: (0.02, None), 2: (1.1, 2 * MB), 3: (0.5, None), 4: (0.5, None)},
+        {0: (1.1, 20 * MB), 1: (0.02, None), 2: (1.2, 2 * MB), 3: (0.5, None), 4: (0.5, None)},
+    ]
+    for cells in runs:
+        history.record(_report(cells))
+    # Runs of other notebooks are not part of the baseline.
+    history.record(_report({0: (0.01, MB)}, notebook="/lessons/Other.py"))
+    return history
+
+
+def _deltas(comparison):
+    return {(d.cell, d.metric): d for d in comparison.deltas}
+
+
+def test_regression_needs_threshold_and_floor(baseline):
+    run = baseline.record(_report({
+        0: (1.5, 30 * MB),  # +36% and +0.4 s; +50% and +10 MB
+        1: (0.05, None),    # +150% but only +30 ms
+        2: (1.3, int(2.6 * MB)),  # +18% time; +30% read but under 1 MB
+    }))
+    comparison = baseline.compare(run)
+
+    assert comparison.baseline_runs == 3
+    deltas = _deltas(comparison)
+    assert deltas["Lesson.py:0", "wall_time_s"].baseline == pytest.approx(1.1)
+    assert deltas["Lesson.py:0", "wall_time_s"].samples == 3
+    assert sorted((d.cell, d.metric) for d in comparison.regressions) == [
+        ("Lesson.py:0", "input_bytes"), ("Lesson.py:0", "wall_time_s"),
+    ]
+    # Relative change alone is not enough below the floor.
+    tiny = deltas["Lesson.py:1", "wall_time_s"]
+    assert tiny.change > 1 and tiny.value - tiny.baseline < METRIC_FLOORS["wall_time_s"]
+    assert not tiny.regressed
+    assert not deltas["Lesson.py:2", "input_bytes"].regressed
+    assert not deltas["Lesson.py:2", "wall_time_s"].regressed
+    assert "2 regressions" in comparison.summary()
+
+
+def test_cells_with_few_earlier_runs_are_new(baseline):
+    run = baseline.record(_report({0: (1.1, 20 * MB), 3: (5.0, None), 4: (5.0, None)}))
+    comparison = baseline.compare(run)
+
+    # Cell 3 ran twice before, cell 4 succeeded twice: neither has a baseline.
+    assert comparison.new_cells == ["Lesson.py:3", "Lesson.py:4"]
+    assert not comparison.regressions
+    assert {d.cell for d in comparison.deltas} == {"Lesson.py:0"}
+
+
+def test_no_baseline_before_enough_runs(history):
+    for _ in range(MIN_BASELINE_RUNS - 1):
+        history.record(_report({0: (1.0, None)}))
+    run = history.record(_report({0: (9.0, None)}))
+    comparison = history.compare(run)
+
+    assert comparison.baseline_runs == MIN_BASELINE_RUNS - 1
+    assert comparison.new_cells == ["Lesson.py:0"]
+    assert not comparison.deltas
+    assert "no baseline yet" in comparison.summary()
+
+
+def test_window_limits_the_baseline(baseline):
+    run = baseline.record(_report({0: (1.5, 20 * MB)}))
+    comparison = baseline.compare(run, window=2)
+
+    assert comparison.baseline_runs == 2
+    assert comparison.new_cells == ["Lesson.py:0"]
@@ -0,0 +1,122 @@
+"""Streaming readers and incremental runs of :mod:`deltaplus.ingest`."""
+
+import gzip
+import json
+import os
+
+import pytest
+
+from deltaplus import ingest
+from deltaplus.cities import get_cities
+from deltaplus.ingest import Ingestor, iter_json
+
+RECORDS = [
+    {"OFFENSE_CODE_GROUP": "Homicide" if i % 50 == 0 else "Larceny", "MONTH": i % 12 + 1,
+     "note": f"record {i}, with [brackets] and {{braces}}"}
+    for i in range(3000)
+]
+# A top-level number, which a chunk boundary can cut into "1.5" and "e10".
+NUMBER = "1.5e10"
+
+
+def _layout(kind, records, pad=""):
+    """``records`` in one of the three JSON layouts, after a padding record."""
+    values = [json.dumps({"pad": pad}), NUMBER] + [json.dumps(r) for r in records]
+    if kind == "lines":
+        return "\n".join(values) + "\n"
+    if kind == "concatenated":
+        return " ".join(values)
+    return "[\n" + ",\n".join(values) + "\n]\n"
+
+
+def _write(path, text):
+    if path.endswith(".gz"):
+        with gzip.open(path, "wt", encoding="utf-8") as fh:
+            fh.write(text)
+    else:
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    return path
+
+
+@pytest.mark.parametrize("kind", ["lines", "concatenated", "array"])
+def test_iter_json_layouts(tmp_path, kind):
+    text = _layout(kind, RECORDS)
+    assert len(text) > 2 * ingest._READ_CHUNK
+    path = _write(str(tmp_path / "drop.json"), text)
+    assert list(iter_json(path)) == [{"pad": ""}] + RECORDS
+
+
+@pytest.mark.parametrize("kind", ["lines", "concatenated", "array"])
+@pytest.mark.parametrize("shift", range(-len(NUMBER) - 1, 2))
+def test_iter_json_value_cut_at_the_chunk_edge(tmp_path, kind, shift):
+    # Pad the first record so the number starts ``shift`` characters from
+    # the end of the first chunk.
+    pad = "x" * (ingest._READ_CHUNK + shift - _layout(kind, []).index(NUMBER))
+    text = _layout(kind, RECORDS[:10], pad)
+    assert text.index(NUMBER) == ingest._READ_CHUNK + shift
+    path = _write(str(tmp_path / "drop.json.gz"), text)
+    assert list(iter_json(path)) == [{"pad": pad}] + RECORDS[:10]
+
+
+BOSTON = get_cities(["Boston"])
+
+
+def _drop(ingestor, rows, name="2016.csv"):
+    directory = os.path.join(ingestor.drops, "Boston")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write("OFFENSE_CODE_GROUP,MONTH\n")
+        fh.writelines(f"{offense},{month}\n" for offense, month in rows)
+    return path
+
+
+def _outputs(ingestor):
+    return sorted(os.listdir(ingestor.table_path(BOSTON[0])))
+
+
+@pytest.fixture
+def ingestor(tmp_path):
+    pytest.importorskip("pyarrow")  # converting writes Parquet
+    return Ingestor(str(tmp_path / "drops"), str(tmp_path / "ingested"), BOSTON, max_workers=1)
+
+
+def test_touched_file_is_unchanged(ingestor):
+    path = _drop(ingestor, [("Homicide", 1), ("Larceny", 2)])
+    first = ingestor.run()
+    assert first.converted == {"Boston/2016.csv": 2}
+    outputs = _outputs(ingestor)
+
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    touched = ingestor.run()
+    assert touched.converted == {}
+    assert touched.unchanged == ["Boston/2016.csv"]
+    assert _outputs(ingestor) == outputs
+    entry = ingestor.load_state()["Boston"]["2016.csv"]
+    assert entry["mtime_ns"] == st.st_mtime_ns + 10**9
+
+    # The refreshed stat now skips the file without a checksum.
+    todo, skipped = ingestor.pending(ingestor.load_state())
+    assert (todo, skipped) == ([], ["Boston/2016.csv"])
+
+
+def test_changed_file_replaces_its_output(ingestor):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = _drop(ingestor, [("Homicide", 1), ("Larceny", 2)])
+    ingestor.run()
+    (old,) = _outputs(ingestor)
+
+    _drop(ingestor, [("Homicide", 3), ("Homicide", 4), ("Larceny", 5)])
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    result = ingestor.run()
+
+    assert result.converted == {"Boston/2016.csv": 3}
+    (new,) = _outputs(ingestor)
+    assert new != old
+    assert ingestor.load_state()["Boston"]["2016.csv"]["output"] == new
+    table = pq.read_table(os.path.join(ingestor.table_path(BOSTON[0]), new))
+    assert table.column("month").to_pylist() == [3, 4, 5]
+    assert table.column("offense_category").to_pylist() == ["homicide", "homicide", "larceny"]
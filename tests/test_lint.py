@@ -0,0 +1,105 @@
+"""Rules of :func:`deltaplus.lint.lint_notebook`."""
+
+import glob
+import os
+
+import pytest
+
+from deltaplus.lint import lint_notebook
+
+NOTEBOOK = """# Databricks notebook source
+# MAGIC %sql
+# MAGIC CREATE OR REPLACE TEMPORARY VIEW CrimeData
+# MAGIC   USING parquet
+# MAGIC   OPTIONS (path "dbfs:/mnt/training/crime-data-2016/Crime-Data-Boston-2016.parquet")
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC CREATE OR REPLACE TEMPORARY VIEW Homicides AS
+# MAGIC   SELECT month, offense FROM CrimeData
+# MAGIC   WHERE lower(offense) LIKE 'murder%'
+# MAGIC   ORDER BY month
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC SELECT * FROM Homicides
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC SELECT month, offense FROM Homicides ORDER BY month
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC SELECT month, count(*) FROM Homicides GROUP BY month ORDER BY month
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC SELECT * FROM CrimeData WHERE offense LIKE 'MURDER%' ORDER BY month LIMIT 10
+"""
+
+LESSON = glob.glob(os.path.join(
+    os.path.dirname(__file__), os.pardir, "notebooks", "Users", "*", "*", "Python",
+    "SSQL 06 - Data Lakes.py",
+))
+
+
+@pytest.fixture
+def findings(tmp_path):
+    path = tmp_path / "Lint.py"
+    path.write_text(NOTEBOOK)
+    return lint_notebook(str(path)).findings
+
+
+def _rules(findings, rule):
+    return [f for f in findings if f.rule == rule]
+
+
+def test_non_sargable(findings):
+    (finding,) = _rules(findings, "non-sargable")
+    assert finding.cell == 1
+    assert "lower(offense)" in finding.message
+    # Upper-casing the literal drops mixed-case values; the hint says so.
+    assert "offense IN (<those values>)" in finding.suggestion
+    assert "only equivalent if every value of offense is stored in that case" in finding.suggestion
+
+
+def test_unbounded_select(findings):
+    assert [f.cell for f in _rules(findings, "unbounded-select")] == [2]
+
+
+def test_unbounded_sort(findings):
+    # Grouped and limited queries are not flagged.
+    assert [f.cell for f in _rules(findings, "unbounded-sort")] == [3]
+
+
+def test_sorted_view(findings):
+    (finding,) = _rules(findings, "sorted-view")
+    assert finding.cell == 1
+    assert "Homicides" in finding.message
+
+
+def test_uncached_reuse(findings):
+    (finding,) = _rules(findings, "uncached-reuse")
+    assert finding.cell == 1
+    assert "read by 3 later cells" in finding.message
+    assert finding.suggestion.startswith("CACHE TABLE Homicides")
+
+
+def test_cached_view_is_not_reported(tmp_path):
+    path = tmp_path / "Cached.py"
+    path.write_text(NOTEBOOK + "\n# COMMAND ----------\n\n# MAGIC %sql\n# MAGIC CACHE TABLE Homicides\n")
+    assert not _rules(lint_notebook(str(path)).findings, "uncached-reuse")
+
+
+@pytest.mark.skipif(not LESSON, reason="lesson notebook not found")
+def test_lesson_notebook():
+    report = lint_notebook(LESSON[0])
+    assert len(report.findings) == 10
+    assert sorted({f.rule for f in report.findings}) == [
+        "non-sargable", "unbounded-select", "unbounded-sort", "uncached-reuse",
+    ]
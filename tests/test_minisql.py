@@ -0,0 +1,190 @@
+"""The lesson's SQL run in process by :class:`deltaplus.minisql.Engine`.
+
+The fixtures are tiny stand-ins for the crime-data lake, written with
+pyarrow; the expected rows are what Spark returns for the same files.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from deltaplus import paths  # noqa: E402
+from deltaplus.minisql import CreateView, Engine, UnsupportedSQL, parse  # noqa: E402
+
+LAKE = "dbfs:/mnt/training/crime-data-2016"
+
+# The lesson's view definitions (SSQL 06 - Data Lakes).
+LESSON_VIEWS = [
+    f"""CREATE OR REPLACE TEMPORARY VIEW CrimeDataNewYork
+  USING parquet
+  OPTIONS (
+    path "{LAKE}/Crime-Data-New-York-2016.parquet"
+  )""",
+    f"""CREATE OR REPLACE TEMPORARY VIEW CrimeDataBoston
+  USING parquet
+  OPTIONS (
+    path "{LAKE}/Crime-Data-Boston-2016.parquet"
+  )""",
+    f"""CREATE OR REPLACE TEMPORARY VIEW CrimeDataChicago
+  USING parquet
+  OPTIONS (
+    path "{LAKE}/Crime-Data-Chicago-2016.parquet"
+  )""",
+    """CREATE OR REPLACE TEMPORARY VIEW HomicidesNewYork AS
+  SELECT month(reportDate) AS month, offenseDescription AS offense
+  FROM CrimeDataNewYork
+  WHERE lower(offenseDescription) LIKE 'murder%' OR lower(offenseDescription) LIKE 'homicide%'""",
+    """CREATE OR REPLACE TEMPORARY VIEW HomicidesBoston AS
+  SELECT month, OFFENSE_CODE_GROUP AS offense
+  FROM CrimeDataBoston
+  WHERE lower(OFFENSE_CODE_GROUP) = 'homicide'""",
+    """CREATE OR REPLACE TEMPORARY VIEW HomicidesChicago AS
+  SELECT month(date) AS month, primaryType AS offense
+  FROM CrimeDataChicago
+  WHERE lower(primaryType) LIKE 'homicide%'""",
+    """CREATE OR REPLACE TEMPORARY VIEW AllHomicides AS
+  SELECT * FROM HomicidesNewYork
+    UNION ALL
+  SELECT * FROM HomicidesBoston
+    UNION ALL
+  SELECT * FROM HomicidesChicago""",
+    """CREATE OR REPLACE TEMPORARY VIEW HomicidesByMonth AS
+  SELECT month, count(*) AS homicides
+  FROM AllHomicides
+  GROUP BY month
+  ORDER BY month""",
+]
+
+
+def _write_lake(root):
+    lake = root / "mnt" / "training" / "crime-data-2016"
+    lake.mkdir(parents=True)
+
+    new_york = pa.table({
+        "reportDate": pa.array([
+            datetime(2016, 1, 4, 10), datetime(2016, 1, 20, 23), datetime(2016, 2, 1),
+            datetime(2016, 3, 15, 8), datetime(2016, 3, 16),
+        ], pa.timestamp("us")),
+        "offenseDescription": [
+            "MURDER & NON-NEGL. MANSLAUGHTER", "HOMICIDE-NEGLIGENT,UNCLASSIFIE",
+            "ROBBERY", "Murder", None,
+        ],
+    })
+    pq.write_table(new_york, str(lake / "Crime-Data-New-York-2016.parquet"))
+
+    # Spark writes a directory of part files.
+    boston = pa.table({
+        "MONTH": pa.array([1, 2, 2, 12, 12], pa.int32()),
+        "YEAR": pa.array([2016] * 5, pa.int32()),
+        "OFFENSE_CODE_GROUP": ["Homicide", "Homicide", "Larceny", None, "HOMICIDE"],
+    })
+    directory = lake / "Crime-Data-Boston-2016.parquet"
+    directory.mkdir()
+    pq.write_table(boston.slice(0, 3), str(directory / "part-00000.parquet"))
+    pq.write_table(boston.slice(3), str(directory / "part-00001.parquet"))
+    (directory / "_SUCCESS").touch()
+
+    chicago = pa.table({
+        "date": pa.array([
+            datetime(2016, 1, 3, tzinfo=timezone.utc), datetime(2016, 2, 9, tzinfo=timezone.utc),
+            datetime(2016, 2, 10, tzinfo=timezone.utc),
+            datetime(2016, 12, 31, 23, 30, tzinfo=timezone.utc), None,
+        ], pa.timestamp("us", tz="UTC")),
+        "primaryType": ["HOMICIDE", "THEFT", "HOMICIDE", "HOMICIDE", "HOMICIDE"],
+    })
+    pq.write_table(chicago, str(lake / "Crime-Data-Chicago-2016.parquet"))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    _write_lake(tmp_path)
+    paths.set_dbfs_root(str(tmp_path))
+    try:
+        engine = Engine()
+        for view in LESSON_VIEWS:
+            engine.define(parse(paths.rewrite_sql_paths(view)))
+        yield engine
+    finally:
+        paths.set_dbfs_root(None)
+
+
+def run(engine, sql, limit=None):
+    statement = parse(paths.rewrite_sql_paths(sql))
+    assert not isinstance(statement, CreateView)
+    table = engine.execute(statement, limit)
+    return table.column_names, [tuple(row.values()) for row in table.to_pylist()]
+
+
+def test_crime_data_chicago_count(engine):
+    assert run(engine, "select count(*) from CrimeDataChicago") == (["count(1)"], [(5,)])
+
+
+def test_homicides_chicago_by_month(engine):
+    names, rows = run(engine, "SELECT month, count(*) FROM HomicidesChicago GROUP BY month ORDER BY month")
+    assert names == ["month", "count(1)"]
+    # Ascending order puts nulls first, as in Spark.
+    assert rows == [(None, 1), (1, 1), (2, 1), (12, 1)]
+
+
+def test_all_homicides_count(engine):
+    assert run(engine, "SELECT count(*) AS total FROM AllHomicides") == (["total"], [(10,)])
+
+
+def test_homicides_by_month(engine):
+    names, rows = run(engine, "SELECT * FROM HomicidesByMonth")
+    assert names == ["month", "homicides"]
+    assert rows == [(None, 1), (1, 4), (2, 2), (3, 1), (12, 2)]
+
+
+def test_descending_order_puts_nulls_last(engine):
+    _, rows = run(engine, "SELECT month FROM HomicidesChicago ORDER BY month DESC")
+    assert rows == [(12,), (2,), (1,), (None,)]
+
+
+def test_union_all_keeps_view_columns(engine):
+    names, rows = run(engine, "SELECT * FROM AllHomicides ORDER BY month, offense")
+    assert names == ["month", "offense"]
+    assert rows[:3] == [
+        (None, "HOMICIDE"),
+        (1, "HOMICIDE"),
+        (1, "HOMICIDE-NEGLIGENT,UNCLASSIFIE"),
+    ]
+
+
+def test_union_removes_duplicates(engine):
+    _, rows = run(engine, "SELECT month FROM HomicidesBoston UNION SELECT month FROM HomicidesChicago ORDER BY 1")
+    assert rows == [(None,), (1,), (2,), (12,)]
+
+
+def test_case(engine):
+    names, rows = run(
+        engine,
+        """SELECT half, count(*) AS n
+        FROM (SELECT CASE WHEN month <= 6 THEN 'H1' WHEN month > 6 THEN 'H2' ELSE 'unknown' END AS half
+              FROM AllHomicides)
+        GROUP BY half
+        ORDER BY half""",
+    )
+    assert names == ["half", "n"]
+    assert rows == [("H1", 7), ("H2", 2), ("unknown", 1)]
+
+
+def test_limit(engine):
+    names, rows = run(engine, "SELECT * FROM HomicidesNewYork LIMIT 2")
+    assert names == ["month", "offense"]
+    assert len(rows) == 2
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM HomicidesBoston b JOIN HomicidesChicago c ON b.month = c.month",
+    "SELECT month, count(*) FROM AllHomicides GROUP BY month HAVING count(*) > 1",
+    "SELECT rank() OVER (ORDER BY month) FROM AllHomicides",
+    "SELECT * FROM global_temp.CrimeDataBoston",
+    "SELECT * FROM NoSuchView",
+])
+def test_unsupported_sql(engine, sql):
+    with pytest.raises(UnsupportedSQL):
+        run(engine, sql)
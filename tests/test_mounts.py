@@ -0,0 +1,141 @@
+"""Block cache and localized copies of :mod:`deltaplus.mounts`, offline."""
+
+import os
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from deltaplus.mounts import BlockCache, LocalDirectorySource, Mount  # noqa: E402
+
+BLOCK = 16 << 10
+LAKE = "Crime-Data-Boston-2016.parquet"
+
+
+def _write_city(directory, rows, seed=0):
+    """A two-file city directory, as Spark writes it; returns the part files."""
+    os.makedirs(directory, exist_ok=True)
+    table = pa.table({
+        "MONTH": pa.array([(i + seed) % 12 + 1 for i in range(rows)], pa.int32()),
+        # Distinct strings, so the column does not compress to nothing.
+        "OFFENSE_DESCRIPTION": [f"offense {i * 7919 + seed:08d}" for i in range(rows)],
+    })
+    parts = []
+    for index, part in enumerate((table.slice(0, rows // 2), table.slice(rows // 2))):
+        path = os.path.join(directory, f"part-{index:05d}.parquet")
+        pq.write_table(part, path, row_group_size=2000)
+        parts.append(path)
+    return parts
+
+
+@pytest.fixture
+def lake(tmp_path):
+    source = tmp_path / "source"
+    parts = _write_city(str(source / "crime-data-2016" / LAKE), 20000)
+    return str(source), parts
+
+
+def _mount(tmp_path, source, max_bytes=1 << 30):
+    cache = BlockCache(str(tmp_path / "cache"), max_bytes=max_bytes, block_size=BLOCK)
+    return Mount(LocalDirectorySource(source), cache)
+
+
+def _path(name=LAKE):
+    return f"dbfs:/mnt/training/crime-data-2016/{name}"
+
+
+def test_eviction_keeps_the_byte_budget(tmp_path, lake):
+    source, parts = lake
+    budget = 3 * BLOCK
+    mount = _mount(tmp_path, source, max_bytes=budget)
+    file = mount.source.stat(os.path.relpath(parts[0], source))
+    blocks = (file.size + BLOCK - 1) // BLOCK
+    assert blocks > 4
+
+    for index in range(blocks):
+        mount.block(file, index)
+        assert mount.cache.stats()["bytes"] <= budget
+    # Least recently used first: the last blocks read are the ones kept.
+    assert mount.cache.contains(file.key, blocks - 1)
+    assert not mount.cache.contains(file.key, 0)
+    on_disk = sum(
+        os.path.getsize(os.path.join(d, f))
+        for d, _, names in os.walk(os.path.join(mount.cache.root, "blocks")) for f in names
+    )
+    assert on_disk <= budget
+
+
+def test_blocks_hit_after_the_first_read(tmp_path, lake):
+    source, parts = lake
+    mount = _mount(tmp_path, source)
+
+    first = mount.read_table(_path(), columns=["MONTH"])
+    requests, misses = mount.source.requests, mount.misses
+    assert misses > 0
+    second = mount.read_table(_path(), columns=["MONTH"])
+
+    assert mount.source.requests == requests
+    assert mount.misses == misses
+    assert mount.hits > 0
+    expected = pa.concat_tables(pq.read_table(p, columns=["MONTH"]) for p in parts)
+    assert first.equals(expected)
+    assert second.equals(expected)
+
+
+def test_read_spanning_block_boundaries(tmp_path, lake):
+    source, parts = lake
+    mount = _mount(tmp_path, source)
+    with open(parts[0], "rb") as fh:
+        raw = fh.read()
+    handle = mount.open(_path(f"{LAKE}/part-00000.parquet"))
+
+    assert bytes(handle.read_range(BLOCK - 10, 20)) == raw[BLOCK - 10:BLOCK + 10]
+    assert bytes(handle.read_range(BLOCK - 1, 2 * BLOCK + 2)) == raw[BLOCK - 1:3 * BLOCK + 1]
+    # Within one block the range is a view of the cached block.
+    assert isinstance(handle.read_range(BLOCK + 1, 10), memoryview)
+    assert handle.read_range(len(raw), 10) == b""
+
+    handle.seek(-(BLOCK + 5), os.SEEK_END)
+    assert bytes(handle.read()) == raw[-(BLOCK + 5):]
+
+
+def test_localize_promotes_blocks_to_a_file_copy(tmp_path, lake):
+    source, parts = lake
+    mount = _mount(tmp_path, source)
+    mount.read_table(_path(), columns=["MONTH"])
+    assert mount.cache.stats()["blocks"] > 0
+
+    target = mount.localize(_path())
+
+    stats = mount.cache.stats()
+    assert (stats["files"], stats["blocks"]) == (2, 0)
+    for part in parts:
+        copy = os.path.join(target, os.path.basename(part))
+        with open(part, "rb") as a, open(copy, "rb") as b:
+            assert a.read() == b.read()
+        # Same size and mtime, so fingerprints of the copy match the source.
+        assert os.stat(copy).st_mtime_ns == os.stat(part).st_mtime_ns
+    assert not [name for name in os.listdir(target) if name.endswith(".tmp")]
+
+
+def test_localize_follows_source_changes(tmp_path, lake):
+    source, parts = lake
+    mount = _mount(tmp_path, source)
+    target = mount.localize(_path())
+
+    # Rewrite the first part and drop the second.
+    directory = os.path.dirname(parts[0])
+    for part in parts:
+        os.remove(part)
+    (rewritten,) = [p for p in _write_city(directory, 3000, seed=5) if p.endswith("00000.parquet")]
+    os.remove(os.path.join(directory, "part-00001.parquet"))
+    os.utime(rewritten, ns=(1_500_000_000_000_000_000, 1_500_000_000_000_000_000))
+
+    assert mount.localize(_path()) == target
+    assert sorted(os.listdir(target)) == ["part-00000.parquet"]
+    with open(rewritten, "rb") as a, open(os.path.join(target, "part-00000.parquet"), "rb") as b:
+        assert a.read() == b.read()
+    stats = mount.cache.stats()
+    assert (stats["files"], stats["blocks"]) == (1, 0)
+    assert stats["bytes"] == os.path.getsize(rewritten)
@@ -0,0 +1,149 @@
+"""Commits, checkpoints and conflicts of :class:`deltaplus.txlog.LogTable`.
+
+Data files are only named in the log, so these tests need no Spark: they
+commit ``add``/``remove`` actions the way ``write`` and ``optimize`` do.
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from dataclasses import asdict
+
+import pytest
+
+from deltaplus.txlog import LAST_CHECKPOINT, AddFile, ConcurrentModificationError, LogTable
+
+WRITERS = 8
+COMMITS_PER_WRITER = 20
+
+
+def _add(path, month=1):
+    return {"add": asdict(AddFile(path, size=100, rows=1, stats={"month": [month, month, 0]}))}
+
+
+def _append(table, *files):
+    return table.commit("WRITE", lambda current: [_add(f) for f in files], {"mode": "append"})
+
+
+def _writer(root, writer, start):
+    table = LogTable(root)
+    start.wait()
+    for i in range(COMMITS_PER_WRITER):
+        _append(table, f"w{writer}-{i:02d}.parquet")
+
+
+def test_concurrent_appends_lose_no_commits(tmp_path):
+    try:
+        context = multiprocessing.get_context("fork")
+    except ValueError:
+        pytest.skip("needs fork")
+    root = str(tmp_path / "table")
+    start = context.Event()
+    workers = [context.Process(target=_writer, args=(root, w, start)) for w in range(WRITERS)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join(120)
+        assert worker.exitcode == 0
+
+    table = LogTable(root)
+    total = WRITERS * COMMITS_PER_WRITER
+    latest = table.snapshot()
+    assert latest.version == total - 1
+    assert sorted(latest.files) == sorted(
+        f"w{w}-{i:02d}.parquet" for w in range(WRITERS) for i in range(COMMITS_PER_WRITER)
+    )
+    # Each writer's commits land in its own order, and every version is intact.
+    seen = {}
+    for version in range(total):
+        snapshot = table.snapshot(version=version)
+        assert len(snapshot.files) == version + 1
+        (new,) = set(snapshot.files) - set(seen)
+        writer, index = new[1:].split(".")[0].split("-")
+        assert seen.get(writer, -1) < int(index)
+        seen[writer] = int(index)
+        seen[new] = version
+    assert not [name for name in os.listdir(table.log_dir) if name.endswith(".tmp")]
+
+
+def test_checkpoint_is_written_every_interval(tmp_path):
+    table = LogTable(str(tmp_path / "table"), checkpoint_interval=5)
+    for i in range(12):
+        _append(table, f"part-{i:02d}.parquet")
+
+    assert table._last_checkpoint() == 10
+    with open(os.path.join(table.log_dir, LAST_CHECKPOINT), encoding="utf-8") as fh:
+        assert json.load(fh) == {"version": 10}
+    checkpoints = sorted(n for n in os.listdir(table.log_dir) if n.endswith(".checkpoint.json"))
+    assert checkpoints == [f"{v:020d}.checkpoint.json" for v in (0, 5, 10)]
+
+    latest = table.snapshot()
+    assert latest.version == 11
+    assert len(latest.files) == 12
+
+
+def test_snapshot_replays_from_the_last_checkpoint(tmp_path):
+    table = LogTable(str(tmp_path / "table"), checkpoint_interval=5)
+    for i in range(7):
+        _append(table, f"part-{i:02d}.parquet")
+    # Commits before the checkpoint are not read to load the latest state.
+    for version in range(5):
+        os.remove(table._commit_path(version))
+
+    latest = table.snapshot()
+    assert latest.version == 6
+    assert sorted(latest.files) == [f"part-{i:02d}.parquet" for i in range(7)]
+
+
+def test_time_travel_behind_a_checkpoint(tmp_path):
+    table = LogTable(str(tmp_path / "table"), checkpoint_interval=5)
+    stamps = []
+    for i in range(12):
+        _append(table, f"part-{i:02d}.parquet")
+        stamps.append(table.history(1)[0]["timestamp"])
+        time.sleep(0.01)
+
+    for version in (0, 3, 5, 7, 11):
+        snapshot = table.snapshot(version=version)
+        assert snapshot.version == version
+        assert sorted(snapshot.files) == [f"part-{i:02d}.parquet" for i in range(version + 1)]
+    assert table.snapshot(timestamp=stamps[3]).version == 3
+    with pytest.raises(ValueError):
+        table.snapshot(version=12)
+
+
+def test_optimize_racing_an_overwrite_fails(tmp_path):
+    table = LogTable(str(tmp_path / "table"))
+    _append(table, "a.parquet", "b.parquet")
+    before = table.snapshot()
+
+    # A concurrent overwrite removes every file the compaction read.
+    table.commit("OVERWRITE", lambda current: (
+        [{"remove": {"path": p, "deletionTimestamp": time.time()}} for p in sorted(current.files)]
+        + [_add("c.parquet")]
+    ), {"mode": "overwrite"})
+
+    def compaction(current):
+        return (
+            [{"remove": {"path": p, "deletionTimestamp": time.time(), "dataChange": False}}
+             for p in ("a.parquet", "b.parquet")]
+            + [_add("ab.parquet")]
+        )
+
+    with pytest.raises(ConcurrentModificationError):
+        table.commit("OPTIMIZE", compaction, snapshot=before)
+    assert sorted(table.snapshot().files) == ["c.parquet"]
+
+
+def test_append_rebases_on_a_concurrent_commit(tmp_path):
+    table = LogTable(str(tmp_path / "table"))
+    _append(table, "a.parquet")
+    before = table.snapshot()
+    _append(table, "b.parquet")
+
+    result = table.commit("WRITE", lambda current: [_add("c.parquet")], snapshot=before)
+    assert result.version == 2
+    assert result.attempts == 2
+    assert sorted(table.snapshot().files) == ["a.parquet", "b.parquet", "c.parquet"]